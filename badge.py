@@ -3,30 +3,56 @@
 Unified Badge Tool for Supercon 2025 Badge
 All-in-one interface for badge interaction
 """
+import importlib
 import sys
-import subprocess
+import time
+
+# Reference point for --timings
+STARTED = time.perf_counter()
 
 def show_help():
     print("""
 Supercon 2025 Badge Tool
 ========================
 
-Usage: uv run badge.py <command> [args...]
+Usage: uv run badge.py [--timings] [--trace FILE] <command> [args...]
 
 Commands:
-  info                        - Show badge system information
-  monitor [logfile]           - Monitor real-time output
-  repl                        - Interactive Python REPL
+  info [--json] [--refresh]   - Show badge system information
+  monitor [logfile] [--rotate-mb N] [--rotate-minutes N] [--gzip] [--stats S]
+                              - Monitor real-time output
+  monitor query <logfile> [--since T] [--until T] [--grep RE] [--level L] [--tail N] [--count]
+                              - Search a captured log through its index
+  repl [--no-complete]        - Interactive Python REPL (Ctrl+] exits)
   exec '<code>'               - Execute Python code
+  exec --file F [--stream] [--timeout S] [--reset]
+                              - Run a script, optionally streaming its output
+  exec --batch FILE|- [--stop-on-error] [--timeout S]
+                              - Run many snippets in one session (JSON lines)
+  telemetry [--rate HZ] [--duration S] [--run CODE] [--counter NAME=EXPR] [--csv F] [--json F]
+                              - Sample memory and timer lateness (optionally of an app)
   
   ls [path]                   - List files
-  cat <file>                  - Read file contents
-  download [-r] <remote> <local> - Download file(s) from badge
-  upload [-r] <local> <remote>   - Upload file(s) to badge
+  cat [--head N|--tail N|--range OFF:LEN] <file>
+                              - Read file contents (or just part of them)
+  download [-r] [-z] <remote> <local> - Download file(s) from badge
+  upload [-r] [-z] [--compile] <local> <remote> - Upload file(s) to badge
+  sync [--delete] [-z] <local> <remote> - Upload only changed files
+  watch [--entry CODE] [--poll] <local> <remote>
+                              - Push changes as you save and reload the app
   rm <file>                   - Delete file
+  bench [--size N]            - Measure transfer speed per chunk/window size
+  
+  broker [socket]             - Share the badge between tools (daemon)
+  fleet <command> [args...]   - Run exec/info/upload/sync/rm on every badge
   
   help                        - Show this help
 
+Options:
+  --timings                   - Report import and run time per phase (stderr)
+  --trace FILE                - Record nested spans (port open, REPL entry, exec,
+                                transfers) as Chrome trace JSON plus a summary
+
 Examples:
   uv run badge.py info
   uv run badge.py monitor
@@ -34,57 +60,111 @@ Examples:
   uv run badge.py exec 'import gc; gc.mem_free()'
   uv run badge.py ls /apps
   uv run badge.py cat /main.py
+  uv run badge.py cat --tail 50 /log.txt
   uv run badge.py download /apps/chat.py chat.py
   uv run badge.py download '/apps/*.py' ./files/
   uv run badge.py download -r /apps ./local_apps/
   uv run badge.py upload myapp.py /apps/userA.py
   uv run badge.py upload -r ./my_app /apps/my_app/
+  uv run badge.py upload -r --compile ./my_app /apps/my_app/
+  uv run badge.py sync ./my_app /apps/my_app/
+  uv run badge.py watch ./my_app /apps/my_app
+  uv run badge.py telemetry --run 'import apps.my_app' --duration 60 --csv mem.csv
+  uv run badge.py broker &      # then monitor, exec and upload side by side
+  uv run badge.py fleet sync ./my_app /apps/my_app/
 
 Quick Info:
   Device: ESP32-S3 @ 240MHz
   Port: /dev/cu.usbmodem2101
   MicroPython: 1.25.0
-  File operations powered by mpremote (won't reset display)
+  File operations share one raw REPL session (won't reset display)
 """)
 
+# Each command's module and the arguments placed before the user's; modules
+# are imported only when their command runs
+COMMANDS = {
+    'info': ('badge_info', []),
+    'monitor': ('badge_monitor', []),
+    'repl': ('badge_repl', []),
+    'exec': ('badge_exec', []),
+    'telemetry': ('badge_telemetry', []),
+    'ls': ('badge_file_manager', ['ls']),
+    'cat': ('badge_file_manager', ['cat']),
+    'download': ('badge_file_manager', ['download']),
+    'upload': ('badge_file_manager', ['upload']),
+    'sync': ('badge_file_manager', ['sync']),
+    'rm': ('badge_file_manager', ['rm']),
+    'bench': ('badge_file_manager', ['bench']),
+    'broker': ('badge_broker', []),
+    'fleet': ('badge_fleet', []),
+    'watch': ('badge_watch', []),
+}
+
+# Commands (with their first argument) that never open a port, so --timings
+# doesn't load pyserial for them
+OFFLINE_COMMANDS = {('monitor', 'query')}
+
+def report_timings(timings):
+    """Print how long each startup phase and the command itself took"""
+    print("\nTimings:", file=sys.stderr)
+    for phase, seconds in timings:
+        print(f"  {phase:<28} {seconds * 1000:8.1f} ms", file=sys.stderr)
+    print(f"  {'total':<28} {(time.perf_counter() - STARTED) * 1000:8.1f} ms", file=sys.stderr)
+
 def main():
-    if len(sys.argv) < 2:
+    args = sys.argv[1:]
+    timings = None
+    trace_path = None
+    while args and args[0] in ('--timings', '--trace'):
+        if args[0] == '--timings':
+            timings = []
+            args = args[1:]
+        else:
+            trace_path = args[1] if len(args) > 1 else 'badge-trace.json'
+            args = args[2:]
+    if not args:
         show_help()
         return 1
     
-    command = sys.argv[1]
+    command = args[0]
     
     if command == 'help' or command == '--help' or command == '-h':
         show_help()
         return 0
     
-    # Map commands to scripts
-    script_map = {
-        'info': ['badge_info.py'],
-        'monitor': ['badge_monitor.py'] + sys.argv[2:],
-        'repl': ['badge_repl.py'],
-        'exec': ['badge_exec.py'] + sys.argv[2:],
-        'ls': ['badge_file_manager.py', 'ls'] + sys.argv[2:],
-        'cat': ['badge_file_manager.py', 'cat'] + sys.argv[2:],
-        'download': ['badge_file_manager.py', 'download'] + sys.argv[2:],
-        'upload': ['badge_file_manager.py', 'upload'] + sys.argv[2:],
-        'rm': ['badge_file_manager.py', 'rm'] + sys.argv[2:],
-    }
-    
-    if command not in script_map:
+    if command not in COMMANDS:
         print(f"Unknown command: {command}")
         print("Run 'uv run badge.py help' for usage.")
         return 1
     
-    # Run the appropriate script
+    # Run the command's main() in this process instead of starting another interpreter
+    module_name, prefix = COMMANDS[command]
+    if trace_path:
+        import badge_trace
+        badge_trace.start(trace_path)
+    phase_start = time.perf_counter()
     try:
-        result = subprocess.run(['uv', 'run'] + script_map[command])
-        return result.returncode
+        if timings is not None and (command, args[1] if len(args) > 1 else None) not in OFFLINE_COMMANDS:
+            import serial
+            timings.append(('import pyserial', time.perf_counter() - phase_start))
+            phase_start = time.perf_counter()
+        module = importlib.import_module(module_name)
+        if timings is not None:
+            timings.append((f'import {module_name}', time.perf_counter() - phase_start))
+            phase_start = time.perf_counter()
+        sys.argv = [f'{module_name}.py'] + prefix + args[1:]
+        if trace_path:
+            with badge_trace.span(f'badge.py {command}', argv=' '.join(args[1:])):
+                return module.main()
+        return module.main()
     except KeyboardInterrupt:
         return 130
-    except Exception as e:
-        print(f"Error: {e}", file=sys.stderr)
-        return 1
+    finally:
+        if timings is not None:
+            timings.append((f'run {command}', time.perf_counter() - phase_start))
+            report_timings(timings)
+        if trace_path:
+            badge_trace.finish()
 
 if __name__ == "__main__":
     sys.exit(main())
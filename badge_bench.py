@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+End-to-end Benchmark Suite for Supercon 2025 Badge tools
+Times exec, info, file operations and monitor ingest against the simulated
+badge (badge_sim.py) and saves the results as JSON, so runs before and after
+a change can be compared without hardware
+"""
+import contextlib
+import io
+import json
+import os
+import platform
+import queue
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import badge_exec
+import badge_file_manager
+import badge_info
+import badge_monitor
+from badge_session import BadgeSession
+from badge_sim import FakeBadge
+
+# Slower results than the baseline by more than this fraction count as regressions
+REGRESSION_THRESHOLD = 0.2
+# Lines printed by the badge for the monitor ingest benchmark
+MONITOR_LINES = 20000
+
+def make_tree(root):
+    """Populate the simulated badge's filesystem with apps to list and copy"""
+    os.makedirs(os.path.join(root, 'apps'))
+    for app in range(8):
+        app_dir = os.path.join(root, 'apps', f'app{app}', 'lib')
+        os.makedirs(app_dir)
+        for name in ('main.py', 'lib/util.py', 'lib/ui.py'):
+            with open(os.path.join(root, 'apps', f'app{app}', name), 'w') as f:
+                f.write(f"# app {app}: {name}\n" + "print('hello badge')\n" * 100)
+    with open(os.path.join(root, 'main.py'), 'w') as f:
+        f.write("import apps\n" * 50)
+
+def time_runs(func, repeat):
+    """Run func `repeat` times; return its durations in milliseconds"""
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        runs.append((time.perf_counter() - start) * 1000)
+    return runs
+
+def reset_file_manager():
+    """Start each file manager run like a fresh invocation of the tool"""
+    badge_file_manager.close_session()
+    badge_file_manager._index = None
+    badge_file_manager._index_dirty = False
+    for key in badge_file_manager._transfer_stats:
+        badge_file_manager._transfer_stats[key] = 0
+
+def file_manager_op(func, *args):
+    """Wrap a file manager command so it runs quietly with its own session"""
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            try:
+                if not func(*args):
+                    raise RuntimeError(f"{func.__name__}{args} failed")
+            finally:
+                reset_file_manager()
+    return run
+
+def bench_monitor(badge):
+    """Return lines/s the monitor reader and writer sustain on a burst of output"""
+    session = BadgeSession(badge.port).open_console('monitor')
+    stats = badge_monitor.new_stats()
+    lines = queue.Queue(badge_monitor.LINE_QUEUE_SIZE)
+    stop = threading.Event()
+    log_path = os.path.join(tempfile.mkdtemp(prefix='badge_bench_'), 'monitor.log')
+    log = badge_monitor.RotatingLog(log_path)
+    reader = threading.Thread(target=badge_monitor.read_lines, args=(session, lines, stats, stop))
+    writer = threading.Thread(target=badge_monitor.write_lines, args=(lines, log, stop))
+    with contextlib.redirect_stdout(io.StringIO()):
+        reader.start()
+        writer.start()
+        start = time.perf_counter()
+        badge.flood(MONITOR_LINES)
+        while stats['lines'] + stats['dropped'] < MONITOR_LINES and time.perf_counter() - start < 60:
+            time.sleep(0.01)
+        stop.set()
+        writer.join()
+        elapsed = time.perf_counter() - start
+    reader.join()
+    session.close()
+    log.close()
+    shutil.rmtree(os.path.dirname(log_path))
+    return {'lines_per_s': stats['lines'] / elapsed, 'dropped': stats['dropped']}
+
+def run_suite(bandwidth, latency, repeat):
+    """Run every benchmark on a fresh simulated badge; return the results"""
+    root = tempfile.mkdtemp(prefix='badge_bench_')
+    cache = tempfile.mkdtemp(prefix='badge_bench_cache_')
+    local = tempfile.mkdtemp(prefix='badge_bench_local_')
+    fs_root = os.path.join(root, 'fs')
+    make_tree(fs_root)
+    upload_path = os.path.join(local, 'upload.bin')
+    with open(upload_path, 'wb') as f:
+        f.write(os.urandom(65536))
+
+    badge = FakeBadge(fs_root, bandwidth=bandwidth, latency=latency).start()
+    badge_file_manager.SERIAL_PORT = badge.port
+    # Keep the tools' caches out of the user's home directory
+    badge_info.INFO_CACHE = os.path.join(cache, 'info.json')
+    badge_file_manager.INDEX_CACHE = os.path.join(cache, 'index.json')
+    badge_file_manager.MANIFEST_CACHE = os.path.join(cache, 'manifest.json')
+    badge_file_manager.CHECKPOINTS = os.path.join(cache, 'transfers.json')
+
+    timings = {}
+    try:
+        session = BadgeSession(badge.port, use_broker=False)
+        timings['connect'] = time_runs(lambda: BadgeSession(badge.port, use_broker=False).open().close(),
+                                       repeat)
+        session.open()
+        timings['exec'] = time_runs(lambda: badge_exec.execute_command(session, '1 + 1'), repeat)
+        timings['info'] = time_runs(lambda: badge_info.gather_info(session), repeat)
+        session.close()
+
+        fm = badge_file_manager
+        timings['ls'] = time_runs(file_manager_op(fm.list_files, '/apps/app0'), repeat)
+        timings['cat'] = time_runs(file_manager_op(fm.read_file, '/apps/app0/main.py'), repeat)
+        timings['upload_64k'] = time_runs(file_manager_op(fm.upload_file, upload_path, '/upload.bin'),
+                                          repeat)
+        timings['download_64k'] = time_runs(
+            file_manager_op(fm.download_file, '/upload.bin', os.path.join(local, 'download.bin')), repeat)
+        timings['glob'] = time_runs(
+            file_manager_op(fm.download_glob, '/apps/**/*.py', os.path.join(local, 'glob')), repeat)
+        monitor = bench_monitor(badge)
+    finally:
+        reset_file_manager()
+        badge.stop()
+        for path in (root, cache, local):
+            shutil.rmtree(path, ignore_errors=True)
+
+    results = {name: {'median_ms': statistics.median(runs), 'min_ms': min(runs), 'runs_ms': runs}
+               for name, runs in timings.items()}
+    results['monitor'] = monitor
+    return results
+
+def compare(results, baseline, threshold):
+    """Print each benchmark against a baseline; return the names that regressed"""
+    regressions = []
+    print(f"\n{'benchmark':<14} {'baseline':>12} {'now':>12} {'change':>8}")
+    print("-" * 50)
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if 'median_ms' in result:
+            old, new, unit = before['median_ms'], result['median_ms'], 'ms'
+            change = new / max(old, 1e-9) - 1
+        else:
+            old, new, unit = before['lines_per_s'], result['lines_per_s'], 'l/s'
+            change = old / max(new, 1e-9) - 1
+        flag = ' ✗' if change > threshold else ''
+        if flag:
+            regressions.append(name)
+        print(f"{name:<14} {old:>9.1f} {unit:<3}{new:>9.1f} {unit:<3}{change:>+7.0%}{flag}")
+    return regressions
+
+def pop_option(args, name, default=None):
+    """Remove '--name VALUE' from args and return VALUE (or default)"""
+    if name in args:
+        i = args.index(name)
+        if i + 1 < len(args):
+            value = args[i + 1]
+            del args[i:i + 2]
+            return value
+    return default
+
+def main():
+    args = sys.argv[1:]
+    if '-h' in args or '--help' in args:
+        print("Badge Tools Benchmark Suite")
+        print("\nUsage:")
+        print(f"  {sys.argv[0]} [--bandwidth B] [--latency MS] [--repeat N] [--out FILE] [--compare FILE]")
+        print("\nOptions:")
+        print(f"  --bandwidth B     Simulated link speed in bytes/s (default unlimited)")
+        print(f"  --latency MS      Simulated one-way latency in milliseconds (default 0)")
+        print(f"  --repeat N        Runs per benchmark (default 5)")
+        print(f"  --out FILE        Save results as JSON")
+        print(f"  --compare FILE    Compare with saved results; exit 1 on a regression")
+        print(f"  --threshold F     Fraction slower that counts as a regression (default {REGRESSION_THRESHOLD})")
+        return 0
+    bandwidth = int(pop_option(args, '--bandwidth', 0))
+    latency = float(pop_option(args, '--latency', 0))
+    repeat = int(pop_option(args, '--repeat', 5))
+    out = pop_option(args, '--out')
+    baseline_path = pop_option(args, '--compare')
+    threshold = float(pop_option(args, '--threshold', REGRESSION_THRESHOLD))
+
+    print("Supercon 2025 Badge Tools Benchmark")
+    print("=" * 60)
+    print(f"Link: {bandwidth or 'unlimited'} bytes/s, {latency:.1f} ms latency, {repeat} runs each")
+    print("=" * 60)
+
+    results = run_suite(bandwidth, latency / 1000, repeat)
+    for name, result in results.items():
+        if 'median_ms' in result:
+            print(f"{name:<14} {result['median_ms']:>9.1f} ms median  ({result['min_ms']:.1f} ms min)")
+        else:
+            print(f"{name:<14} {result['lines_per_s']:>9.0f} lines/s   ({result['dropped']} dropped)")
+
+    report = {
+        'meta': {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'bandwidth': bandwidth,
+                 'latency_ms': latency, 'repeat': repeat, 'python': platform.python_version()},
+        'results': results,
+    }
+    if out:
+        with open(out, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✓ Results saved to: {out}")
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        if baseline['meta']['bandwidth'] != bandwidth or baseline['meta']['latency_ms'] != latency:
+            print("\nNote: the baseline was recorded with different link settings")
+        regressions = compare(results, baseline['results'], threshold)
+        if regressions:
+            print(f"\n✗ Slower than baseline: {', '.join(regressions)}")
+            return 1
+        print("\n✓ No regressions")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
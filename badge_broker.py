@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Badge Broker Daemon for Supercon 2025 Badge
+Owns the serial connection and shares it with the other badge tools over a
+Unix socket, so monitor, REPL, exec and file operations can run together
+"""
+import base64
+import collections
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import serial
+from badge_session import BadgeSession, BadgeError
+
+SERIAL_PORT = os.environ.get('BADGE_PORT', "/dev/cu.usbmodem2101")
+
+# Seconds the raw REPL is kept after a request, so bursts of requests stay warm
+RAW_REPL_LINGER = 0.5
+
+def socket_path(port=SERIAL_PORT):
+    """Unix socket the broker for a given serial port listens on"""
+    name = os.path.basename(port).replace('.', '_')
+    return os.environ.get('BADGE_BROKER_SOCKET',
+                          os.path.join('/tmp', f'badge-broker-{name}.sock'))
+
+
+class BrokerClient:
+    """Client side of the broker protocol (JSON lines over a Unix socket)
+
+    Offers the same exec_raw() as BadgeSession so callers need not care
+    whether they talk to the badge directly or through the broker.
+    """
+
+    def __init__(self, path):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self.file = self.sock.makefile('rwb')
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+    def request(self, op, **fields):
+        """Send one request and wait for its reply"""
+        self.file.write(json.dumps(dict(fields, op=op)).encode('utf-8') + b'\n')
+        self.file.flush()
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("Broker closed the connection")
+        reply = json.loads(line)
+        if reply.get('error'):
+            if reply.get('type') == 'timeout':
+                raise TimeoutError(reply['error'])
+            raise BadgeError(reply['error'])
+        return reply
+
+    def exec_raw(self, code, timeout=None):
+        """Run code on the badge through the broker's raw REPL session"""
+        if isinstance(code, str):
+            code = code.encode('utf-8')
+        reply = self.request('exec', code=base64.b64encode(code).decode('ascii'), timeout=timeout)
+        return base64.b64decode(reply['stdout']), base64.b64decode(reply['stderr'])
+
+    def lock(self):
+        """Hold the badge for this client until unlock(); other requests queue up"""
+        self.request('lock')
+
+    def unlock(self):
+        self.request('unlock')
+
+    def attach(self, mode):
+        """Turn this connection into a raw byte stream ('monitor' or 'repl')"""
+        self.file.write(json.dumps({'op': mode}).encode('utf-8') + b'\n')
+        self.file.flush()
+        # Read the acknowledgement unbuffered so no stream bytes are swallowed
+        while self.sock.recv(1) not in (b'\n', b''):
+            pass
+        self.file.close()
+        return self.sock
+
+
+def connect(port=SERIAL_PORT):
+    """Return a BrokerClient if a broker is serving this port, else None"""
+    path = socket_path(port)
+    if not os.path.exists(path):
+        return None
+    try:
+        return BrokerClient(path)
+    except OSError:
+        return None
+
+
+class Broker:
+    """Serial port owner that queues requests and fans out background output"""
+
+    def __init__(self, port=SERIAL_PORT, path=None):
+        self.session = BadgeSession(port, timeout=None)
+        self.path = path or socket_path(port)
+        self.streams = []
+        self.streams_lock = threading.Lock()
+        self.io_lock = threading.Lock()
+        self.queue = collections.deque()
+        self.queue_changed = threading.Condition()
+        self.last_request = 0.0
+        self.running = True
+
+    # -- Request queue ---------------------------------------------------
+
+    def acquire(self):
+        """Wait for our turn in the FIFO request queue and take the port"""
+        ticket = object()
+        with self.queue_changed:
+            self.queue.append(ticket)
+            while self.queue[0] is not ticket:
+                self.queue_changed.wait()
+        self.io_lock.acquire()
+
+    def release(self):
+        """Give the port to the next request (or back to the fan-out reader)"""
+        self.last_request = time.monotonic()
+        self.io_lock.release()
+        with self.queue_changed:
+            self.queue.popleft()
+            self.queue_changed.notify_all()
+
+    def run_exec(self, code, timeout):
+        if not self.session.in_raw_repl:
+            self.session.enter_raw_repl()
+        try:
+            return self.session.exec_raw(code, timeout)
+        except TimeoutError:
+            # Interrupt the stuck command and swallow its KeyboardInterrupt
+            # traceback here, so it never reaches the monitors
+            self.session.interrupt()
+            raise
+
+    # -- Background output -----------------------------------------------
+
+    def fan_out(self, data):
+        with self.streams_lock:
+            for sock in list(self.streams):
+                try:
+                    sock.sendall(data)
+                except OSError:
+                    self.streams.remove(sock)
+
+    def reader(self):
+        """Forward badge output to stream clients whenever no request is running"""
+        ser = self.session.serial
+        while self.running:
+            with self.queue_changed:
+                while self.queue and self.running:
+                    self.queue_changed.wait()
+            with self.io_lock:
+                idle = time.monotonic() - self.last_request
+                if self.session.in_raw_repl and self.streams and idle > RAW_REPL_LINGER:
+                    # No requests for a while: hand the console back to monitors and REPLs
+                    self.session.exit_raw_repl()
+                data = bytes(self.session._pending)
+                self.session._pending.clear()
+                ser.timeout = 0.05
+                try:
+                    data += ser.read(max(1, ser.in_waiting))
+                except serial.SerialException as e:
+                    print(f"Error: {e}", file=sys.stderr)
+                    self.running = False
+                    break
+            if data:
+                self.fan_out(data)
+
+    # -- Client connections ----------------------------------------------
+
+    def handle(self, conn):
+        rfile = conn.makefile('rb')
+        holding = False
+        try:
+            for line in rfile:
+                request = json.loads(line)
+                op = request.get('op')
+                reply = {}
+                if op == 'exec':
+                    code = base64.b64decode(request['code'])
+                    if not holding:
+                        self.acquire()
+                    try:
+                        stdout, stderr = self.run_exec(code, request.get('timeout'))
+                        reply = {'stdout': base64.b64encode(stdout).decode('ascii'),
+                                 'stderr': base64.b64encode(stderr).decode('ascii')}
+                    except TimeoutError as e:
+                        reply = {'error': str(e), 'type': 'timeout'}
+                    except (BadgeError, serial.SerialException, OSError) as e:
+                        reply = {'error': str(e)}
+                    finally:
+                        if not holding:
+                            self.release()
+                elif op == 'lock' and not holding:
+                    self.acquire()
+                    holding = True
+                elif op == 'unlock' and holding:
+                    self.release()
+                    holding = False
+                elif op in ('monitor', 'repl'):
+                    conn.sendall(b'{}\n')
+                    with self.streams_lock:
+                        self.streams.append(conn)
+                    if op == 'repl':
+                        self.forward_input(rfile)
+                    else:
+                        # Block until the monitor disconnects
+                        while rfile.read1(1024):
+                            pass
+                    return
+                else:
+                    reply = {'error': f'Unknown or invalid request: {op}'}
+                conn.sendall(json.dumps(reply).encode('utf-8') + b'\n')
+        except (OSError, ValueError):
+            pass
+        finally:
+            if holding:
+                self.release()
+            with self.streams_lock:
+                if conn in self.streams:
+                    self.streams.remove(conn)
+            conn.close()
+
+    def forward_input(self, rfile):
+        """Send keystrokes from a REPL client to the badge between requests"""
+        while True:
+            data = rfile.read1(1024)
+            if not data:
+                return
+            self.acquire()
+            try:
+                if self.session.in_raw_repl:
+                    self.session.exit_raw_repl()
+                self.session.serial.write(data)
+            finally:
+                self.release()
+
+    def serve(self):
+        """Open the badge and accept clients until interrupted"""
+        self.session.serial = serial.Serial(self.session.port, self.session.baudrate, timeout=1)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.path)
+        server.listen()
+        threading.Thread(target=self.reader, daemon=True).start()
+        try:
+            while self.running:
+                conn, _ = server.accept()
+                threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+        finally:
+            self.running = False
+            server.close()
+            os.unlink(self.path)
+            self.session.close()
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else None
+    broker = Broker(SERIAL_PORT, path)
+
+    print("Supercon 2025 Badge Broker")
+    print("=" * 60)
+    print(f"Port:   {SERIAL_PORT}")
+    print(f"Socket: {broker.path}")
+    print("Press Ctrl+C to exit")
+    print("=" * 60)
+
+    try:
+        broker.serve()
+    except serial.SerialException as e:
+        print(f"Error: {e}")
+        return 1
+    except KeyboardInterrupt:
+        print("\nBroker stopped.")
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,79 +2,188 @@
 """
 Quick Command Executor for Supercon 2025 Badge
 Execute a single Python command on the badge and show the result
+Runs over the raw REPL (see badge_session.py), so it returns as soon as the
+badge reports the command finished and keeps tracebacks separate from output
 """
+import ast
+import codecs
+import json
+import os
 import serial
-import time
 import sys
+import time
+from badge_session import BadgeSession, BadgeError
+
+SERIAL_PORT = os.environ.get('BADGE_PORT', "/dev/cu.usbmodem2101")
+
+def echo_last_expression(command):
+    """Rewrite code so a trailing expression prints its value like the friendly REPL"""
+    try:
+        tree = ast.parse(command)
+    except SyntaxError:
+        # Let the badge report the error in its own words
+        return command
+    if not tree.body or not isinstance(tree.body[-1], ast.Expr):
+        return command
+    last = tree.body[-1]
+    # AST column offsets count UTF-8 bytes
+    source = command.encode('utf-8')
+    lines = source.splitlines(keepends=True)
+    start = sum(len(line) for line in lines[:last.lineno - 1]) + last.col_offset
+    end = sum(len(line) for line in lines[:last.end_lineno - 1]) + last.end_col_offset
+    # Same line as the original, so traceback line numbers still match
+    return (source[:start] + b'_ = (' + source[start:end] + b')\n'
+            b'if _ is not None:\n    print(repr(_))\n').decode('utf-8')
+
+def execute_command(session, command):
+    """Execute a command and return (output, traceback) as text"""
+    stdout, stderr = session.exec_raw(echo_last_expression(command))
+    output = stdout.decode('utf-8', errors='replace').replace('\r\n', '\n')
+    error = stderr.decode('utf-8', errors='replace').replace('\r\n', '\n')
+    return output.rstrip('\n'), error.rstrip('\n')
+
+def run_program(session, code, timeout=None, stream=False):
+    """Run code, printing its output as it arrives (or all at once); return the traceback as text"""
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    output = []
+    def on_output(data, final=False):
+        text = decoder.decode(data, final).replace('\r\n', '\n')
+        if stream:
+            sys.stdout.write(text)
+            sys.stdout.flush()
+        else:
+            output.append(text)
+    try:
+        stderr = session.exec_stream(code, on_output, timeout)
+    finally:
+        on_output(b'', final=True)
+        result = ''.join(output).rstrip('\n')
+        if result:
+            print(result)
+    return stderr.decode('utf-8', errors='replace').replace('\r\n', '\n').rstrip('\n')
+
+def split_snippets(text):
+    """Split a batch into snippets: blocks between '---' lines, or else one per line"""
+    lines = text.splitlines()
+    if any(line.strip() == '---' for line in lines):
+        blocks, block = [], []
+        for line in lines + ['---']:
+            if line.strip() == '---':
+                if '\n'.join(block).strip():
+                    blocks.append('\n'.join(block).strip('\n'))
+                block = []
+            else:
+                block.append(line)
+        return blocks
+    return [line for line in lines if line.strip() and not line.lstrip().startswith('#')]
 
-SERIAL_PORT = "/dev/cu.usbmodem2101"
-BAUD_RATE = 115200
+def run_batch(session, snippets, timeout=None, stop_on_error=False):
+    """Run snippets back to back, printing one JSON line per result; return the failure count"""
+    failures = 0
+    with session.exclusive():
+        for index, snippet in enumerate(snippets):
+            output = []
+            start = time.perf_counter()
+            try:
+                stderr = session.exec_stream(echo_last_expression(snippet), output.append, timeout)
+                error = stderr.decode('utf-8', errors='replace').replace('\r\n', '\n').rstrip('\n')
+            except TimeoutError:
+                error = f"Timed out after {timeout}s; program interrupted"
+            except BadgeError as e:
+                error = str(e)
+            elapsed = time.perf_counter() - start
+            stdout = b''.join(output).decode('utf-8', errors='replace').replace('\r\n', '\n')
+            print(json.dumps({'index': index, 'code': snippet, 'stdout': stdout, 'error': error or None,
+                              'elapsed_ms': round(elapsed * 1000, 2)}), flush=True)
+            if error:
+                failures += 1
+                if stop_on_error:
+                    break
+    return failures
 
-def execute_command(ser, command):
-    """Execute a command and return clean output"""
-    # Enter REPL
-    ser.write(b'\x03')
-    time.sleep(0.5)
-    ser.reset_input_buffer()
-    
-    # Send command
-    ser.write((command + '\r\n').encode('utf-8'))
-    time.sleep(0.5)
-    
-    # Read response
-    response = ""
-    while ser.in_waiting:
-        response += ser.read(ser.in_waiting).decode('utf-8', errors='ignore')
-        time.sleep(0.1)
-    
-    # Extract output (skip echo and prompts)
-    lines = response.split('\n')
-    output_lines = []
-    skip_next = False
-    
-    for line in lines:
-        clean = line.strip()
-        if skip_next or not clean or clean.startswith('>>>') or clean == command:
-            skip_next = False
-            continue
-        output_lines.append(clean)
-    
-    return '\n'.join(output_lines)
+def pop_option(args, name, default=None):
+    """Remove '--name VALUE' from args and return VALUE (or default)"""
+    if name in args:
+        i = args.index(name)
+        if i + 1 < len(args):
+            value = args[i + 1]
+            del args[i:i + 2]
+            return value
+    return default
 
 def main():
-    if len(sys.argv) < 2:
+    args = sys.argv[1:]
+    script = pop_option(args, '--file')
+    batch = pop_option(args, '--batch')
+    timeout = pop_option(args, '--timeout')
+    stream = '--stream' in args
+    reset = '--reset' in args
+    stop_on_error = '--stop-on-error' in args
+    args = [a for a in args if a not in ('--stream', '--reset', '--stop-on-error')]
+
+    if not args and not script and not batch:
         print("Badge Quick Command Executor")
         print("\nUsage:")
-        print(f"  {sys.argv[0]} '<python_command>'")
+        print(f"  {sys.argv[0]} [options] '<python_command>'")
+        print(f"  {sys.argv[0]} [options] --file script.py")
+        print(f"  {sys.argv[0]} [options] --batch snippets.txt|-")
+        print("\nOptions:")
+        print(f"  --file PATH       Run a local script instead of a command")
+        print(f"  --stream          Print output as the badge produces it")
+        print(f"  --timeout S       Interrupt the program (Ctrl-C) after S seconds (per snippet with --batch)")
+        print(f"  --batch PATH|-    Run many snippets in one session, one JSON result line each;")
+        print(f"                    snippets are blocks between '---' lines, or else single lines")
+        print(f"  --stop-on-error   With --batch, stop at the first snippet that fails")
+        print(f"  --reset           Soft-reset the badge afterwards (restarts its app)")
+        print("\nExit status: 0 ok, 1 exception on the badge, 124 timed out, 130 interrupted")
+        print("With --batch: 0 if every snippet succeeded, else 1")
         print("\nExamples:")
         print(f"  {sys.argv[0]} 'import gc; print(gc.mem_free())'")
         print(f"  {sys.argv[0]} 'import machine; print(machine.freq())'")
         print(f"  {sys.argv[0]} 'import os; print(os.listdir(\"/\"))'")
+        print(f"  {sys.argv[0]} --file diagnostics.py --stream --timeout 600")
+        print(f"  {sys.argv[0]} --batch provision.txt --stop-on-error > results.jsonl")
         return 1
-    
-    command = ' '.join(sys.argv[1:])
-    ser = None
-    
+
+    if batch == '-':
+        snippets = split_snippets(sys.stdin.read())
+    elif batch:
+        with open(batch, encoding='utf-8') as f:
+            snippets = split_snippets(f.read())
+    elif script:
+        with open(script, encoding='utf-8') as f:
+            code = f.read()
+    else:
+        code = echo_last_expression(' '.join(args))
+    # No command timeout unless asked: wait for as long as the badge takes to finish
+    session = BadgeSession(SERIAL_PORT, timeout=None)
+
     try:
-        ser = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=1)
-        result = execute_command(ser, command)
-        
-        if result:
-            print(result)
-        
-        # Reset
-        ser.write(b'\x04')
-        time.sleep(0.5)
-        
-    except serial.SerialException as e:
+        session.open()
+        if batch:
+            return 1 if run_batch(session, snippets, float(timeout) if timeout else None, stop_on_error) else 0
+        try:
+            error = run_program(session, code, float(timeout) if timeout else None, stream)
+        except TimeoutError:
+            print(f"✗ Timed out after {timeout}s; program interrupted", file=sys.stderr)
+            return 124
+        except BadgeError as e:
+            # The badge broke off the run (aborted upload, missing end markers)
+            print(f"✗ {e}", file=sys.stderr)
+            return 1
+        if error:
+            print(error, file=sys.stderr)
+            return 1
+
+    except (serial.SerialException, BadgeError, TimeoutError, OSError) as e:
         print(f"Error: {e}", file=sys.stderr)
         return 1
     except KeyboardInterrupt:
-        return 1
+        print("\nInterrupted", file=sys.stderr)
+        return 130
     finally:
-        if ser is not None:
-            ser.close()
-    
+        session.close(soft_reset=reset)
+
     return 0
 
 if __name__ == "__main__":
@@ -2,131 +2,670 @@
 """
 File Manager for Supercon 2025 Badge
 Upload, download, and manage files on the badge filesystem
-Uses mpremote (official MicroPython tool) for reliable file operations
+Runs every operation over one raw REPL session (see badge_session.py), so
+the port is opened and the REPL entered only once per invocation
 """
 import sys
 import os
-import subprocess
+import codecs
 import fnmatch
+import hashlib
+import io
+import json
+import shutil
+import subprocess
+import tarfile
+import tempfile
+import time
+import badge_trace
+from badge_session import BadgeSession, BadgeError
+
+SERIAL_PORT = os.environ.get('BADGE_PORT', "/dev/cu.usbmodem2101")
+
+# Extensions whose content is already compressed and not worth deflating
+COMPRESSED_EXTENSIONS = {'.gz', '.zip', '.png', '.jpg', '.jpeg', '.gif', '.webp',
+                         '.mp3', '.ogg', '.bz2', '.xz', '.zst'}
+
+# Compiled .mpy files keyed by source hash, target architecture and mpy-cross version
+MPY_CACHE = os.path.join(os.path.expanduser('~'), '.cache', 'supercon-badge', 'mpy')
+# Files the firmware runs by name; these are always uploaded as source
+KEEP_AS_SOURCE = {'main.py', 'boot.py'}
+# Architecture codes in sys.implementation._mpy (bits 10 and up) as mpy-cross -march names
+MPY_ARCHES = [None, 'x86', 'x64', 'armv6', 'armv6m', 'armv7m', 'armv7em', 'armv7emsp',
+              'armv7emdp', 'xtensa', 'xtensawin', 'rv32imc']
+
+# Local file hashes keyed by path, size and mtime so unchanged files are not re-hashed
+MANIFEST_CACHE = os.path.join(os.path.expanduser('~'), '.cache', 'supercon-badge', 'manifest.json')
+
+# Remote filesystem index per serial port, reused by later runs within INDEX_TTL
+INDEX_CACHE = os.path.join(os.path.expanduser('~'), '.cache', 'supercon-badge', 'index.json')
+# Seconds a saved index stays valid (0: walk the badge once per run)
+INDEX_TTL = 0
+
+# Progress of interrupted single-file transfers, so the next attempt can resume
+CHECKPOINTS = os.path.join(os.path.expanduser('~'), '.cache', 'supercon-badge', 'transfers.json')
+# Files at least this big are transferred resumably and verified by sha256
+RESUMABLE_SIZE = 16 * 1024
+# Bytes downloaded between checkpoint saves
+CHECKPOINT_EVERY = 64 * 1024
+
+_session = None
+
+# Running totals for the throughput report
+_transfer_stats = {'files': 0, 'bytes': 0, 'wire_bytes': 0, 'seconds': 0.0}
 
-SERIAL_PORT = "/dev/cu.usbmodem2101"
+# Remote index {path: (is_dir, size, mtime)}, when it was walked, and whether to save it
+_index = None
+_index_time = 0.0
+_index_dirty = False
 
-def mpremote_cmd(*args):
-    """Run an mpremote command without resetting the device"""
-    # Use 'connect' + 'resume' to connect without soft-reset that turns off display
-    cmd = ['mpremote', 'connect', SERIAL_PORT, 'resume'] + list(args)
-    result = subprocess.run(cmd, capture_output=False)
-    return result.returncode == 0
+# Target and totals for .mpy precompilation
+_mpy_target = None
+_compile_stats = {'files': 0, 'cached': 0, 'source_bytes': 0, 'mpy_bytes': 0, 'sources': []}
+
+def get_session():
+    """Return the shared badge session, opening it on first use"""
+    global _session
+    if _session is None:
+        # Entering the raw REPL without a soft reset keeps the display running
+        _session = BadgeSession(SERIAL_PORT).open()
+    return _session
+
+def close_session():
+    """Close the shared badge session if one is open"""
+    global _session
+    if _session is not None:
+        _session.close()
+        _session = None
+
+def remote_join(directory, name):
+    """Join a remote directory and a name"""
+    return f'/{name}' if directory in ('', '/') else f"{directory.rstrip('/')}/{name}"
+
+def normalize_remote(path):
+    """Absolute remote path without a trailing slash"""
+    return '/' + path.strip('/')
+
+def load_index_cache():
+    """Return (index, walk time) saved for this port within INDEX_TTL, else (None, 0)"""
+    try:
+        with open(INDEX_CACHE) as f:
+            saved = json.load(f)[SERIAL_PORT]
+    except (OSError, ValueError, KeyError):
+        return None, 0.0
+    if time.time() - saved['time'] > INDEX_TTL:
+        return None, 0.0
+    return {path: tuple(entry) for path, entry in saved['entries'].items()}, saved['time']
+
+def save_index_cache():
+    """Store the index (or drop a stale one after writes) for later runs"""
+    if not _index_dirty:
+        return
+    try:
+        with open(INDEX_CACHE) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    if _index is None:
+        cache.pop(SERIAL_PORT, None)
+    else:
+        cache[SERIAL_PORT] = {'time': _index_time, 'entries': _index}
+    os.makedirs(os.path.dirname(INDEX_CACHE), exist_ok=True)
+    tmp = f'{INDEX_CACHE}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(cache, f)
+    os.replace(tmp, INDEX_CACHE)
 
-def mpremote_cmd_output(*args):
-    """Run an mpremote command and capture output"""
-    cmd = ['mpremote', 'connect', SERIAL_PORT, 'resume'] + list(args)
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    return result.stdout if result.returncode == 0 else None
+def remote_index(walk=True):
+    """Return {path: (is_dir, size, mtime)} for the whole badge
+
+    The badge is walked in a single round trip at most once per run (or once
+    per INDEX_TTL); with walk=False only an index already at hand is returned.
+    """
+    global _index, _index_time, _index_dirty
+    if _index is None and INDEX_TTL > 0:
+        _index, _index_time = load_index_cache()
+    if _index is None and walk:
+        _index = {'/': (True, 0, 0)}
+        for path, is_dir, size, mtime in get_session().fs_walk('/'):
+            _index[path] = (is_dir, size, mtime)
+        _index_time = time.time()
+        _index_dirty = True
+    return _index
+
+def index_update(path, is_dir=False, size=0):
+    """Record a file or directory written by this tool"""
+    global _index_dirty
+    _index_dirty = True
+    if _index is not None:
+        path = normalize_remote(path)
+        # The badge's own mtime is unknown until the next walk
+        _index[path] = (is_dir, size, None)
+        parent = path.rsplit('/', 1)[0] or '/'
+        while parent not in _index:
+            _index[parent] = (True, 0, None)
+            parent = parent.rsplit('/', 1)[0] or '/'
+
+def index_remove(path):
+    """Forget a removed path and everything below it"""
+    global _index_dirty
+    _index_dirty = True
+    if _index is not None:
+        path = normalize_remote(path)
+        for entry in [p for p in _index if p == path or p.startswith(path + '/')]:
+            del _index[entry]
+
+def remote_stat(path, walk=True):
+    """Return (is_dir, size, mtime) for a remote path, or None if it does not exist"""
+    index = remote_index(walk)
+    return index.get(normalize_remote(path)) if index is not None else None
+
+def remote_tree(directory):
+    """Yield (relative path, (is_dir, size, mtime)) below a remote directory, parents first"""
+    prefix = normalize_remote(directory).rstrip('/') + '/'
+    for path, entry in remote_index().items():
+        if path.startswith(prefix) and path != prefix:
+            yield path[len(prefix):], entry
+
+def match_segments(pattern, parts):
+    """Match path segments against glob segments, where '**' spans any depth"""
+    if not pattern:
+        return not parts
+    if pattern[0] == '**':
+        return any(match_segments(pattern[1:], parts[i:]) for i in range(len(parts) + 1))
+    return (bool(parts) and fnmatch.fnmatchcase(parts[0], pattern[0])
+            and match_segments(pattern[1:], parts[1:]))
+
+def glob_base(pattern):
+    """Directory part of a glob pattern before the first wildcard"""
+    parts = normalize_remote(pattern).split('/')[1:]
+    literal = []
+    for part in parts[:-1]:
+        if any(c in part for c in '*?['):
+            break
+        literal.append(part)
+    return '/' + '/'.join(literal)
 
 def expand_remote_glob(pattern):
-    """Expand a glob pattern on the remote device"""
+    """Expand a glob pattern ('*', '?' and '**' for any depth) against the remote index"""
     if '*' not in pattern and '?' not in pattern:
         return [pattern]
     
-    # Split path into directory and pattern
-    if '/' in pattern:
-        directory = pattern.rsplit('/', 1)[0]
-        file_pattern = pattern.rsplit('/', 1)[1]
-    else:
-        directory = '/'
-        file_pattern = pattern
-    
-    # Validate directory doesn't contain dangerous characters
-    if "'" in directory or '"' in directory or '\n' in directory:
-        print(f"✗ Invalid directory path: {directory}")
-        return []
-    
-    # Normalize empty directory to root
-    if not directory:
-        directory = '/'
-    
-    # Get list of files in directory using safe string escaping
-    # Using repr() to safely escape the directory path
-    code = f"""
-import os
-try:
-    files = os.listdir({repr(directory)})
-    for f in files:
-        print(f)
-except Exception as e:
-    print(f"ERROR: {{e}}")
-"""
-    
-    output = mpremote_cmd_output('exec', code)
-    if not output:
-        return []
-    
-    # Check for errors in output
-    if output.strip().startswith('ERROR:'):
-        print(f"✗ {output.strip()}")
+    segments = normalize_remote(pattern).split('/')[1:]
+    try:
+        index = remote_index()
+    except BadgeError as e:
+        print(f"✗ {e}")
         return []
     
     # Filter files matching the pattern
-    matching_files = []
-    for line in output.strip().split('\n'):
-        filename = line.strip()
-        # Skip empty lines and list comprehension artifacts
-        if not filename or filename.startswith('[') or filename.startswith("'"):
-            continue
-        if fnmatch.fnmatch(filename, file_pattern):
-            if directory == '/':
-                matching_files.append(f'/{filename}')
-            else:
-                matching_files.append(f'{directory}/{filename}')
-    
-    return matching_files
+    return [path for path, (is_dir, _, _) in index.items()
+            if not is_dir and match_segments(segments, path.split('/')[1:])]
 
 def list_files(path='/'):
     """List files in a directory on the badge"""
     print(f"Listing files in: {path}")
-    # mpremote automatically formats output nicely
-    mpremote_cmd('fs', 'ls', f':{path}')
+    try:
+        entry = remote_stat(path)
+    except BadgeError as e:
+        print(f"✗ {e}")
+        return False
+    if entry is None:
+        print(f"✗ No such file or directory: {path}")
+        return False
+    if entry[0]:
+        entries = [(rel, stat) for rel, stat in remote_tree(path) if '/' not in rel]
+    else:
+        entries = [(path.rsplit('/', 1)[-1], entry)]
+    for name, (is_dir, size, mtime) in entries:
+        modified = time.strftime('%Y-%m-%d %H:%M', time.localtime(mtime)) if mtime else ''
+        print(f"{size:>12} {modified:>16} {name}{'/' if is_dir else ''}")
     return True
 
-def read_file(filepath):
-    """Read and display a file from the badge"""
+def read_file(filepath, head=None, tail=None, offset=0, length=None):
+    """Read and display a file (or its first/last lines, or a byte range) from the badge"""
     print(f"Reading file: {filepath}")
-    
-    # First, check if file is binary by reading first few bytes
-    code = f"""
-try:
-    with open({repr(filepath)}, 'rb') as f:
-        data = f.read(512)
-        # Check for null bytes (common in binary files)
-        has_null = b'\\x00' in data
-        # Try to decode as text
-        try:
-            data.decode('utf-8')
-            is_text = True
-        except:
-            is_text = False
-        print('BINARY' if (has_null or not is_text) else 'TEXT')
-except Exception as e:
-    print(f'ERROR:{{e}}')
-"""
-    
-    result = mpremote_cmd_output('exec', code)
-    
-    if result and 'BINARY' in result:
-        print(f"✗ Binary file detected. Use 'download' to save it locally instead.")
-        print(f"  Example: uv run badge.py download {filepath} ./local_file")
+    # Answer from the index without a round trip when one is already at hand
+    entry = remote_stat(filepath, walk=False)
+    if entry is not None and entry[0]:
+        print(f"✗ '{filepath}' is a directory")
         return False
-    elif result and 'ERROR:' in result:
-        print(f"✗ {result.strip()}")
+    if entry is None and remote_index(walk=False) is not None:
+        print(f"✗ No such file: {filepath}")
         return False
+    session = get_session()
     
-    print("-" * 60)
-    # Use mpremote to cat the file
-    success = mpremote_cmd('fs', 'cat', f':{filepath}')
-    return success
+    # The badge checks the first 512 bytes for binary data, then sends only
+    # the requested part, in the same program run
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    try:
+        records = session.fs_read_part(filepath, head, tail, offset, length, text_only=True)
+        for record in records:
+            if record[0] == 'info' and not record[2]:
+                # Finish the badge's program now rather than when the session closes
+                records.close()
+                print(f"✗ Binary file detected. Use 'download' to save it locally instead.")
+                print(f"  Example: uv run badge.py download {filepath} ./local_file")
+                return False
+            elif record[0] == 'info':
+                print("-" * 60)
+            else:
+                sys.stdout.write(decoder.decode(record[1]))
+                sys.stdout.flush()
+    except BadgeError as e:
+        print(f"✗ {e}")
+        return False
+    sys.stdout.write(decoder.decode(b'', final=True))
+    sys.stdout.flush()
+    return True
+
+def parse_range(text):
+    """Parse 'OFFSET:LEN' (LEN optional, negative OFFSET from the end) into (offset, length)"""
+    offset, _, length = text.partition(':')
+    return int(offset or 0), int(length) if length else None
+
+def worth_compressing(path):
+    """Skip deflate for formats that are already compressed"""
+    return os.path.splitext(path)[1].lower() not in COMPRESSED_EXTENSIONS
+
+def record_transfer(size, wire_bytes, seconds):
+    """Add one file transfer to the throughput totals"""
+    _transfer_stats['files'] += 1
+    _transfer_stats['bytes'] += size
+    _transfer_stats['wire_bytes'] += wire_bytes
+    _transfer_stats['seconds'] += seconds
+
+def report_transfer_stats():
+    """Print file throughput and how many bytes actually crossed the link"""
+    stats = _transfer_stats
+    if not stats['files']:
+        return
+    rate = stats['bytes'] / max(stats['seconds'], 1e-6) / 1024
+    ratio = stats['bytes'] / max(stats['wire_bytes'], 1)
+    print(f"  {stats['bytes']} bytes in {stats['seconds']:.2f}s ({rate:.1f} KB/s), "
+          f"{stats['wire_bytes']} bytes on the wire ({ratio:.2f}x)")
+
+def mpy_target():
+    """Return (mpy-cross path, version string, -march) for the connected badge"""
+    global _mpy_target
+    if _mpy_target is None:
+        mpy_cross = os.environ.get('MPY_CROSS') or shutil.which('mpy-cross')
+        if not mpy_cross:
+            raise OSError("mpy-cross not found (install it with 'uv add mpy-cross' or set MPY_CROSS)")
+        version = subprocess.run([mpy_cross, '--version'], capture_output=True, text=True).stdout.strip()
+        mpy = get_session().eval("getattr(__import__('sys').implementation, '_mpy', 0)")
+        arch = MPY_ARCHES[mpy >> 10] if mpy >> 10 < len(MPY_ARCHES) else None
+        badge_format = f"mpy v{mpy & 0xff}.{mpy >> 8 & 3}"
+        if mpy and badge_format not in version:
+            raise OSError(f"mpy-cross emits a different format than the badge loads "
+                          f"({version} vs {badge_format})")
+        _mpy_target = (mpy_cross, version, arch or 'xtensawin')
+    return _mpy_target
+
+@badge_trace.traced('mpy-cross')
+def compile_mpy(local_path, source_name):
+    """Compile a .py file to .mpy for the badge, reusing the cached result when unchanged"""
+    mpy_cross, version, march = mpy_target()
+    with open(local_path, 'rb') as f:
+        source = f.read()
+    key = hashlib.sha256(b'\0'.join([source, source_name.encode(), march.encode(),
+                                      version.encode()])).hexdigest()
+    cached = os.path.join(MPY_CACHE, key + '.mpy')
+    _compile_stats['files'] += 1
+    _compile_stats['source_bytes'] += len(source)
+    _compile_stats['sources'].append(source)
+    if os.path.exists(cached):
+        _compile_stats['cached'] += 1
+        with open(cached, 'rb') as f:
+            compiled = f.read()
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, 'out.mpy')
+            result = subprocess.run([mpy_cross, f'-march={march}', '-s', source_name,
+                                     '-o', output, local_path], capture_output=True, text=True)
+            if result.returncode != 0:
+                raise OSError(f"mpy-cross failed for {local_path}: {result.stderr.strip()}")
+            with open(output, 'rb') as f:
+                compiled = f.read()
+        os.makedirs(MPY_CACHE, exist_ok=True)
+        tmp = f'{cached}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(compiled)
+        os.replace(tmp, cached)
+    _compile_stats['mpy_bytes'] += len(compiled)
+    return compiled
+
+def measure_compile_cost(sources):
+    """Time compiling each source on the badge: the import work an .mpy skips"""
+    session = get_session()
+    total_us = 0
+    peak = 0
+    for source in sources:
+        code = f"""
+import gc, time
+gc.collect()
+m = gc.mem_free()
+t = time.ticks_us()
+compile({source.decode('utf-8')!r}, 'm', 'exec')
+t = time.ticks_diff(time.ticks_us(), t)
+print(t, m - gc.mem_free())
+"""
+        elapsed, allocated = session.exec(code).split()
+        total_us += int(elapsed)
+        peak = max(peak, int(allocated))
+    return total_us / 1000, peak
+
+def report_compile_stats(measure=False):
+    """Print bytes saved by .mpy precompilation (and the badge-side compile time avoided)"""
+    stats = _compile_stats
+    if not stats['files']:
+        return
+    saved = stats['source_bytes'] - stats['mpy_bytes']
+    print(f"  Compiled {stats['files']} modules ({stats['cached']} from cache): "
+          f"{stats['source_bytes']} -> {stats['mpy_bytes']} bytes ({saved} saved)")
+    if measure:
+        milliseconds, peak = measure_compile_cost(stats['sources'])
+        print(f"  Import time saved on badge: {milliseconds:.1f} ms of compiling "
+              f"(up to {peak} bytes of RAM per module)")
+
+def prepare_upload(local_path, remote_path, precompile=False):
+    """Read (or compile) a local file; return (remote path, data, stale source to remove)"""
+    name = os.path.basename(local_path)
+    if precompile and name.endswith('.py') and name not in KEEP_AS_SOURCE:
+        stale_source = remote_path
+        if remote_path.endswith('.py'):
+            remote_path = remote_path[:-3] + '.mpy'
+        elif not remote_path.endswith('.mpy'):
+            # Only a .mpy name can be imported: /apps/bar becomes /apps/bar.mpy
+            stale_source = None
+            remote_path += '.mpy'
+        data = compile_mpy(local_path, name)
+    else:
+        stale_source = None
+        with open(local_path, 'rb') as f:
+            data = f.read()
+    # The badge imports foo.py before foo.mpy, so an old source would win
+    return remote_path, data, stale_source if stale_source != remote_path else None
+
+def load_checkpoints():
+    """Load saved transfer progress (empty if missing or unreadable)"""
+    try:
+        with open(CHECKPOINTS) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_checkpoint(key, entry):
+    """Record (or, with entry None, forget) one transfer's progress"""
+    checkpoints = load_checkpoints()
+    if entry is None:
+        checkpoints.pop(key, None)
+    else:
+        checkpoints[key] = entry
+    os.makedirs(os.path.dirname(CHECKPOINTS), exist_ok=True)
+    tmp = f'{CHECKPOINTS}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(checkpoints, f)
+    os.replace(tmp, CHECKPOINTS)
+
+def checkpoint_key(direction, local_path, remote_path):
+    return f"{direction} {SERIAL_PORT} {remote_path} {os.path.abspath(local_path)}"
+
+def put_resumable(local_path, remote_path, data):
+    """Upload through a partial file on the badge, continuing an interrupted attempt
+
+    The partial file is kept across attempts; it is only continued if the
+    checkpoint says it belongs to the same data and its sha256 on the badge
+    matches the start of that data. The finished file is verified by sha256
+    before it replaces remote_path. Returns bytes sent.
+    """
+    session = get_session()
+    digest = hashlib.sha256(data).hexdigest()
+    partial = remote_path + '.part~'
+    key = checkpoint_key('put', local_path, remote_path)
+    offset = 0
+    if load_checkpoints().get(key, {}).get('sha256') == digest:
+        existing = session.fs_hash(partial)
+        if (existing is not None and existing[0] <= len(data)
+                and existing[1] == hashlib.sha256(data[:existing[0]]).hexdigest()):
+            offset = existing[0]
+            print(f"  Resuming {remote_path} at {offset}/{len(data)} bytes")
+    save_checkpoint(key, {'sha256': digest, 'size': len(data)})
+    if offset < len(data):
+        session.fs_put_windowed(partial, data[offset:], append=offset > 0)
+    if session.fs_hash(partial) != (len(data), digest):
+        session.fs_remove(partial, missing_ok=True)
+        save_checkpoint(key, None)
+        raise OSError(f"{remote_path} does not match on the badge (sha256); upload it again")
+    session.fs_rename(partial, remote_path)
+    save_checkpoint(key, None)
+    return len(data) - offset
+
+def get_resumable(remote_path, local_path):
+    """Download into a local .part file, continuing an interrupted attempt
+
+    Progress is checkpointed as verified chunks land; a later attempt
+    continues from there if the badge's file still has the same sha256,
+    which the finished file is checked against. Returns bytes received.
+    """
+    session = get_session()
+    entry = session.fs_hash(remote_path)
+    if entry is None:
+        raise OSError(f"No such file: {remote_path}")
+    size, digest = entry
+    partial = local_path + '.part'
+    key = checkpoint_key('get', local_path, remote_path)
+    checkpoint = load_checkpoints().get(key)
+    offset = 0
+    if checkpoint and checkpoint['sha256'] == digest and os.path.exists(partial):
+        offset = min(checkpoint['offset'], os.path.getsize(partial))
+        print(f"  Resuming {remote_path} at {offset}/{size} bytes")
+    progress = {'sha256': digest, 'size': size, 'offset': offset}
+    with open(partial, 'r+b' if offset else 'wb') as f:
+        f.truncate(offset)
+        f.seek(offset)
+        saved = offset
+        def on_chunk(chunk):
+            nonlocal saved
+            f.write(chunk)
+            progress['offset'] += len(chunk)
+            if progress['offset'] - saved >= CHECKPOINT_EVERY:
+                f.flush()
+                save_checkpoint(key, progress)
+                saved = progress['offset']
+        try:
+            session.fs_get_windowed(remote_path, offset=offset, on_chunk=on_chunk)
+        finally:
+            f.flush()
+            save_checkpoint(key, progress)
+    h = hashlib.sha256()
+    with open(partial, 'rb') as f:
+        for block in iter(lambda: f.read(65536), b''):
+            h.update(block)
+    save_checkpoint(key, None)
+    if h.hexdigest() != digest:
+        os.remove(partial)
+        raise OSError(f"{local_path} does not match the badge's copy (sha256); download it again")
+    os.replace(partial, local_path)
+    return size - offset
 
-def upload_file(local_path, remote_path, recursive=False):
+@badge_trace.traced('upload file')
+def put_file(local_path, remote_path, compress=False, precompile=False):
+    """Copy one local file to the badge over the shared session"""
+    session = get_session()
+    remote_path, data, stale_source = prepare_upload(local_path, remote_path, precompile)
+    badge_trace.count(bytes=len(data))
+    start, wire = time.monotonic(), session.tx_bytes + session.rx_bytes
+    compress = compress and worth_compressing(local_path)
+    if session.broker is None and not compress and len(data) >= RESUMABLE_SIZE:
+        sent = put_resumable(local_path, remote_path, data)
+    else:
+        session.fs_writefile(remote_path, data, compress=compress)
+        sent = len(data)
+    record_transfer(sent, session.tx_bytes + session.rx_bytes - wire, time.monotonic() - start)
+    index_update(remote_path, size=len(data))
+    if stale_source:
+        session.fs_remove(stale_source, missing_ok=True)
+        index_remove(stale_source)
+
+@badge_trace.traced('upload archive')
+def put_files(uploads, dirs=(), compress=False, precompile=False):
+    """Copy many local files (and create directories) in one continuous transfer
+
+    `uploads` is a list of (local path, remote path). Through the broker,
+    which cannot stream to a running program, files are copied one by one.
+    The badge reports a sha256 manifest of what it wrote, which is checked
+    against the local data.
+    """
+    session = get_session()
+    if session.broker is not None:
+        for remote_dir in dirs:
+            session.fs_mkdir(remote_dir)
+            index_update(remote_dir, is_dir=True)
+        for local_path, remote_path in uploads:
+            put_file(local_path, remote_path, compress, precompile)
+        return
+    files, stale = [], []
+    for local_path, remote_path in uploads:
+        remote_path, data, stale_source = prepare_upload(local_path, remote_path, precompile)
+        files.append((remote_path, data, compress and worth_compressing(local_path)))
+        if stale_source:
+            stale.append(stale_source)
+    total = sum(len(data) for _, data, _ in files)
+    badge_trace.count(bytes=total)
+    start, wire = time.monotonic(), session.tx_bytes + session.rx_bytes
+    manifest = session.fs_write_archive(files, dirs, stale)
+    record_transfer(total, session.tx_bytes + session.rx_bytes - wire, time.monotonic() - start)
+    for remote_dir in dirs:
+        index_update(remote_dir, is_dir=True)
+    for path in stale:
+        index_remove(path)
+    bad = []
+    for remote_path, data, _ in files:
+        index_update(remote_path, size=len(data))
+        if manifest.get(remote_path) != (len(data), hashlib.sha256(data).hexdigest()):
+            bad.append(remote_path)
+    if bad:
+        raise OSError(f"Checksum mismatch on badge for {len(bad)} files: {', '.join(bad)}")
+
+def put_tree(local_dir, remote_dir, compress=False, precompile=False):
+    """Copy a local directory tree to the badge; return the number of files"""
+    dirs = [remote_dir]
+    uploads = []
+    for root, subdirs, files in os.walk(local_dir):
+        subdirs.sort()
+        rel = os.path.relpath(root, local_dir)
+        remote_root = remote_dir if rel == '.' else remote_join(remote_dir, rel.replace(os.sep, '/'))
+        dirs += [remote_join(remote_root, name) for name in subdirs]
+        uploads += [(os.path.join(root, name), remote_join(remote_root, name)) for name in sorted(files)]
+    put_files(uploads, dirs, compress, precompile)
+    return len(uploads)
+
+@badge_trace.traced('download file')
+def get_file(remote_path, local_path, compress=False):
+    """Copy one badge file to a local path over the shared session"""
+    session = get_session()
+    start, wire = time.monotonic(), session.tx_bytes + session.rx_bytes
+    compress = compress and worth_compressing(remote_path)
+    entry = remote_stat(remote_path, walk=False)
+    if session.broker is None and not compress and entry is not None and entry[1] >= RESUMABLE_SIZE:
+        size = get_resumable(remote_path, local_path)
+    else:
+        data = session.fs_readfile(remote_path, compress=compress)
+        size = len(data)
+        with open(local_path, 'wb') as f:
+            f.write(data)
+    badge_trace.count(bytes=size)
+    record_transfer(size, session.tx_bytes + session.rx_bytes - wire, time.monotonic() - start)
+
+def add_to_tar(tar, name, data=None):
+    """Add a file (or, with no data, a directory) to an open tar"""
+    info = tarfile.TarInfo(name)
+    info.mtime = time.time()
+    if data is None:
+        info.type, info.mode = tarfile.DIRTYPE, 0o755
+        tar.addfile(info)
+    else:
+        info.size, info.mode = len(data), 0o644
+        tar.addfile(info, io.BytesIO(data))
+
+@badge_trace.traced('download archive')
+def get_archive(remote_paths, base, local_dir, compress=False, verbose=False):
+    """Fetch files and directory trees in one continuous stream
+
+    Each remote path is stored relative to `base` below local_dir, as it
+    arrives; a local_dir ending in '.tar' is written as a tar file instead.
+    Files whose CRC does not match are fetched again with the checked
+    windowed transfer. Returns (files saved, [(path, error)] unreadable).
+    """
+    session = get_session()
+    start, wire = time.monotonic(), session.tx_bytes + session.rx_bytes
+    tar = tarfile.open(local_dir, 'w') if local_dir.endswith('.tar') else None
+    if tar is None:
+        os.makedirs(local_dir, exist_ok=True)
+    relative = lambda path: path[len(base):].lstrip('/')
+    local = lambda path: os.path.join(local_dir, *relative(path).split('/'))
+    count = total = 0
+    corrupt, errors = [], []
+    current = None
+    try:
+        for record in session.fs_read_archive(remote_paths, compress):
+            kind = record[0]
+            if kind == 'data':
+                current.write(record[1])
+                total += len(record[1])
+            elif kind == 'file':
+                if tar is not None:
+                    current = io.BytesIO()
+                else:
+                    os.makedirs(os.path.dirname(local(record[1])), exist_ok=True)
+                    current = open(local(record[1]), 'wb')
+            elif kind == 'end':
+                _, path, crc_ok = record
+                if tar is None:
+                    current.close()
+                if crc_ok is False:
+                    corrupt.append(path)
+                else:
+                    if tar is not None:
+                        add_to_tar(tar, relative(path), current.getvalue())
+                    count += 1
+                    if verbose:
+                        print(f"  ↓ {path}")
+                current = None
+            elif kind == 'dir' and relative(record[1]):
+                if tar is not None:
+                    add_to_tar(tar, relative(record[1]))
+                else:
+                    os.makedirs(local(record[1]), exist_ok=True)
+            elif kind == 'error':
+                print(f"  ✗ {record[1]}: {record[2]}")
+                errors.append(record[1:])
+        badge_trace.count(bytes=total)
+        record_transfer(total, session.tx_bytes + session.rx_bytes - wire, time.monotonic() - start)
+        for path in corrupt:
+            print(f"  ↻ {path} (CRC mismatch, fetching again)")
+            if tar is not None:
+                add_to_tar(tar, relative(path), session.fs_readfile(path))
+            else:
+                get_file(path, local(path))
+            count += 1
+    finally:
+        if current is not None and tar is None:
+            current.close()
+        if tar is not None:
+            tar.close()
+    return count, errors
+
+def get_tree(remote_dir, local_dir, compress=False):
+    """Copy a badge directory tree to a local directory (or .tar); return the number of files"""
+    count, errors = get_archive([remote_dir], remote_dir, local_dir, compress)
+    if errors:
+        raise OSError(f"{len(errors)} files could not be read")
+    return count
+
+def upload_file(local_path, remote_path, recursive=False, compress=False, precompile=False,
+                measure=False):
     """Upload a file or directory to the badge"""
     if not os.path.exists(local_path):
         print(f"Error: Local file '{local_path}' not found")
@@ -134,60 +673,67 @@ def upload_file(local_path, remote_path, recursive=False):
     
     print(f"Uploading: {local_path} -> {remote_path}{' (recursive)' if recursive else ''}")
     
-    # Build command with recursive flag if needed
-    if recursive:
-        success = mpremote_cmd('fs', 'cp', '-r', local_path, f':{remote_path}')
-    else:
-        success = mpremote_cmd('fs', 'cp', local_path, f':{remote_path}')
-    
-    if success:
+    try:
         if os.path.isdir(local_path):
-            file_count = sum(len(files) for _, _, files in os.walk(local_path))
+            if not recursive:
+                print(f"✗ '{local_path}' is a directory (use -r)")
+                return False
+            file_count = put_tree(local_path, remote_path.rstrip('/') or '/', compress, precompile)
             print(f"✓ Upload successful! {file_count} files uploaded")
         else:
+            if remote_path.endswith('/'):
+                remote_path = remote_join(remote_path, os.path.basename(local_path))
+            put_file(local_path, remote_path, compress, precompile)
             print("✓ Upload successful!")
-    else:
-        print("✗ Upload failed!")
+        report_transfer_stats()
+        report_compile_stats(measure)
+    except (BadgeError, OSError) as e:
+        print(f"✗ Upload failed! {e}")
+        return False
     
-    return success
+    return True
 
-def download_file(remote_path, local_path, recursive=False):
+def download_file(remote_path, local_path, recursive=False, compress=False):
     """Download a file or files from the badge (supports globs and recursive)"""
     # Check if remote_path contains wildcards
     if '*' in remote_path or '?' in remote_path:
-        return download_glob(remote_path, local_path)
+        return download_glob(remote_path, local_path, compress)
     
     print(f"Downloading: {remote_path} -> {local_path}{' (recursive)' if recursive else ''}")
     
-    # Build command with recursive flag if needed
-    if recursive:
-        success = mpremote_cmd('fs', 'cp', '-r', f':{remote_path}', local_path)
-    else:
-        success = mpremote_cmd('fs', 'cp', f':{remote_path}', local_path)
+    try:
+        stat = remote_stat(remote_path)
+        if stat is None:
+            print(f"✗ Download failed! No such file: {remote_path}")
+            return False
+        if stat[0]:
+            if not recursive:
+                print(f"✗ '{remote_path}' is a directory (use -r)")
+                return False
+            file_count = get_tree(remote_path, local_path, compress)
+            print(f"✓ Download successful! {file_count} files downloaded to: {local_path}")
+            report_transfer_stats()
+            return True
+        if os.path.isdir(local_path):
+            local_path = os.path.join(local_path, os.path.basename(remote_path))
+        get_file(remote_path, local_path, compress)
+    except (BadgeError, OSError) as e:
+        print(f"✗ Download failed! {e}")
+        return False
     
-    if success:
-        # Show info
-        if os.path.exists(local_path):
-            if os.path.isdir(local_path):
-                # Count files in directory
-                file_count = sum(len(files) for _, _, files in os.walk(local_path))
-                print(f"✓ Download successful! {file_count} files downloaded to: {local_path}")
-            else:
-                size = os.path.getsize(local_path)
-                try:
-                    with open(local_path, 'r') as f:
-                        lines = len(f.readlines())
-                    print(f"✓ Download successful! {size} bytes ({lines} lines) saved to: {local_path}")
-                except:
-                    print(f"✓ Download successful! {size} bytes saved to: {local_path}")
-        else:
-            print("✓ Download completed")
-    else:
-        print("✗ Download failed!")
+    # Show info
+    size = os.path.getsize(local_path)
+    try:
+        with open(local_path, 'r') as f:
+            lines = len(f.readlines())
+        print(f"✓ Download successful! {size} bytes ({lines} lines) saved to: {local_path}")
+    except:
+        print(f"✓ Download successful! {size} bytes saved to: {local_path}")
     
-    return success
+    report_transfer_stats()
+    return True
 
-def download_glob(remote_pattern, local_dir):
+def download_glob(remote_pattern, local_dir, compress=False):
     """Download multiple files matching a glob pattern"""
     print(f"Expanding pattern: {remote_pattern}")
     matching_files = expand_remote_glob(remote_pattern)
@@ -198,62 +744,217 @@ def download_glob(remote_pattern, local_dir):
     
     print(f"Found {len(matching_files)} matching files")
     
-    # Ensure local directory exists
-    if not os.path.exists(local_dir):
-        os.makedirs(local_dir)
+    # Keep the layout below the pattern's fixed directory ('**' can match subdirectories)
+    try:
+        success_count, errors = get_archive(matching_files, glob_base(remote_pattern), local_dir,
+                                            compress, verbose=True)
+    except (BadgeError, OSError) as e:
+        print(f"✗ Download failed! {e}")
+        return False
     
-    success_count = 0
-    fail_count = 0
+    print(f"\n✓ Downloaded {success_count}/{len(matching_files)} files to: {local_dir}")
+    if errors:
+        print(f"✗ {len(errors)} files failed")
+    report_transfer_stats()
     
-    for remote_file in matching_files:
-        filename = os.path.basename(remote_file)
-        local_file = os.path.join(local_dir, filename)
-        
-        print(f"  Downloading: {remote_file} -> {local_file}")
-        if mpremote_cmd('fs', 'cp', f':{remote_file}', local_file):
-            success_count += 1
-            if os.path.exists(local_file):
-                size = os.path.getsize(local_file)
-                print(f"    ✓ {size} bytes")
-        else:
-            fail_count += 1
-            print(f"    ✗ Failed")
+    return not errors
+
+def load_manifest_cache():
+    """Load the local hash cache (empty if missing or unreadable)"""
+    try:
+        with open(MANIFEST_CACHE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest_cache(cache):
+    """Write the local hash cache atomically"""
+    os.makedirs(os.path.dirname(MANIFEST_CACHE), exist_ok=True)
+    tmp = f'{MANIFEST_CACHE}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(cache, f)
+    os.replace(tmp, MANIFEST_CACHE)
+
+@badge_trace.traced('local manifest')
+def local_manifest(local_dir, cache):
+    """Return ({relpath: (size, sha256)}, dirs) for a local tree, reusing cached hashes"""
+    files = {}
+    dirs = set()
+    for root, dirnames, filenames in os.walk(local_dir):
+        rel_root = os.path.relpath(root, local_dir).replace(os.sep, '/')
+        prefix = '' if rel_root == '.' else rel_root + '/'
+        for name in dirnames:
+            dirs.add(prefix + name)
+        for name in filenames:
+            path = os.path.join(root, name)
+            st = os.stat(path)
+            key = os.path.abspath(path)
+            cached = cache.get(key)
+            if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+                digest = cached[2]
+            else:
+                h = hashlib.sha256()
+                with open(path, 'rb') as f:
+                    for block in iter(lambda: f.read(65536), b''):
+                        h.update(block)
+                digest = h.hexdigest()
+                cache[key] = [st.st_size, st.st_mtime_ns, digest]
+            files[prefix + name] = (st.st_size, digest)
+    return files, dirs
+
+def sync_tree(local_dir, remote_dir, delete=False, compress=False):
+    """Upload only the files whose size or sha256 differ from the badge's copy"""
+    if not os.path.isdir(local_dir):
+        print(f"Error: Local directory '{local_dir}' not found")
+        return False
+    
+    remote_dir = remote_dir.rstrip('/') or '/'
+    print(f"Syncing: {local_dir} -> {remote_dir}{' (deleting orphans)' if delete else ''}")
+    start = time.monotonic()
+    
+    cache = load_manifest_cache()
+    local_files, local_dirs = local_manifest(local_dir, cache)
+    save_manifest_cache(cache)
     
-    print(f"\n✓ Downloaded {success_count}/{len(matching_files)} files")
-    if fail_count > 0:
-        print(f"✗ {fail_count} files failed")
+    session = get_session()
+    try:
+        with session.exclusive():
+            remote_files, remote_dirs = session.fs_hash_tree(remote_dir)
+            changed = sorted(rel for rel, entry in local_files.items()
+                             if remote_files.get(rel) != entry)
+            
+            for rel in changed:
+                print(f"  ↑ {rel}")
+            new_dirs = [remote_join(remote_dir, rel) for rel in sorted(local_dirs - remote_dirs)]
+            if not remote_files and not remote_dirs:
+                # The remote root may not exist yet (an empty manifest can't tell)
+                if changed or new_dirs:
+                    new_dirs.insert(0, remote_dir)
+                else:
+                    session.fs_mkdir(remote_dir)
+                    index_update(remote_dir, is_dir=True)
+            if changed or new_dirs:
+                put_files([(os.path.join(local_dir, *rel.split('/')), remote_join(remote_dir, rel))
+                           for rel in changed], new_dirs, compress)
+            
+            orphans = []
+            if delete:
+                orphans = sorted(remote_files.keys() - local_files.keys())
+                for rel in orphans:
+                    print(f"  ✗ {rel}")
+                    session.fs_remove(remote_join(remote_dir, rel))
+                    index_remove(remote_join(remote_dir, rel))
+                # Deepest directories first so they are empty when removed
+                for rel in sorted(remote_dirs - local_dirs, reverse=True):
+                    session.fs_rmdir(remote_join(remote_dir, rel))
+                    index_remove(remote_join(remote_dir, rel))
+    except (BadgeError, OSError) as e:
+        print(f"✗ Sync failed! {e}")
+        return False
     
-    return fail_count == 0
+    unchanged = len(local_files) - len(changed)
+    print(f"✓ Sync complete in {time.monotonic() - start:.1f}s: {len(changed)} uploaded, "
+          f"{unchanged} unchanged{f', {len(orphans)} deleted' if delete else ''}")
+    report_transfer_stats()
+    return True
+
+def benchmark(size=65536, chunk_sizes=(256, 512, 1024, 2048), windows=(1, 2, 4, 8)):
+    """Time windowed uploads and downloads for each chunk size and window"""
+    session = get_session()
+    if session.broker is not None:
+        print("✗ Benchmark needs a direct connection (stop the broker first)")
+        return False
+    
+    remote_path = '/.bench~'
+    data = os.urandom(size)
+    print(f"Benchmarking {size} byte transfers")
+    print(f"{'chunk':>7} {'window':>7} {'upload B/s':>12} {'download B/s':>13}")
+    print("-" * 42)
+    try:
+        for chunk_size in chunk_sizes:
+            for window in windows:
+                start = time.monotonic()
+                session.fs_put_windowed(remote_path, data, chunk_size, window)
+                upload = size / (time.monotonic() - start)
+                start = time.monotonic()
+                received = session.fs_get_windowed(remote_path, chunk_size, window)
+                download = size / (time.monotonic() - start)
+                if received != data:
+                    print(f"✗ Data mismatch at chunk {chunk_size}, window {window}")
+                    return False
+                print(f"{chunk_size:>7} {window:>7} {upload:>12.0f} {download:>13.0f}")
+        session.fs_remove(remote_path)
+    except (BadgeError, OSError) as e:
+        print(f"✗ Benchmark failed! {e}")
+        return False
+    return True
+
+def pop_option(args, name, default=None):
+    """Remove '--name VALUE' from args and return VALUE (or default)"""
+    if name in args:
+        i = args.index(name)
+        if i + 1 < len(args):
+            value = args[i + 1]
+            del args[i:i + 2]
+            return value
+    return default
+
+def configure_transfers(args):
+    """Apply --chunk/--window options to the shared session"""
+    chunk_size = pop_option(args, '--chunk')
+    window = pop_option(args, '--window')
+    if chunk_size or window:
+        session = get_session()
+        session.chunk_size = int(chunk_size or session.chunk_size)
+        session.window = int(window or session.window)
 
 def delete_file(filepath):
     """Delete a file from the badge"""
     print(f"Deleting: {filepath}")
-    success = mpremote_cmd('fs', 'rm', f':{filepath}')
-    
-    if success:
-        print("✓ File deleted successfully!")
-    else:
-        print("✗ Delete failed!")
+    try:
+        get_session().fs_remove(filepath)
+        index_remove(filepath)
+    except BadgeError as e:
+        print(f"✗ Delete failed! {e}")
+        return False
     
-    return success
+    print("✓ File deleted successfully!")
+    return True
 
 def main():
+    global INDEX_TTL
+    INDEX_TTL = float(pop_option(sys.argv, '--ttl', INDEX_TTL))
     if len(sys.argv) < 2:
         print("Badge File Manager for Supercon 2025")
-        print("Powered by mpremote (official MicroPython tool)")
+        print("Runs over a single raw REPL session (no device reset)")
         print("\nUsage:")
         print(f"  {sys.argv[0]} ls [path]                   - List files")
-        print(f"  {sys.argv[0]} cat <file>                  - Read text file")
-        print(f"  {sys.argv[0]} download [-r] <remote> <local> - Download file(s)")
-        print(f"  {sys.argv[0]} upload [-r] <local> <remote>   - Upload file(s)")
+        print(f"  {sys.argv[0]} cat [--head N|--tail N|--range OFF:LEN] <file> - Read text file")
+        print(f"  {sys.argv[0]} download [-r] [-z] <remote> <local> - Download file(s)")
+        print(f"  {sys.argv[0]} upload [-r] [-z] [--compile [--measure]] <local> <remote> - Upload file(s)")
+        print(f"  {sys.argv[0]} sync [--delete] [-z] <local> <remote> - Upload changed files only")
         print(f"  {sys.argv[0]} rm <file>                   - Delete file")
+        print(f"  {sys.argv[0]} bench [--size N] [--chunks A,B] [--windows A,B] - Measure transfer speed")
         print("\nOptions:")
         print(f"  -r, --recursive   Recursively copy directories")
+        print(f"  -z, --compress    Deflate file data in transit (decompressed on the badge)")
+        print(f"  --compile         (upload) Send .py files as .mpy built by mpy-cross")
+        print(f"  --measure         (upload) Also time compiling the sources on the badge")
+        print(f"  --delete          (sync) Remove remote files missing locally")
+        print(f"  --head/--tail N   (cat) Show only the first/last N lines")
+        print(f"  --range OFF:LEN   (cat) Show LEN bytes from OFF (negative OFF counts from the end)")
+        print(f"  --chunk N         Bytes per transfer chunk (default 1024)")
+        print(f"  --window N        Chunks in flight before waiting for an ack (default 8)")
+        print(f"  --ttl SECONDS     Reuse the saved remote file index for this long (default 0)")
         print("\nExamples:")
         print(f"  {sys.argv[0]} cat /main.py                       # View text file")
+        print(f"  {sys.argv[0]} cat --tail 50 /log.txt              # End of a log")
         print(f"  {sys.argv[0]} download '/apps/*.py' ./files/       # Glob patterns")
+        print(f"  {sys.argv[0]} download '/**/*.json' ./config/      # Any depth")
         print(f"  {sys.argv[0]} download -r /apps ./local_apps/       # Recursive directory")
+        print(f"  {sys.argv[0]} download -r / ./badge-backup.tar     # Whole badge as a tar")
         print(f"  {sys.argv[0]} upload -r ./my_app /apps/my_app/      # Upload directory")
+        print(f"  {sys.argv[0]} sync ./my_app /apps/my_app/           # Redeploy changes only")
         print("\nNote: 'cat' only works with text files. For binary files, use 'download'.")
         return 1
     
@@ -265,39 +966,71 @@ def main():
             list_files(path)
             
         elif command == 'cat':
-            if len(sys.argv) < 3:
+            args = sys.argv[2:]
+            head = pop_option(args, '--head')
+            tail = pop_option(args, '--tail')
+            offset, length = parse_range(pop_option(args, '--range', '0:'))
+            if not args:
                 print("Error: No file specified")
                 return 1
-            read_file(sys.argv[2])
+            success = read_file(args[0], int(head) if head else None, int(tail) if tail else None,
+                                offset, length)
+            return 0 if success else 1
             
         elif command == 'download':
-            # Check for -r flag
-            recursive = False
+            # Check for -r and -z flags
             args = sys.argv[2:]
-            if '-r' in args or '--recursive' in args:
-                recursive = True
-                args = [a for a in args if a not in ['-r', '--recursive']]
+            configure_transfers(args)
+            recursive = '-r' in args or '--recursive' in args
+            compress = '-z' in args or '--compress' in args
+            args = [a for a in args if a not in ['-r', '--recursive', '-z', '--compress']]
             
             if len(args) < 2:
                 print("Error: Need remote and local paths")
                 return 1
             
-            success = download_file(args[0], args[1], recursive=recursive)
+            success = download_file(args[0], args[1], recursive=recursive, compress=compress)
             return 0 if success else 1
             
         elif command == 'upload':
-            # Check for -r flag
-            recursive = False
+            # Check for -r and -z flags
+            args = sys.argv[2:]
+            configure_transfers(args)
+            recursive = '-r' in args or '--recursive' in args
+            compress = '-z' in args or '--compress' in args
+            precompile = '--compile' in args
+            measure = '--measure' in args
+            args = [a for a in args if a not in ['-r', '--recursive', '-z', '--compress',
+                                                 '--compile', '--measure']]
+            
+            if len(args) < 2:
+                print("Error: Need local and remote paths")
+                return 1
+            
+            success = upload_file(args[0], args[1], recursive=recursive, compress=compress,
+                                  precompile=precompile, measure=measure)
+            return 0 if success else 1
+            
+        elif command == 'sync':
             args = sys.argv[2:]
-            if '-r' in args or '--recursive' in args:
-                recursive = True
-                args = [a for a in args if a not in ['-r', '--recursive']]
+            configure_transfers(args)
+            delete = '--delete' in args
+            compress = '-z' in args or '--compress' in args
+            args = [a for a in args if a not in ['--delete', '-z', '--compress']]
             
             if len(args) < 2:
                 print("Error: Need local and remote paths")
                 return 1
             
-            success = upload_file(args[0], args[1], recursive=recursive)
+            success = sync_tree(args[0], args[1], delete=delete, compress=compress)
+            return 0 if success else 1
+            
+        elif command == 'bench':
+            args = sys.argv[2:]
+            size = int(pop_option(args, '--size', 65536))
+            chunk_sizes = [int(n) for n in pop_option(args, '--chunks', '256,512,1024,2048').split(',')]
+            windows = [int(n) for n in pop_option(args, '--windows', '1,2,4,8').split(',')]
+            success = benchmark(size, chunk_sizes, windows)
             return 0 if success else 1
             
         elif command == 'rm':
@@ -317,6 +1050,9 @@ def main():
     except Exception as e:
         print(f"Error: {e}")
         return 1
+    finally:
+        save_index_cache()
+        close_session()
     
     return 0
 
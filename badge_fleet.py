@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Fleet Runner for Supercon 2025 Badges
+Finds every badge plugged into this machine and runs the same command on all
+of them at once, so provisioning a table of badges takes as long as the
+slowest one rather than the sum of them all
+"""
+import concurrent.futures
+import os
+import subprocess
+import sys
+import time
+import serial
+from serial.tools import list_ports
+from badge_session import BadgeSession, BadgeError
+
+# USB vendor/product IDs the badge enumerates with (ESP32-S3 USB Serial/JTAG
+# and the TinyUSB CDC used by some MicroPython builds)
+BADGE_USB_IDS = {(0x303A, 0x1001), (0x303A, 0x4001)}
+
+# Badges driven at the same time
+DEFAULT_JOBS = 8
+
+# Fleet commands and the single-badge script each one runs
+COMMANDS = {
+    'exec': ['badge_exec.py'],
+    'info': ['badge_info.py'],
+    'upload': ['badge_file_manager.py', 'upload'],
+    'sync': ['badge_file_manager.py', 'sync'],
+    'rm': ['badge_file_manager.py', 'rm'],
+}
+
+# Options taken by the fleet itself (each with a value), before the command
+FLEET_OPTIONS = ('--jobs', '--timeout', '--ports', '--usb-ids')
+
+def discover_ports(usb_ids=BADGE_USB_IDS):
+    """Return the serial ports whose USB IDs match a badge"""
+    return sorted(port.device for port in list_ports.comports()
+                  if (port.vid, port.pid) in usb_ids)
+
+def identify(port):
+    """Return the badge's machine.unique_id() as hex"""
+    session = BadgeSession(port, timeout=5)
+    try:
+        session.open()
+        return session.eval("__import__('ubinascii').hexlify(__import__('machine').unique_id()).decode()")
+    finally:
+        session.close()
+
+def identify_all(ports, jobs):
+    """Return {unique_id: port} for every port that answers like a badge"""
+    badges = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(identify, port): port for port in ports}
+        for future in concurrent.futures.as_completed(futures):
+            port = futures[future]
+            try:
+                unique_id = future.result()
+            except (serial.SerialException, TimeoutError, BadgeError, OSError, ValueError) as e:
+                print(f"✗ {port}: not responding ({e})")
+                continue
+            if unique_id in badges:
+                print(f"✗ {port}: same badge as {badges[unique_id]}, skipped")
+                continue
+            badges[unique_id] = port
+    return dict(sorted(badges.items()))
+
+def run_on_badge(port, argv, timeout):
+    """Run one single-badge tool against a port; return (returncode, output, seconds)"""
+    env = dict(os.environ, BADGE_PORT=port)
+    here = os.path.dirname(os.path.abspath(__file__))
+    argv = [sys.executable, os.path.join(here, argv[0])] + argv[1:]
+    start = time.monotonic()
+    try:
+        result = subprocess.run(argv, env=env, capture_output=True, text=True, timeout=timeout)
+        return result.returncode, result.stdout + result.stderr, time.monotonic() - start
+    except subprocess.TimeoutExpired:
+        return 124, f"Timed out after {timeout}s\n", time.monotonic() - start
+
+def run_fleet(badges, argv, jobs, timeout=None):
+    """Run a command on every badge in parallel; return {unique_id: (returncode, seconds)}"""
+    results = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(run_on_badge, port, argv, timeout): unique_id
+                   for unique_id, port in badges.items()}
+        for future in concurrent.futures.as_completed(futures):
+            unique_id = futures[future]
+            returncode, output, seconds = future.result()
+            results[unique_id] = (returncode, seconds)
+            # Print each badge's output in one block as soon as it finishes
+            mark = '✓' if returncode == 0 else '✗'
+            print(f"{mark} {unique_id} ({badges[unique_id]}) {seconds:.1f}s")
+            for line in output.rstrip('\n').splitlines():
+                print(f"    {line}")
+    return results
+
+def print_summary(badges, results, elapsed):
+    """Print one line per badge and the overall outcome"""
+    print("\n" + "=" * 60)
+    print(f"{'Badge':<16} {'Port':<28} {'Result':<8} {'Time':>6}")
+    print("-" * 60)
+    for unique_id, port in badges.items():
+        returncode, seconds = results[unique_id]
+        status = 'ok' if returncode == 0 else f'rc {returncode}'
+        print(f"{unique_id:<16} {port:<28} {status:<8} {seconds:>5.1f}s")
+    failed = sum(1 for returncode, _ in results.values() if returncode != 0)
+    slowest = max((seconds for _, seconds in results.values()), default=0)
+    print("-" * 60)
+    print(f"{len(results) - failed}/{len(results)} badges succeeded in {elapsed:.1f}s "
+          f"(slowest badge {slowest:.1f}s)")
+
+def pop_option(args, name, default=None):
+    """Remove '--name VALUE' from args and return VALUE (or default)"""
+    if name in args:
+        i = args.index(name)
+        if i + 1 < len(args):
+            value = args[i + 1]
+            del args[i:i + 2]
+            return value
+    return default
+
+def parse_usb_ids(text):
+    """Parse 'vid:pid,vid:pid' (hex) into a set of pairs"""
+    return {tuple(int(part, 16) for part in pair.split(':')) for pair in text.split(',')}
+
+def main():
+    args = sys.argv[1:]
+    # Fleet options come before the command; everything after it goes to each badge as is
+    count = 0
+    while count < len(args) and args[count] in FLEET_OPTIONS:
+        count += 2
+    options, args = args[:count], args[count:]
+    jobs = int(pop_option(options, '--jobs', DEFAULT_JOBS))
+    timeout = pop_option(options, '--timeout')
+    ports = pop_option(options, '--ports')
+    usb_ids = pop_option(options, '--usb-ids')
+
+    if not args or (args[0] not in COMMANDS and args[0] != 'list'):
+        print("Badge Fleet Runner for Supercon 2025")
+        print("\nUsage:")
+        print(f"  {sys.argv[0]} [options] list                        - Show connected badges")
+        print(f"  {sys.argv[0]} [options] exec '<code>'               - Run code on every badge")
+        print(f"  {sys.argv[0]} [options] info [--json]               - Badge information")
+        print(f"  {sys.argv[0]} [options] upload [-r] <local> <remote> - Upload to every badge")
+        print(f"  {sys.argv[0]} [options] sync [--delete] <local> <remote> - Sync every badge")
+        print(f"  {sys.argv[0]} [options] rm <file>                   - Delete on every badge")
+        print("\nOptions:")
+        print(f"  --jobs N          Badges driven at once (default {DEFAULT_JOBS})")
+        print(f"  --timeout S       Give up on a badge after S seconds (options after the")
+        print(f"                    command, like exec --timeout, go to each badge)")
+        print(f"  --ports A,B       Use these ports instead of USB discovery")
+        print(f"  --usb-ids V:P,..  USB vendor:product IDs to discover (hex)")
+        print("\nExamples:")
+        print(f"  {sys.argv[0]} sync ./my_app /apps/my_app/")
+        print(f"  {sys.argv[0]} exec 'import gc; gc.mem_free()'")
+        return 1
+
+    command = args[0]
+    if ports:
+        ports = ports.split(',')
+    else:
+        ports = discover_ports(parse_usb_ids(usb_ids) if usb_ids else BADGE_USB_IDS)
+    if not ports:
+        print("✗ No badges found")
+        return 1
+
+    start = time.monotonic()
+    badges = identify_all(ports, jobs)
+    print(f"Found {len(badges)} badge{'s' if len(badges) != 1 else ''}")
+    if command == 'list':
+        for unique_id, port in badges.items():
+            print(f"  {unique_id}  {port}")
+        return 0 if badges else 1
+
+    results = run_fleet(badges, COMMANDS[command] + args[1:], jobs,
+                        float(timeout) if timeout else None)
+    print_summary(badges, results, time.monotonic() - start)
+    return 0 if results and all(returncode == 0 for returncode, _ in results.values()) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,88 +2,164 @@
 """
 Badge Information Gatherer for Supercon 2025 Badge
 Collects system info, memory stats, and filesystem details
+All probes run as one script on the badge, which answers with a single JSON
+document; fields that never change are cached per device and skipped next time
 """
+import json
+import os
 import serial
-import time
 import sys
+from badge_session import BadgeSession, BadgeError
 
-SERIAL_PORT = "/dev/cu.usbmodem2101"
-BAUD_RATE = 115200
-
-def send_command(ser, cmd, wait=0.5):
-    """Send a command and return the response"""
-    # Clear input buffer
-    ser.reset_input_buffer()
-    
-    # Send command
-    ser.write((cmd + '\r\n').encode('utf-8'))
-    time.sleep(wait)
-    
-    # Read response
-    response = ""
-    while ser.in_waiting:
-        response += ser.read(ser.in_waiting).decode('utf-8', errors='ignore')
-        time.sleep(0.1)
-    
-    return response
+SERIAL_PORT = os.environ.get('BADGE_PORT', "/dev/cu.usbmodem2101")
+
+# Static fields per unique ID, and the last device seen on each port
+INFO_CACHE = os.path.join(os.path.expanduser('~'), '.cache', 'supercon-badge', 'info.json')
+
+# Fields that never change for a given badge
+STATIC_FIELDS = ['implementation', 'version', 'flash_size']
+
+# Display order and titles for the text report
+FIELDS = [
+    ('implementation', "System Implementation"),
+    ('version', "MicroPython Version"),
+    ('cpu_freq', "CPU Frequency"),
+    ('unique_id', "Unique ID"),
+    ('flash_size', "Flash Size"),
+    ('mem_free', "Free Memory"),
+    ('mem_alloc', "Allocated Memory"),
+    ('fs', "Filesystem"),
+    ('root', "Root Directory"),
+    ('apps', "Apps Directory"),
+    ('wifi', "WiFi Status"),
+]
+
+# Runs on the badge; static probes are skipped when KNOWN matches its unique ID
+PROBE_SCRIPT = """
+import sys, gc, os, json, machine, ubinascii
+info = {}
+def probe(name, f):
+    try:
+        info[name] = f()
+    except Exception as e:
+        info[name] = {'error': '%s: %s' % (type(e).__name__, e)}
+def wifi():
+    import network
+    sta = network.WLAN(network.STA_IF)
+    w = {'active': sta.active(), 'connected': sta.isconnected()}
+    if w['connected']:
+        w['ip'] = sta.ifconfig()[0]
+    return w
+def fs():
+    s = os.statvfs('/')
+    return {'total': s[0] * s[2], 'free': s[0] * s[3]}
+probe('unique_id', lambda: ubinascii.hexlify(machine.unique_id()).decode())
+if info['unique_id'] != KNOWN:
+    probe('implementation', lambda: {'name': sys.implementation.name,
+        'version': '.'.join(str(v) for v in sys.implementation.version[:3]),
+        'mpy': getattr(sys.implementation, '_mpy', None)})
+    probe('version', lambda: sys.version)
+    probe('flash_size', lambda: __import__('esp').flash_size())
+probe('cpu_freq', machine.freq)
+gc.collect()
+probe('mem_free', gc.mem_free)
+probe('mem_alloc', gc.mem_alloc)
+probe('fs', fs)
+probe('root', lambda: sorted(os.listdir('/')))
+probe('apps', lambda: sorted(os.listdir('/apps')))
+probe('wifi', wifi)
+print(json.dumps(info))
+"""
+
+def load_cache():
+    """Load cached static fields (empty if missing or unreadable)"""
+    try:
+        with open(INFO_CACHE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_cache(cache):
+    """Write the static field cache atomically"""
+    os.makedirs(os.path.dirname(INFO_CACHE), exist_ok=True)
+    tmp = f'{INFO_CACHE}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(cache, f)
+    os.replace(tmp, INFO_CACHE)
+
+def gather_info(session, refresh=False):
+    """Collect every field in one round trip, reusing cached static fields"""
+    cache = load_cache()
+    devices = cache.setdefault('devices', {})
+    ports = cache.setdefault('ports', {})
+    known = '' if refresh else ports.get(session.port, '')
+    if not all(field in devices.get(known, {}) for field in STATIC_FIELDS):
+        known = ''
+
+    code = PROBE_SCRIPT.replace('KNOWN', repr(known))
+    info = json.loads(session.exec(code).decode('utf-8'))
+
+    unique_id = info['unique_id']
+    if isinstance(unique_id, str):
+        if unique_id == known:
+            info.update(devices[known])
+        else:
+            # Failed probes are left out so they are retried next time
+            devices[unique_id] = {field: info[field] for field in STATIC_FIELDS
+                                  if not (isinstance(info[field], dict) and 'error' in info[field])}
+        ports[session.port] = unique_id
+        save_cache(cache)
+    return {field: info.get(field) for field, _ in FIELDS}
+
+def format_value(value):
+    """Render one field for the text report"""
+    if isinstance(value, dict) and 'error' in value:
+        return value['error']
+    if isinstance(value, dict):
+        return ', '.join(f"{key}={item}" for key, item in value.items())
+    return str(value)
 
 def main():
-    print("Supercon 2025 Badge Information Gatherer")
-    print("=" * 60)
-    
-    ser = None
+    args = sys.argv[1:]
+    as_json = '--json' in args
+    refresh = '--refresh' in args
+    reset = '--reset' in args
+
+    if not as_json:
+        print("Supercon 2025 Badge Information Gatherer")
+        print("=" * 60)
+
+    session = BadgeSession(SERIAL_PORT)
     try:
-        ser = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=1)
-        print(f"Connected to {SERIAL_PORT}\n")
-        
-        # Send Ctrl+C to enter REPL
-        ser.write(b'\x03')
-        time.sleep(1)
-        ser.reset_input_buffer()
-        
-        commands = [
-            ("System Implementation", "import sys; sys.implementation"),
-            ("MicroPython Version", "sys.version"),
-            ("CPU Frequency", "import machine; machine.freq()"),
-            ("Unique ID", "import ubinascii; ubinascii.hexlify(machine.unique_id())"),
-            ("Flash Size", "import esp; esp.flash_size()"),
-            ("Free Memory", "import gc; gc.mem_free()"),
-            ("Allocated Memory", "gc.mem_alloc()"),
-            ("Root Directory", "import os; os.listdir('/')"),
-            ("Apps Directory", "os.listdir('/apps')"),
-            ("WiFi Status", "import network; sta = network.WLAN(network.STA_IF); sta.active()"),
-        ]
-        
-        for title, cmd in commands:
+        # Enters the raw REPL (or shares the broker's connection)
+        session.open()
+        info = gather_info(session, refresh)
+
+        if as_json:
+            print(json.dumps(info, indent=2))
+            return 0
+
+        print(f"Connected to {SERIAL_PORT}")
+        for field, title in FIELDS:
             print(f"\n{title}:")
             print("-" * 40)
-            response = send_command(ser, cmd, wait=0.5)
-            # Extract the relevant part (skip echo and >>> prompt)
-            lines = response.strip().split('\n')
-            for line in lines:
-                if line.strip() and not line.startswith('>>>'):
-                    clean_line = line.replace('>>>', '').strip()
-                    if clean_line and clean_line != cmd:
-                        print(f"  {clean_line}")
-        
+            print(f"  {format_value(info[field])}")
+
         print("\n" + "=" * 60)
         print("Information gathering complete!")
-        
-        # Soft reset the badge
-        print("\nResetting badge...")
-        ser.write(b'\x04')  # Ctrl+D
-        time.sleep(1)
-        
-    except serial.SerialException as e:
-        print(f"Error: {e}")
+
+        if reset:
+            print("\nResetting badge...")
+
+    except (serial.SerialException, TimeoutError, BadgeError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
         return 1
     except KeyboardInterrupt:
         print("\nInterrupted by user")
         return 1
     finally:
-        if ser is not None:
-            ser.close()
-    
+        session.close(soft_reset=reset)
+
     return 0
 
 if __name__ == "__main__":
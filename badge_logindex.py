@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Log Index for Supercon 2025 Badge monitor logs
+Keeps a sidecar file (<log>.idx) that maps blocks of a monitor log to their
+byte range, first and last timestamp, and which levels (ERROR, WARN...)
+occur in them. Queries binary-search the blocks and only search the ones
+that can match, through an mmap of the log, so their cost follows the size
+of the answer rather than the size of the log
+"""
+import bisect
+import mmap
+import os
+import re
+import struct
+import time
+from datetime import datetime
+
+MAGIC = b'BLOGIDX1'
+# start offset, end offset, first and last timestamp (epoch seconds), level bits
+RECORD = struct.Struct('<QQddI')
+# Bytes of log per block (blocks always end at a line break)
+BLOCK_BYTES = 64 * 1024
+# Words with a bit in each block's record, so --level skips blocks without them
+LEVELS = ('ERROR', 'WARN', 'INFO', 'DEBUG', 'Traceback')
+
+STAMP = re.compile(rb'\[(\d{4})-(\d\d)-(\d\d) (\d\d):(\d\d):(\d\d)\.(\d{3})\] ')
+
+def index_path(log_path):
+    return log_path + '.idx'
+
+def parse_stamp(line):
+    """Return the timestamp at the start of a log line as epoch seconds (None if it has none)"""
+    match = STAMP.match(line)
+    if match is None:
+        return None
+    year, month, day, hour, minute, second, ms = map(int, match.groups())
+    return datetime(year, month, day, hour, minute, second, ms * 1000).timestamp()
+
+def level_mask(data, start=0, end=None):
+    """Return the LEVELS bits for the words found in data[start:end]"""
+    end = len(data) if end is None else end
+    mask = 0
+    for bit, level in enumerate(LEVELS):
+        if data.find(level.encode(), start, end) >= 0:
+            mask |= 1 << bit
+    return mask
+
+def scan_blocks(mm, start, end, previous=0.0):
+    """Yield records for the complete lines of mm[start:end], about BLOCK_BYTES each"""
+    while start < end:
+        stop = mm.rfind(b'\n', start, min(end, start + BLOCK_BYTES)) + 1
+        if stop <= start:
+            # One line longer than a block (or an unfinished last line)
+            stop = mm.find(b'\n', start, end) + 1
+            if stop <= 0:
+                return
+        last_line = max(start, mm.rfind(b'\n', start, stop - 1) + 1)
+        first = parse_stamp(mm[start:start + 32]) or previous
+        previous = parse_stamp(mm[last_line:last_line + 32]) or first
+        yield (start, stop, first, previous, level_mask(mm, start, stop))
+        start = stop
+
+def load_index(log_path):
+    """Return the saved records for a log; None if missing or not matching the log"""
+    try:
+        with open(index_path(log_path), 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    if not data.startswith(MAGIC):
+        return None
+    body = data[len(MAGIC):]
+    records = list(RECORD.iter_unpack(body[:len(body) - len(body) % RECORD.size]))
+    if records and records[-1][1] > os.path.getsize(log_path):
+        # The log was replaced or truncated since
+        return None
+    return records
+
+def update_index(log_path, persist=True):
+    """Return the records for a log, indexing lines added since the index was saved
+
+    A missing or stale index is rebuilt and saved. Records for new lines are
+    appended to it only with persist (the process writing the log does that).
+    """
+    size = os.path.getsize(log_path)
+    records = load_index(log_path)
+    rebuild = records is None
+    records = records or []
+    end = records[-1][1] if records else 0
+    added = []
+    if end < size:
+        with open(log_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            added = list(scan_blocks(mm, end, size, records[-1][3] if records else 0.0))
+    if rebuild:
+        tmp = f'{index_path(log_path)}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(MAGIC + b''.join(RECORD.pack(*record) for record in added))
+        os.replace(tmp, index_path(log_path))
+    elif persist and added:
+        with open(index_path(log_path), 'ab') as f:
+            f.write(b''.join(RECORD.pack(*record) for record in added))
+    return records + added
+
+
+class IndexWriter:
+    """Adds records for a log as it is written (see badge_monitor.RotatingLog)"""
+
+    def __init__(self, log_path):
+        # Catch up on lines written without an index (or by an earlier run)
+        update_index(log_path)
+        self.file = open(index_path(log_path), 'ab')
+        self.block = None
+
+    def add(self, offset, data, first, last):
+        """Record `data`, just written at `offset`, with its first and last line's timestamps"""
+        if first is None or last is None:
+            first = last = time.time()
+        if self.block is None:
+            self.block = [offset, offset, first, last, 0]
+        block = self.block
+        block[1] = offset + len(data)
+        block[3] = last
+        block[4] |= level_mask(data)
+        if block[1] - block[0] >= BLOCK_BYTES:
+            self.flush()
+
+    def flush(self):
+        if self.block is not None:
+            self.file.write(RECORD.pack(*self.block))
+            self.file.flush()
+            self.block = None
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+def block_lines(mm, start, end, search, level):
+    """Yield the lines of mm[start:end] that match `search` (a regex) and contain `level`"""
+    if search is None:
+        lines = mm[start:end].split(b'\n')
+        yield from lines[:-1] if lines[-1] == b'' else lines
+        return
+    pos = start
+    while pos < end:
+        match = search.search(mm, pos, end)
+        if match is None:
+            return
+        line_start = max(start, mm.rfind(b'\n', start, match.start()) + 1)
+        line_end = mm.find(b'\n', match.start(), end)
+        if line_end < 0:
+            line_end = end
+        line = mm[line_start:line_end]
+        if level is None or level in line:
+            yield line
+        pos = line_end + 1
+
+def query(log_path, since=None, until=None, pattern=None, level=None, tail=None, stats=None):
+    """Return the log lines (bytes) in [since, until] that match a regex and/or level
+
+    With tail, only the last `tail` matching lines. `stats`, if given, is
+    filled with the blocks and bytes that had to be searched.
+    """
+    records = update_index(log_path, persist=False)
+    bit = 1 << LEVELS.index(level) if level in LEVELS else 0
+    level = level.encode() if level else None
+    search = re.compile(pattern.encode(), re.MULTILINE) if pattern else None
+    if search is None and level is not None:
+        search = re.compile(re.escape(level))
+
+    first = 0 if since is None else bisect.bisect_left(records, since, key=lambda r: r[3])
+    stop = len(records) if until is None else bisect.bisect_right(records, until, key=lambda r: r[2])
+    blocks = [r for r in records[first:stop] if not bit or r[4] & bit]
+    if stats is None:
+        stats = {}
+    stats.update(blocks=len(records), bytes=records[-1][1] if records else 0, searched=0, searched_bytes=0)
+    if not blocks:
+        return []
+
+    def lines_in(mm, record):
+        stats['searched'] += 1
+        stats['searched_bytes'] += record[1] - record[0]
+        lines = block_lines(mm, record[0], record[1], search, level)
+        if (since is None or record[2] >= since) and (until is None or record[3] <= until):
+            return list(lines)
+        # A block at the edge of the range: check each line's time
+        return [line for line in lines
+                if (stamp := parse_stamp(line)) is not None
+                and (since is None or stamp >= since) and (until is None or stamp <= until)]
+
+    with open(log_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if tail is None:
+            return [line for record in blocks for line in lines_in(mm, record)]
+        found = []
+        for record in reversed(blocks):
+            found[:0] = lines_in(mm, record)
+            if len(found) >= tail:
+                break
+        return found[-tail:] if tail else []
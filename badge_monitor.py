@@ -2,64 +2,300 @@
 """
 Real-time Badge Monitor for Supercon 2025 Badge
 Monitors serial output with timestamps and optional logging
+Attaches to badge_broker.py when it is running, so other tools can share the port
+
+A reader thread blocks on the port and stamps each line as it completes; a
+writer thread prints and logs lines in batches, so fast output costs a few
+writes per batch instead of a flush per line
+
+`badge_monitor.py query <log> ...` searches a captured log through the
+index kept alongside it (see badge_logindex.py), without opening the port
 """
-import serial
+import codecs
+import gzip
+import os
+import queue
+import re
+import shutil
 import sys
+import threading
 import time
 from datetime import datetime
+import badge_logindex
 
-SERIAL_PORT = "/dev/cu.usbmodem2101"
+SERIAL_PORT = os.environ.get('BADGE_PORT', "/dev/cu.usbmodem2101")
 BAUD_RATE = 115200
 
+# Lines buffered between reader and writer; beyond this, lines are dropped
+# (and counted) rather than stalling the reader and overflowing the port
+LINE_QUEUE_SIZE = 10000
+# Most lines written per batch
+WRITE_BATCH = 1000
+
+def new_stats():
+    """Counters shared by the reader and writer threads"""
+    return {'lines': 0, 'bytes': 0, 'dropped': 0, 'start': time.monotonic()}
+
+def read_lines(session, lines, stats, stop):
+    """Reader thread: split badge output into timestamped lines for the writer"""
+    import serial
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+    partial = ''
+    try:
+        while not stop.is_set():
+            data = session.read_some(0.5)
+            if not data:
+                continue
+            stats['bytes'] += len(data)
+            now = datetime.now()
+            *complete, partial = (partial + decoder.decode(data)).split('\n')
+            for line in complete:
+                queue_line(lines, stats, now, line)
+    except EOFError:
+        print("\nBroker closed the connection.", file=sys.stderr)
+    except serial.SerialException as e:
+        print(f"\nError: {e}", file=sys.stderr)
+    finally:
+        queue_line(lines, stats, datetime.now(), partial)
+        stop.set()
+
+def queue_line(lines, stats, timestamp, line):
+    """Hand one line to the writer, counting it as dropped if the writer is behind"""
+    line = line.rstrip('\r')
+    if not line.strip():
+        return
+    try:
+        lines.put_nowait((timestamp, line))
+        stats['lines'] += 1
+    except queue.Full:
+        stats['dropped'] += 1
+
+class RotatingLog:
+    """Append-only log file that rotates by size and/or age, optionally gzipping old files
+
+    With index, a sidecar index for `monitor query` is kept up to date as
+    lines are written (see badge_logindex.py).
+    """
+
+    def __init__(self, path, max_bytes=0, max_age=0, compress=False, index=True):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.compress = compress
+        self.indexed = index
+        self.compressors = []
+        self.open()
+
+    def open(self):
+        self.file = open(self.path, 'ab')
+        self.size = self.file.tell()
+        self.opened = time.monotonic()
+        self.index = badge_logindex.IndexWriter(self.path) if self.indexed else None
+
+    def write(self, text, first=None, last=None):
+        """Append lines; first/last are the epoch times of the first and last of them"""
+        data = text.encode('utf-8')
+        self.file.write(data)
+        self.file.flush()
+        if self.index is not None:
+            self.index.add(self.size, data, first, last)
+        self.size += len(data)
+        if ((self.max_bytes and self.size >= self.max_bytes)
+                or (self.max_age and time.monotonic() - self.opened >= self.max_age)):
+            self.rotate()
+
+    def rotate(self):
+        """Move the current log aside under a timestamped name and start a new one"""
+        self.file.close()
+        if self.index is not None:
+            self.index.close()
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        rotated = f"{self.path}.{stamp}"
+        n = 1
+        while os.path.exists(rotated) or os.path.exists(rotated + '.gz'):
+            rotated = f"{self.path}.{stamp}-{n}"
+            n += 1
+        os.replace(self.path, rotated)
+        if self.index is not None:
+            # A gzipped log cannot be queried, so its index goes
+            if self.compress:
+                os.remove(badge_logindex.index_path(self.path))
+            else:
+                os.replace(badge_logindex.index_path(self.path), badge_logindex.index_path(rotated))
+        if self.compress:
+            # Compress in the background so the writer keeps draining lines
+            worker = threading.Thread(target=gzip_file, args=(rotated,))
+            worker.start()
+            self.compressors.append(worker)
+        self.open()
+
+    def close(self):
+        self.file.close()
+        if self.index is not None:
+            self.index.close()
+        for worker in self.compressors:
+            worker.join()
+
+def gzip_file(path):
+    """Replace a file with a .gz copy"""
+    with open(path, 'rb') as src, gzip.open(path + '.gz', 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(path)
+
+def write_lines(lines, log, stop):
+    """Writer thread: print and log queued lines in batches until the reader stops"""
+    while not (stop.is_set() and lines.empty()):
+        try:
+            batch = [lines.get(timeout=0.2)]
+        except queue.Empty:
+            continue
+        while len(batch) < WRITE_BATCH:
+            try:
+                batch.append(lines.get_nowait())
+            except queue.Empty:
+                break
+        text = ''.join(f"[{timestamp.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]}] {line}\n"
+                       for timestamp, line in batch)
+        sys.stdout.write(text)
+        sys.stdout.flush()
+        if log is not None:
+            log.write(text, batch[0][0].timestamp(), batch[-1][0].timestamp())
+
+def report_stats(stats, since, last):
+    """Print line and byte rates since the last report plus the dropped count"""
+    elapsed = max(time.monotonic() - since, 1e-6)
+    lines = stats['lines'] - last['lines']
+    data = stats['bytes'] - last['bytes']
+    print(f"[stats] {lines / elapsed:.0f} lines/s, {data / elapsed / 1024:.1f} KB/s, "
+          f"{stats['dropped']} dropped", file=sys.stderr)
+
+def pop_option(args, name, default=None):
+    """Remove '--name VALUE' from args and return VALUE (or default)"""
+    if name in args:
+        i = args.index(name)
+        if i + 1 < len(args):
+            value = args[i + 1]
+            del args[i:i + 2]
+            return value
+    return default
+
+def parse_time(text):
+    """Parse 'YYYY-mm-dd HH:MM[:SS[.fff]]', or '15m' style (s/m/h/d ago), into epoch seconds"""
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+    if text[-1:] in units and text[:-1].replace('.', '', 1).isdigit():
+        return time.time() - float(text[:-1]) * units[text[-1]]
+    for fmt in ('%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(text, fmt).timestamp()
+        except ValueError:
+            pass
+    raise ValueError(f"Unrecognised time: {text}")
+
+def query_main(args):
+    """monitor query: search a captured log through its index"""
+    since = pop_option(args, '--since')
+    until = pop_option(args, '--until')
+    pattern = pop_option(args, '--grep')
+    level = pop_option(args, '--level')
+    tail = pop_option(args, '--tail')
+    count = '--count' in args
+    show_stats = '--stats' in args
+    args = [a for a in args if a not in ('--count', '--stats')]
+    if not args:
+        print("Usage:")
+        print(f"  {sys.argv[0]} query <logfile> [--since T] [--until T] [--grep REGEX] [--level L]")
+        print(f"        [--tail N] [--count] [--stats]")
+        print("\nT is 'YYYY-mm-dd HH:MM[:SS[.fff]]' or an age like 90s, 15m, 2h, 1d")
+        print(f"L is one of {', '.join(badge_logindex.LEVELS)} (indexed) or any other word")
+        return 1
+
+    stats = {}
+    start = time.perf_counter()
+    try:
+        lines = badge_logindex.query(args[0], parse_time(since) if since else None,
+                                     parse_time(until) if until else None, pattern, level,
+                                     int(tail) if tail else None, stats)
+    except (OSError, ValueError, re.error) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    elapsed = time.perf_counter() - start
+    if count:
+        print(len(lines))
+    else:
+        sys.stdout.write(''.join(line.decode('utf-8', errors='replace') + '\n' for line in lines))
+    if show_stats:
+        print(f"[query] {len(lines)} lines in {elapsed * 1000:.1f} ms "
+              f"({len(lines) / max(elapsed, 1e-9):.0f} lines/s); searched {stats['searched']}/"
+              f"{stats['blocks']} blocks, {stats['searched_bytes'] / 1e6:.1f} of "
+              f"{stats['bytes'] / 1e6:.1f} MB", file=sys.stderr)
+    return 0
+
 def main():
-    log_file = None
-    
+    args = sys.argv[1:]
+    if args[:1] == ['query']:
+        return query_main(args[1:])
+    # Only capturing needs the port: queries don't load pyserial or the session
+    import serial
+    import badge_broker
+    from badge_session import BadgeSession
+    rotate_mb = float(pop_option(args, '--rotate-mb', 0))
+    rotate_minutes = float(pop_option(args, '--rotate-minutes', 0))
+    stats_every = float(pop_option(args, '--stats', 0))
+    compress = '--gzip' in args
+    args = [a for a in args if a != '--gzip']
+    log = None
+
     # Parse arguments
-    if len(sys.argv) > 1:
-        log_filename = sys.argv[1]
-        log_file = open(log_filename, 'a')
+    if args:
+        log_filename = args[0]
+        log = RotatingLog(log_filename, int(rotate_mb * 1024 * 1024), rotate_minutes * 60, compress)
         print(f"Logging to: {log_filename}")
-    
+
     print("Supercon 2025 Badge Monitor")
     print("=" * 60)
     print(f"Port: {SERIAL_PORT} @ {BAUD_RATE} baud")
     print("Press Ctrl+C to exit")
     print("=" * 60)
-    
-    ser = None
+
+    session = BadgeSession(SERIAL_PORT, BAUD_RATE)
+    stats = new_stats()
+    lines = queue.Queue(LINE_QUEUE_SIZE)
+    stop = threading.Event()
     try:
-        ser = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=1)
-        
-        while True:
-            if ser.in_waiting:
-                data = ser.read(ser.in_waiting).decode('utf-8', errors='ignore')
-                timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
-                
-                # Print to console
-                for line in data.splitlines():
-                    if line.strip():
-                        output = f"[{timestamp}] {line}"
-                        print(output)
-                        
-                        # Write to log file if specified
-                        if log_file:
-                            log_file.write(output + '\n')
-                            log_file.flush()
-            else:
-                time.sleep(0.1)
-                
+        session.open_console('monitor')
+        if session.stream is not None:
+            print(f"Attached to broker: {badge_broker.socket_path(SERIAL_PORT)}")
+
+        reader = threading.Thread(target=read_lines, args=(session, lines, stats, stop), daemon=True)
+        writer = threading.Thread(target=write_lines, args=(lines, log, stop))
+        reader.start()
+        writer.start()
+
+        last, since = dict(stats), time.monotonic()
+        try:
+            while not stop.wait(stats_every or None):
+                report_stats(stats, since, last)
+                last, since = dict(stats), time.monotonic()
+        finally:
+            stop.set()
+            writer.join()
+            # Let a blocked read time out before the port is closed
+            reader.join(1)
+
     except serial.SerialException as e:
         print(f"\nError: {e}")
         return 1
     except KeyboardInterrupt:
         print("\n\nMonitoring stopped.")
     finally:
-        if ser is not None:
-            ser.close()
-        if log_file is not None:
-            log_file.close()
-            print(f"Log saved to: {log_file.name}")
-    
+        session.close()
+        if log is not None:
+            log.close()
+            print(f"Log saved to: {log.path}")
+        elapsed = time.monotonic() - stats['start']
+        print(f"{stats['lines']} lines ({stats['bytes']} bytes) in {elapsed:.0f}s, "
+              f"{stats['dropped']} dropped")
+
     return 0
 
 if __name__ == "__main__":
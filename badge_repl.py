@@ -2,66 +2,300 @@
 """
 Interactive REPL for Supercon 2025 Badge
 Connects to the MicroPython REPL on the badge and provides interactive terminal
+Attaches to badge_broker.py when it is running, so other tools can share the port
+
+The local terminal is put in raw mode and one select() loop forwards each
+keystroke as it is typed and prints output as it arrives, so arrow keys,
+history and Ctrl sequences work as on the badge and an idle session uses no
+CPU. Tab completes from dir() listings cached per firmware version, without
+a round trip to the badge; names it has no listing for fall back to the
+badge's own completion. Listings are only taken of modules the badge has
+already imported, so opening the REPL loads nothing new on the badge
 """
+import codecs
+import json
+import keyword
+import os
+import re
+import select
 import serial
 import sys
-import threading
-import time
+import termios
+import tty
+import badge_broker
+from badge_session import BadgeSession, BadgeError
 
-SERIAL_PORT = "/dev/cu.usbmodem2101"
+SERIAL_PORT = os.environ.get('BADGE_PORT', "/dev/cu.usbmodem2101")
 BAUD_RATE = 115200
 
-def read_serial(ser):
-    """Continuously read from serial port and print to stdout"""
+# Leaves the REPL (Ctrl+C and Ctrl+D go to the badge)
+EXIT_KEY = b'\x1d'
+
+# dir() listings per firmware version (sys.version) and module
+COMPLETION_CACHE = os.path.join(os.path.expanduser('~'), '.cache', 'supercon-badge', 'completions.json')
+
+# Module names offered after import/from; their contents are listed only once
+# the badge has imported them, so the probe never loads a module (or its driver)
+COMPLETION_MODULES = ['builtins', 'sys', 'gc', 'os', 'time', 'machine', 'micropython', 'network',
+                      'esp', 'esp32', 'struct', 'json', 'binascii', 'hashlib', 'math', 'random',
+                      'select', 'socket', 'io', 're', 'collections', 'errno', 'deflate', 'framebuf',
+                      'neopixel', 'asyncio']
+
+# Runs on the badge and lists builtins and modules that are already imported
+# (loaded or bound to a global); modules in KNOWN[sys.version] are already cached
+PROBE_SCRIPT = """
+def _probe(known):
+    import sys, json, builtins
+    known = known.get(sys.version, ())
+    g = globals()
+    loaded = dict(sys.modules)
+    loaded['builtins'] = builtins
+    for v in g.values():
+        if type(v) is type(sys):
+            loaded[v.__name__] = v
+    modules = {}
+    for name, module in loaded.items():
+        if name not in known:
+            modules[name] = [n for n in dir(module) if not n.startswith('__')]
+    print(json.dumps({'version': sys.version, 'modules': modules,
+        'globals': [k for k in g if k != '_probe'],
+        'aliases': dict((k, v.__name__) for k, v in g.items() if type(v) is type(sys) and k != v.__name__)}))
+_probe(KNOWN)
+del _probe
+"""
+
+# The name being completed: an identifier, or module.attribute
+WORD = re.compile(r'([A-Za-z_]\w*\.)?([A-Za-z_]\w*)?$')
+# Lines whose names are added to the globals offered for completion
+ASSIGNMENT = re.compile(r'\s*([A-Za-z_]\w*)\s*=[^=]')
+DEFINITION = re.compile(r'\s*(?:def|class)\s+([A-Za-z_]\w*)')
+IMPORT = re.compile(r'\s*import\s+(.+)')
+FROM_IMPORT = re.compile(r'\s*from\s+\S+\s+import\s+(.+)')
+# A module name being typed after import/from
+MODULE_NAME = re.compile(r'\s*(?:import|from)\s+(\w*)$')
+
+def load_completions():
+    """Load cached dir() listings (empty if missing or unreadable)"""
+    try:
+        with open(COMPLETION_CACHE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_completions(cache):
+    """Write the listing cache atomically"""
+    os.makedirs(os.path.dirname(COMPLETION_CACHE), exist_ok=True)
+    tmp = f'{COMPLETION_CACHE}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(cache, f)
+    os.replace(tmp, COMPLETION_CACHE)
+
+
+class Completer:
+    """Completes names from cached listings, without asking the badge"""
+
+    def __init__(self, modules, names, aliases):
+        self.modules = modules
+        self.module_names = set(COMPLETION_MODULES) | set(modules)
+        self.names = set(names) | set(modules.get('builtins', ())) | set(keyword.kwlist)
+        self.aliases = aliases
+
+    def note(self, line):
+        """Learn the names a line entered at the prompt defines"""
+        for pattern in (ASSIGNMENT, DEFINITION):
+            match = pattern.match(line)
+            if match:
+                self.names.add(match.group(1))
+        match = IMPORT.match(line) or FROM_IMPORT.match(line)
+        if match:
+            for item in match.group(1).split(','):
+                words = item.split()
+                if not words:
+                    continue
+                name = words[-1] if len(words) == 3 and words[1] == 'as' else words[0]
+                self.names.add(name.split('.')[0])
+                if name != words[0]:
+                    self.aliases[name] = words[0]
+
+    def complete(self, line):
+        """Return (typed prefix, candidates) for the end of line; None if unknown here"""
+        match = MODULE_NAME.match(line)
+        if match:
+            prefix = match.group(1)
+            return prefix, sorted(name for name in self.module_names if name.startswith(prefix))
+        match = WORD.search(line)
+        owner, prefix = match.group(1), match.group(2) or ''
+        if owner is None:
+            if not prefix:
+                # Nothing to complete: the badge indents instead
+                return None
+            names = self.names
+        else:
+            head = owner[:-1]
+            # A module imported since the probe is unlisted: the badge, which
+            # has it loaded, completes it and the next probe caches it
+            names = self.modules.get(self.aliases.get(head, head))
+            if names is None or head not in self.names:
+                return None
+        return prefix, sorted(name for name in names if name.startswith(prefix))
+
+
+def fetch_completer(port):
+    """Build a Completer from the cache, listing modules it lacks on the badge (one exec)"""
+    cache = load_completions()
+    known = {version: list(modules) for version, modules in cache.items()}
+    session = BadgeSession(port, BAUD_RATE)
+    try:
+        session.open()
+        code = f"KNOWN = {json.dumps(known)}\n" + PROBE_SCRIPT + "del KNOWN\n"
+        probe = json.loads(session.exec(code))
+    finally:
+        session.close()
+    modules = cache.setdefault(probe['version'], {})
+    if probe['modules']:
+        modules.update(probe['modules'])
+        save_completions(cache)
+    return Completer(modules, probe['globals'], probe['aliases'])
+
+
+class Console:
+    """Forwards keystrokes to the badge, completing Tab locally when it can
+
+    The line being typed is followed as far as printable keys, backspace and
+    Enter go; after arrow keys or other editing keys it is unknown until the
+    next Enter, and Tab is left to the badge.
+    """
+
+    def __init__(self, session, completer):
+        self.session = session
+        self.completer = completer
+        self.line = ''
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        # Output since the last line break: the prompt and echoed input, to redraw
+        self.screen_line = b''
+
+    def show(self, data):
+        """Print badge output"""
+        sys.stdout.buffer.write(data)
+        sys.stdout.buffer.flush()
+        self.screen_line = (self.screen_line + data).rsplit(b'\n', 1)[-1][-1024:]
+
+    def type(self, keys):
+        """Handle keys from the terminal; return False on the exit key"""
+        out = bytearray()
+        for key in self.decoder.decode(keys):
+            if key == EXIT_KEY.decode():
+                self.session.write(bytes(out))
+                return False
+            if key == '\t' and self.completer is not None and self.line is not None:
+                out += self.tab()
+                continue
+            if key in '\r\n':
+                if self.line is not None and self.completer is not None:
+                    self.completer.note(self.line)
+                self.line = ''
+                key = '\r'
+            elif key == '\x03':
+                self.line = ''
+            elif key in '\x7f\x08':
+                if self.line is not None:
+                    self.line = self.line[:-1]
+            elif key < ' ' or key == '\t':
+                # Editing keys (arrows, Ctrl+A/E, history...) and the badge's Tab
+                self.line = None
+            elif self.line is not None:
+                self.line += key
+            out += key.encode('utf-8')
+        if out:
+            self.session.write(bytes(out))
+        return True
+
+    def tab(self):
+        """Complete the current line; return the keys to send for it"""
+        result = self.completer.complete(self.line)
+        if result is None:
+            self.line = None
+            return b'\t'
+        prefix, candidates = result
+        if not candidates:
+            self.show(b'\x07')
+            return b''
+        common = os.path.commonprefix(candidates)
+        if len(common) > len(prefix):
+            self.line += common[len(prefix):]
+            return common[len(prefix):].encode('utf-8')
+        if len(candidates) > 1:
+            # Nothing more in common: list them and redraw the line below
+            width = max(len(name) for name in candidates) + 2
+            per_line = max(1, 78 // width)
+            rows = [''.join(name.ljust(width) for name in candidates[i:i + per_line]).rstrip()
+                    for i in range(0, len(candidates), per_line)]
+            self.show(('\r\n' + '\r\n'.join(rows) + '\r\n').encode('utf-8') + self.screen_line)
+        return b''
+
+
+def run_console(session, console, stdin_fd):
+    """Forward keys and output until the exit key, end of input or the connection closing"""
+    port_fd = session.stream.fileno() if session.stream is not None else session.serial.fileno()
     while True:
         try:
-            if ser.in_waiting:
-                data = ser.read(ser.in_waiting)
-                sys.stdout.write(data.decode('utf-8', errors='ignore'))
-                sys.stdout.flush()
-        except Exception as e:
-            print(f"\nError reading: {e}")
-            break
+            readable, _, _ = select.select([port_fd, stdin_fd], [], [])
+            if port_fd in readable:
+                console.show(session.read_some())
+            if stdin_fd in readable:
+                keys = os.read(stdin_fd, 1024)
+                if not keys:
+                    # Piped input ran out: show the output of the last lines
+                    while select.select([port_fd], [], [], 0.5)[0]:
+                        console.show(session.read_some())
+                    return
+                if not console.type(keys):
+                    return
+        except KeyboardInterrupt:
+            # Only with a terminal that is not in raw mode
+            session.write(b'\x03')
 
 def main():
+    args = sys.argv[1:]
+    complete = '--no-complete' not in args
     print(f"Connecting to badge on {SERIAL_PORT}...")
-    ser = None
-    
+    completer = None
+    if complete:
+        try:
+            completer = fetch_completer(SERIAL_PORT)
+        except (BadgeError, TimeoutError, ValueError, KeyError) as e:
+            print(f"Note: no local completion ({e}); Tab goes to the badge")
+        except serial.SerialException:
+            pass
+
+    session = BadgeSession(SERIAL_PORT, BAUD_RATE)
+    stdin_fd = sys.stdin.fileno()
+    terminal = termios.tcgetattr(stdin_fd) if os.isatty(stdin_fd) else None
     try:
-        ser = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=1)
-        print("Connected! Press Ctrl+C to enter REPL, Ctrl+D to exit.")
+        session.open_console('repl')
+        if session.stream is not None:
+            print(f"Attached to broker: {badge_broker.socket_path(SERIAL_PORT)}")
+        print("Connected! Ctrl+C interrupts, Ctrl+D soft-resets, Ctrl+] exits.")
         print("=" * 60)
-        
-        # Start reader thread
-        reader = threading.Thread(target=read_serial, args=(ser,), daemon=True)
-        reader.start()
-        
-        # Send Ctrl+C to interrupt and enter REPL
-        time.sleep(0.5)
-        ser.write(b'\x03')  # Ctrl+C
-        time.sleep(0.5)
-        
-        # Interactive loop
-        while True:
-            try:
-                user_input = input()
-                ser.write((user_input + '\r\n').encode('utf-8'))
-            except EOFError:
-                break
-            except KeyboardInterrupt:
-                print("\nSending interrupt...")
-                ser.write(b'\x03')  # Ctrl+C
-                
+
+        if terminal is not None:
+            tty.setraw(stdin_fd)
+        # Interrupt the running app; its prompt shows when it arrives
+        session.write(b'\x03')
+        run_console(session, Console(session, completer), stdin_fd)
+
     except serial.SerialException as e:
         print(f"Error: {e}")
         print("Make sure the badge is connected and not in use by another program.")
         return 1
-    except KeyboardInterrupt:
-        print("\nExiting...")
+    except EOFError as e:
+        print(f"\r\n{e}")
     finally:
-        if ser is not None:
-            ser.close()
-    
+        if terminal is not None:
+            termios.tcsetattr(stdin_fd, termios.TCSADRAIN, terminal)
+        session.close()
+    print("\nExiting...")
+
     return 0
 
 if __name__ == "__main__":
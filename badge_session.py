@@ -0,0 +1,1189 @@
+#!/usr/bin/env python3
+"""
+Raw REPL Session for Supercon 2025 Badge
+Opens the serial port once, enters the MicroPython raw REPL once and runs
+every operation over that single connection
+"""
+import ast
+import binascii
+import calendar
+import contextlib
+import os
+import serial
+import socket
+import struct
+import time
+import zlib
+import badge_trace
+
+# Every tool talks to BADGE_PORT when it is set (badge_fleet.py sets it per badge)
+SERIAL_PORT = os.environ.get('BADGE_PORT', "/dev/cu.usbmodem2101")
+BAUD_RATE = 115200
+
+RAW_REPL_BANNER = b'raw REPL; CTRL-B to exit\r\n>'
+# Seconds to wait for the badge to answer a protocol handshake
+HANDSHAKE_TIMEOUT = 5
+# Timeout for scans that take as long as the flash needs (walking, hashing)
+NO_TIMEOUT = float('inf')
+
+# Bytes of file data sent per write statement during uploads through the broker
+WRITE_CHUNK_SIZE = 1024
+# Bytes of file data read per loop iteration on the badge during downloads
+READ_CHUNK_SIZE = 1024
+# Windowed transfer defaults: bytes per chunk and chunks in flight before an ack
+CHUNK_SIZE = 1024
+WINDOW = 8
+# Seconds to wait for a chunk acknowledgement, and resends allowed per chunk
+ACK_TIMEOUT = 5
+TRANSFER_RETRIES = 3
+# Deflate window for compressed transfers (4 KB keeps the badge's buffer small)
+DEFLATE_WBITS = 12
+
+
+class BadgeError(Exception):
+    """Raised when code executed on the badge raises an exception"""
+
+    def __init__(self, traceback_text):
+        self.traceback = traceback_text
+        lines = [line for line in traceback_text.strip().splitlines() if line.strip()]
+        super().__init__(lines[-1] if lines else 'Unknown error on badge')
+
+
+class BadgeSession:
+    """A serial connection to the badge held in raw REPL mode
+
+    `timeout` bounds how long a command may run; None waits for as long as
+    the badge takes. Protocol handshakes always use HANDSHAKE_TIMEOUT.
+    If a broker (badge_broker.py) is serving the port, commands are sent
+    through it instead of opening the port.
+
+    open_console() instead opens the friendly REPL as a plain byte stream
+    (read_some()/read_until()/write()) for the monitor and interactive REPL.
+    """
+
+    def __init__(self, port=SERIAL_PORT, baudrate=BAUD_RATE, timeout=10, use_broker=True):
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.use_broker = use_broker
+        self.broker = None
+        self.serial = None
+        self.stream = None
+        self.in_raw_repl = False
+        self.use_raw_paste = True
+        self._busy = False
+        self._exclusive_depth = 0
+        self._pending = bytearray()
+        self._deflate_support = None
+        self.chunk_size = CHUNK_SIZE
+        self.window = WINDOW
+        # Bytes of code sent and output received, for throughput reporting
+        self.tx_bytes = 0
+        self.rx_bytes = 0
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @badge_trace.traced('open')
+    def open(self):
+        """Open the serial port and enter the raw REPL (without soft reset)"""
+        if self.serial is None and self.broker is None:
+            if self.use_broker:
+                import badge_broker
+                with badge_trace.span('broker connect'):
+                    self.broker = badge_broker.connect(self.port)
+            if self.broker is None:
+                with badge_trace.span('serial open', port=self.port):
+                    self.serial = serial.Serial(self.port, self.baudrate, timeout=1)
+        if self.broker is None and not self.in_raw_repl:
+            self.enter_raw_repl()
+        return self
+
+    def open_console(self, mode='repl'):
+        """Open the friendly REPL as a byte stream, without entering the raw REPL
+
+        Through the broker this attaches as a `mode` stream client ('monitor'
+        or 'repl'), so it sees the badge's output between other tools' requests.
+        """
+        if self.use_broker:
+            import badge_broker
+            client = badge_broker.connect(self.port)
+            if client is not None:
+                self.stream = client.attach(mode)
+                return self
+        self.serial = serial.Serial(self.port, self.baudrate, timeout=1)
+        return self
+
+    @badge_trace.traced('close')
+    def close(self, soft_reset=False):
+        """Leave the raw REPL and close the serial port
+
+        A command still running (e.g. after Ctrl+C on the host) is interrupted
+        first. With soft_reset the badge is rebooted from the friendly REPL,
+        which restarts main.py. Sessions going through the broker never
+        reset the badge, since other clients are sharing it.
+        """
+        if self.broker is not None:
+            self.broker.close()
+            self.broker = None
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+        if self.serial is None:
+            return
+        try:
+            if self._busy:
+                self.serial.write(b'\x03')
+            if self.in_raw_repl:
+                self.exit_raw_repl()
+            if soft_reset:
+                self.serial.write(b'\x04')
+                self.serial.flush()
+        except (serial.SerialException, OSError):
+            pass
+        finally:
+            self.serial.close()
+            self.serial = None
+            self._busy = False
+
+    def read_until(self, ending, timeout=None):
+        """Read up to and including `ending`; raise TimeoutError if it never arrives"""
+        timeout = self.timeout if timeout is None else timeout
+        deadline = None if timeout in (None, NO_TIMEOUT) else time.monotonic() + timeout
+        start = 0
+        while True:
+            index = self._pending.find(ending, start)
+            if index >= 0:
+                end = index + len(ending)
+                data = bytes(self._pending[:end])
+                del self._pending[:end]
+                return data
+            start = max(0, len(self._pending) - len(ending) + 1)
+            self._fill(deadline, ending)
+
+    def read_exact(self, size, timeout=HANDSHAKE_TIMEOUT):
+        """Read exactly `size` bytes"""
+        deadline = time.monotonic() + timeout
+        while len(self._pending) < size:
+            self._fill(deadline, f'{size} bytes')
+        data = bytes(self._pending[:size])
+        del self._pending[:size]
+        return data
+
+    def read_some(self, timeout=1):
+        """Return whatever output has arrived, blocking until some does
+
+        Returns b'' if nothing arrives within `timeout` seconds; raises
+        EOFError once the broker closes a console stream.
+        """
+        if not self._pending:
+            try:
+                self._fill(time.monotonic() + timeout, 'output')
+            except TimeoutError:
+                return b''
+        data = bytes(self._pending)
+        self._pending.clear()
+        self.rx_bytes += len(data)
+        return data
+
+    def _fill(self, deadline, waiting_for):
+        """Block until more bytes arrive (or the deadline passes)"""
+        wait = 1 if deadline is None else max(0.01, deadline - time.monotonic())
+        if self.stream is not None:
+            self.stream.settimeout(wait)
+            try:
+                chunk = self.stream.recv(65536)
+            except socket.timeout:
+                chunk = b''
+            else:
+                if not chunk:
+                    raise EOFError("Broker closed the connection")
+        else:
+            if self.serial.timeout != wait:
+                self.serial.timeout = wait
+            chunk = self.serial.read(max(1, self.serial.in_waiting))
+        if chunk:
+            self._pending += chunk
+        elif deadline is not None and time.monotonic() >= deadline:
+            raise TimeoutError(f"Timed out waiting for {waiting_for!r} from badge")
+
+    def reset_input_buffer(self):
+        """Discard anything the badge has sent that has not been read yet"""
+        self.serial.reset_input_buffer()
+        self._pending.clear()
+
+    @badge_trace.traced('enter raw REPL')
+    def enter_raw_repl(self):
+        """Interrupt any running program and switch to the raw REPL"""
+        self.reset_input_buffer()
+        # Output from the interrupted program is skipped while waiting for the banner
+        self.serial.write(b'\r\x03\x03\x01')
+        try:
+            self.read_until(RAW_REPL_BANNER, timeout=1)
+        except TimeoutError:
+            # A program still unwinding from the interrupt (e.g. one left by an
+            # interrupted transfer) can read the Ctrl-A as input: ask again
+            self.serial.write(b'\r\x03\x01')
+            self.read_until(RAW_REPL_BANNER, timeout=HANDSHAKE_TIMEOUT)
+        self.in_raw_repl = True
+
+    def exit_raw_repl(self):
+        """Return to the friendly REPL"""
+        self.serial.write(b'\r\x02')
+        self.in_raw_repl = False
+
+    def _write_raw_paste(self, code):
+        """Send code using raw-paste flow control; return False if unsupported"""
+        self.serial.write(b'\x05A\x01')
+        reply = self.read_exact(2)
+        if reply == b'R\x00':
+            return False
+        if reply != b'R\x01':
+            # Firmware without raw-paste treats the bytes as code; drop its reply
+            self.read_until(RAW_REPL_BANNER, timeout=HANDSHAKE_TIMEOUT)
+            self.use_raw_paste = False
+            return False
+        window = struct.unpack('<H', self.read_exact(2))[0]
+        remaining = window
+        sent = 0
+        while sent < len(code):
+            # The badge grants another window with 0x01 and aborts with 0x04
+            while remaining == 0 or self._pending or self.serial.in_waiting:
+                flag = self.read_exact(1, timeout=HANDSHAKE_TIMEOUT)
+                if flag == b'\x01':
+                    remaining += window
+                elif flag == b'\x04':
+                    self.serial.write(b'\x04')
+                    raise BadgeError('Badge aborted raw-paste transfer')
+                else:
+                    raise BadgeError(f'Unexpected raw-paste flow control byte {flag!r}')
+            piece = code[sent:sent + remaining]
+            self.serial.write(piece)
+            sent += len(piece)
+            remaining -= len(piece)
+        self.serial.write(b'\x04')
+        # The badge acknowledges the end of data before it starts executing
+        self.read_until(b'\x04', timeout=HANDSHAKE_TIMEOUT)
+        return True
+
+    def _write_raw(self, code):
+        """Send code the classic raw REPL way and wait for the OK"""
+        for i in range(0, len(code), 256):
+            self.serial.write(code[i:i + 256])
+            self.serial.flush()
+        self.serial.write(b'\x04')
+        self.read_until(b'OK', timeout=HANDSHAKE_TIMEOUT)
+
+    @badge_trace.traced('exec')
+    def exec_raw(self, code, timeout=None):
+        """Run code in the raw REPL and return (stdout, stderr) as bytes
+
+        Returns as soon as the badge reports the command finished; the two
+        0x04 markers it sends separate normal output from the exception text.
+        """
+        if self.broker is not None:
+            if isinstance(code, str):
+                code = code.encode('utf-8')
+            self.tx_bytes += len(code)
+            # The broker's own session has no time limit
+            stdout, stderr = self.broker.exec_raw(code, None if timeout == NO_TIMEOUT else timeout)
+            self.rx_bytes += len(stdout) + len(stderr)
+            return stdout, stderr
+        self.exec_start(code)
+        return self.exec_finish(timeout)
+
+    def exec_start(self, code):
+        """Send code and return once the badge starts running it
+
+        The program can then be talked to with readline()/write() while it
+        runs; exec_finish() collects the rest of its output. Not available
+        through the broker.
+        """
+        if isinstance(code, str):
+            code = code.encode('utf-8')
+        self.tx_bytes += len(code)
+        self._busy = True
+        if not (self.use_raw_paste and self._write_raw_paste(code)):
+            self._write_raw(code)
+
+    @badge_trace.traced('exec stream')
+    def exec_stream(self, code, on_output, timeout=None):
+        """Run code, passing its stdout to on_output as it arrives; return stderr
+
+        After `timeout` seconds (None: no limit), or on KeyboardInterrupt
+        on the host, the program is interrupted with Ctrl-C; the rest of its
+        output is still collected before TimeoutError/KeyboardInterrupt is
+        raised. Through the broker, output arrives once the program ends.
+        """
+        if self.broker is not None:
+            stdout, stderr = self.exec_raw(code, timeout)
+            on_output(stdout)
+            return stderr
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self.exec_start(code)
+        try:
+            while True:
+                end = self._pending.find(b'\x04')
+                data = bytes(self._pending[:end if end >= 0 else len(self._pending)])
+                if data:
+                    del self._pending[:len(data)]
+                    self.rx_bytes += len(data)
+                    on_output(data)
+                if end >= 0:
+                    break
+                self._fill(deadline, 'the program to finish')
+        except (TimeoutError, KeyboardInterrupt):
+            stdout, _ = self.interrupt()
+            on_output(stdout)
+            raise
+        stdout, stderr = self.exec_finish()
+        return stderr
+
+    def exec_finish(self, timeout=None):
+        """Wait for a started program to end and return (stdout, stderr)"""
+        stdout = self.read_until(b'\x04', timeout)[:-1]
+        stderr = self.read_until(b'\x04', timeout)[:-1]
+        self.read_until(b'>', timeout=HANDSHAKE_TIMEOUT)
+        self._busy = False
+        self.rx_bytes += len(stdout) + len(stderr)
+        return stdout, stderr
+
+    def read_running(self, timeout=0):
+        """Return (output so far, stderr) from a started program; stderr is None while it runs"""
+        if not self._pending:
+            try:
+                self._fill(time.monotonic() + timeout, 'output')
+            except TimeoutError:
+                return b'', None
+        end = self._pending.find(b'\x04')
+        data = bytes(self._pending[:end if end >= 0 else len(self._pending)])
+        del self._pending[:len(data)]
+        self.rx_bytes += len(data)
+        if end < 0:
+            return data, None
+        return data, self.exec_finish()[1]
+
+    def interrupt(self):
+        """Stop a started program with Ctrl-C; return the rest of its (stdout, stderr)"""
+        self.write(b'\x03')
+        try:
+            return self.exec_finish(HANDSHAKE_TIMEOUT)
+        except TimeoutError:
+            # The program caught the interrupt and kept going: insist
+            self.enter_raw_repl()
+            self._busy = False
+            return b'', b''
+
+    def readline(self, timeout=None):
+        """Read one output line from a running program (without the line ending)
+
+        Raises BadgeError if the program ends (or fails) instead.
+        """
+        line = self.read_until(b'\n', timeout)
+        end = line.find(b'\x04')
+        if end >= 0:
+            # The program finished: put its end marker back and collect the result
+            self._pending[:0] = line[end:]
+            self.rx_bytes += end
+            stdout, stderr = self.exec_finish(timeout)
+            raise BadgeError(stderr.decode('utf-8', errors='replace') or 'Program ended unexpectedly')
+        self.rx_bytes += len(line)
+        return line.rstrip(b'\r\n')
+
+    def write(self, data):
+        """Send bytes to the stdin of a running program (or to the console)"""
+        self.tx_bytes += len(data)
+        if self.stream is not None:
+            self.stream.sendall(data)
+        else:
+            self.serial.write(data)
+
+    @contextlib.contextmanager
+    def exclusive(self):
+        """Keep other broker clients off the badge for a multi-command operation"""
+        if self.broker is None or self._exclusive_depth:
+            # Nested operations run under the outermost lock
+            self._exclusive_depth += 1
+            try:
+                yield
+            finally:
+                self._exclusive_depth -= 1
+            return
+        self.broker.lock()
+        self._exclusive_depth = 1
+        try:
+            yield
+        finally:
+            self._exclusive_depth = 0
+            self.broker.unlock()
+
+    def exec(self, code, timeout=None):
+        """Run code on the badge and return stdout; raise BadgeError on exception"""
+        stdout, stderr = self.exec_raw(code, timeout)
+        if stderr:
+            raise BadgeError(stderr.decode('utf-8', errors='replace'))
+        return stdout
+
+    def eval(self, expression, timeout=None):
+        """Evaluate an expression on the badge and return it as a Python value"""
+        output = self.exec(f"print(repr({expression}))", timeout)
+        return ast.literal_eval(output.decode('utf-8').strip())
+
+    # -- Filesystem operations ------------------------------------------
+
+    @badge_trace.traced('stat')
+    def fs_stat(self, path):
+        """Return (is_dir, size) for a path, or None if it does not exist"""
+        code = f"""
+import os
+try:
+    s = os.stat({path!r})
+    print(repr((s[0] & 0x4000 != 0, s[6])))
+except OSError:
+    print('None')
+"""
+        return ast.literal_eval(self.exec(code).decode('utf-8').strip())
+
+    @badge_trace.traced('listdir')
+    def fs_listdir(self, path='/'):
+        """Return a list of (name, is_dir, size) for a directory"""
+        code = f"""
+import os
+print(repr([(e[0], e[1] & 0x4000 != 0, e[3] if len(e) > 3 else 0) for e in os.ilistdir({path!r})]))
+"""
+        return ast.literal_eval(self.exec(code).decode('utf-8').strip())
+
+    @badge_trace.traced('walk')
+    def fs_walk(self, path='/'):
+        """Walk a remote tree in one pass; return [(path, is_dir, size, mtime)]
+
+        Entries come parents first. mtime is converted to Unix time, whatever
+        epoch the firmware uses. A missing directory yields an empty list.
+        """
+        code = f"""
+import os, time
+print('E\\t%d' % time.gmtime(0)[0])
+def walk(d):
+    for e in os.ilistdir(d):
+        p = d.rstrip('/') + '/' + e[0]
+        s = os.stat(p)
+        print('%s\\t%d\\t%d\\t%d' % (p, s[0] & 0x4000 != 0, s[6], s[8]))
+        if s[0] & 0x4000:
+            walk(p)
+try:
+    walk({path!r})
+except OSError as e:
+    if e.args[0] != 2:
+        raise
+"""
+        entries = []
+        epoch = 0
+        for line in self.exec(code, NO_TIMEOUT).decode('utf-8').splitlines():
+            fields = line.strip('\r').split('\t')
+            if fields[0] == 'E':
+                # Seconds from 1970 to the firmware's epoch (2000 on older ports)
+                epoch = calendar.timegm((int(fields[1]), 1, 1, 0, 0, 0))
+            elif len(fields) == 4:
+                entries.append((fields[0], fields[1] == '1', int(fields[2]), int(fields[3]) + epoch))
+        return entries
+
+    @badge_trace.traced('deflate probe')
+    def deflate_support(self):
+        """Return (can_decompress, can_compress) for the badge's deflate module"""
+        if self._deflate_support is None:
+            code = """
+import io
+try:
+    import deflate
+    d = True
+    try:
+        deflate.DeflateIO(io.BytesIO(), deflate.ZLIB).write(b'x')
+        c = True
+    except Exception:
+        c = False
+except ImportError:
+    d = c = False
+print(repr((d, c)))
+"""
+            self._deflate_support = ast.literal_eval(self.exec(code).decode('utf-8').strip())
+        return self._deflate_support
+
+    @badge_trace.traced('read file')
+    def fs_readfile(self, path, compress=False):
+        """Read a whole file from the badge
+
+        With compress, the badge deflates the file on the fly (firmware built
+        with deflate compression only; otherwise it is sent as is).
+        """
+        if compress and self.deflate_support()[1]:
+            code = f"""
+import sys, io, deflate, ubinascii
+class Out(io.IOBase):
+    def write(self, b):
+        sys.stdout.write(ubinascii.b2a_base64(b))
+        return len(b)
+with open({path!r}, 'rb') as f:
+    z = deflate.DeflateIO(Out(), deflate.ZLIB, {DEFLATE_WBITS})
+    while True:
+        b = f.read({READ_CHUNK_SIZE})
+        if not b:
+            break
+        z.write(b)
+    z.close()
+"""
+            output = self.exec(code)
+            return zlib.decompress(b''.join(binascii.a2b_base64(line)
+                                            for line in output.split(b'\n') if line.strip()))
+        if self.broker is None:
+            return self.fs_get_windowed(path)
+        code = f"""
+import sys, ubinascii
+with open({path!r}, 'rb') as f:
+    while True:
+        b = f.read({READ_CHUNK_SIZE})
+        if not b:
+            break
+        sys.stdout.write(ubinascii.b2a_base64(b))
+"""
+        output = self.exec(code)
+        return b''.join(binascii.a2b_base64(line) for line in output.split(b'\n') if line.strip())
+
+    def fs_read_part(self, path, head=None, tail=None, offset=0, length=None, text_only=False):
+        """Sniff a file and stream all or part of it in one program run
+
+        The part is the first `head` lines, the last `tail` lines, or
+        `length` bytes from `offset` (negative counts from the end; None
+        reads to the end). The badge seeks to it, so only the part crosses
+        the link. Yields ('info', size, is_text) first, based on the first
+        512 bytes, then ('data', bytes) pieces as they arrive; with
+        text_only, a binary file yields nothing after the info. Closing the
+        generator early interrupts the program.
+        """
+        code = f"""
+import sys, ubinascii
+N = {READ_CHUNK_SIZE}
+HEAD, TAIL, LENGTH = {head!r}, {tail!r}, {length!r}
+f = open({path!r}, 'rb')
+size = f.seek(0, 2)
+f.seek(0)
+b = f.read(512)
+try:
+    b.decode('utf-8')
+    text = b'\\x00' not in b
+except Exception:
+    text = False
+print('S %d %d' % (size, 1 if text else 0))
+start, end = {offset}, size
+if start < 0:
+    start = max(0, size + start)
+if LENGTH is not None:
+    end = min(size, start + LENGTH)
+if HEAD is not None:
+    left, pos, end = HEAD, 0, 0 if HEAD == 0 else size
+    f.seek(0)
+    while left > 0:
+        b = f.read(N)
+        if not b:
+            break
+        i = -1
+        while left:
+            i = b.find(b'\\n', i + 1)
+            if i < 0:
+                break
+            left -= 1
+        if not left:
+            end = pos + i + 1
+        pos += len(b)
+if TAIL is not None:
+    left, pos, start = TAIL, size, size if TAIL == 0 else 0
+    if size:
+        f.seek(size - 1)
+        if f.read(1) == b'\\n':
+            pos -= 1
+    while left > 0 and pos > 0:
+        k = min(N, pos)
+        pos -= k
+        f.seek(pos)
+        b = f.read(k)
+        i = len(b)
+        while left:
+            i = b.rfind(b'\\n', 0, i)
+            if i < 0:
+                break
+            left -= 1
+        if not left:
+            start = pos + i + 1
+if text or not {text_only!r}:
+    f.seek(start)
+    while start < end:
+        b = f.read(min(N, end - start))
+        if not b:
+            break
+        start += len(b)
+        sys.stdout.write(ubinascii.b2a_base64(b))
+f.close()
+print('Z')
+"""
+        with badge_trace.span('read part'):
+            tx, rx = self.tx_bytes, self.rx_bytes
+            if self.broker is not None:
+                lines = iter(self.exec(code, timeout=None).split(b'\n'))
+                next_line = lambda: next(lines, b'Z').rstrip(b'\r')
+            else:
+                self.exec_start(code)
+                next_line = lambda: self.readline()
+            try:
+                _, size, is_text = next_line().split()
+                yield ('info', int(size), is_text == b'1')
+                while True:
+                    line = next_line()
+                    if line == b'Z':
+                        break
+                    if line:
+                        yield ('data', binascii.a2b_base64(line))
+            except GeneratorExit:
+                # The caller stopped early: end the program so the session is free again
+                if self.broker is None:
+                    self.interrupt()
+                raise
+            if self.broker is None:
+                _, stderr = self.exec_finish()
+                if stderr:
+                    raise BadgeError(stderr.decode('utf-8', errors='replace'))
+            badge_trace.count(tx=self.tx_bytes - tx, rx=self.rx_bytes - rx)
+
+    @badge_trace.traced('write file')
+    def fs_writefile(self, path, data, compress=False):
+        """Write data to a file on the badge, replacing it
+
+        With compress, data is deflated on the host and inflated by the badge
+        into the destination; it is sent as is when that would not be smaller
+        or the firmware has no deflate module.
+        """
+        if compress and self.deflate_support()[0]:
+            packed = zlib.compress(data, 9, DEFLATE_WBITS)
+            if len(packed) < len(data):
+                self._write_deflated(path, packed, len(data))
+                return
+        self._put_bytes(path, data)
+
+    def _put_bytes(self, path, data):
+        """Write bytes to a badge file over the fastest path available"""
+        if self.broker is None:
+            self.fs_put_windowed(path, data)
+            return
+        # The broker only runs whole commands: one write statement per chunk
+        with self.exclusive():
+            self.exec(f"import ubinascii\nf = open({path!r}, 'wb')\nw = f.write\na = ubinascii.a2b_base64")
+            try:
+                for i in range(0, len(data), WRITE_CHUNK_SIZE):
+                    self.exec(f"w(a({binascii.b2a_base64(data[i:i + WRITE_CHUNK_SIZE], newline=False)!r}))")
+            finally:
+                self.exec("f.close()")
+
+    @badge_trace.traced('write deflated')
+    def _write_deflated(self, path, packed, size):
+        """Stage deflated data next to `path`, then inflate it into place on the badge"""
+        staging = path + '.z~'
+        with self.exclusive():
+            self._put_bytes(staging, packed)
+            code = f"""
+import os, deflate
+n = 0
+with open({staging!r}, 'rb') as s, open({path!r}, 'wb') as d:
+    z = deflate.DeflateIO(s, deflate.ZLIB)
+    while True:
+        b = z.read({READ_CHUNK_SIZE})
+        if not b:
+            break
+        d.write(b)
+        n += len(b)
+os.remove({staging!r})
+print(n)
+"""
+            written = int(self.exec(code).decode('utf-8').strip())
+        if written != size:
+            raise BadgeError(f"Decompressed {written} bytes on badge, expected {size}")
+
+    # -- Windowed transfer engine -----------------------------------------
+    #
+    # File data travels as text lines "<seq> <crc32> <base64>", which never
+    # contain the REPL's control characters, to a small program running on
+    # the badge. Up to `window` chunks are in flight before an acknowledgement
+    # ("A<seq>") is needed; a bad chunk is answered with "N<seq>" and the
+    # sender goes back to it.
+
+    @badge_trace.traced('windowed put')
+    def fs_put_windowed(self, path, data, chunk_size=None, window=None, append=False):
+        """Upload data with pipelined, CRC-checked chunks (appended to the file with append)"""
+        chunk_size = chunk_size or self.chunk_size
+        window = window or self.window
+        code = f"""
+import sys, ubinascii
+crc = getattr(ubinascii, 'crc32', None)
+a2b = ubinascii.a2b_base64
+expect = 0
+nak = False
+f = open({path!r}, {'ab' if append else 'wb'!r})
+print('R', 1 if crc else 0)
+while True:
+    r = sys.stdin.readline().split()
+    if not r:
+        continue
+    if r[0] == 'E':
+        break
+    seq = int(r[0])
+    if seq != expect:
+        if seq > expect and not nak:
+            print('N%d' % expect)
+            nak = True
+        elif seq < expect:
+            print('A%d' % (expect - 1))
+        continue
+    b = a2b(r[2])
+    if crc and crc(b) != int(r[1], 16):
+        if not nak:
+            print('N%d' % seq)
+            nak = True
+        continue
+    f.write(b)
+    print('A%d' % seq)
+    expect += 1
+    nak = False
+f.close()
+"""
+        chunks = [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+        lines = [b'%d %08x %s\n' % (seq, zlib.crc32(chunk),
+                                      binascii.b2a_base64(chunk, newline=False))
+                 for seq, chunk in enumerate(chunks)]
+        self.exec_start(code)
+        self.readline(HANDSHAKE_TIMEOUT)
+        self._send_windowed(lines, window, path)
+        self.write(b'E\n')
+        _, stderr = self.exec_finish()
+        if stderr:
+            raise BadgeError(stderr.decode('utf-8', errors='replace'))
+
+    def _send_windowed(self, lines, window, what):
+        """Send numbered lines to a running receiver, resending on a NAK or lost ack"""
+        base = sent = 0
+        retries = 0
+        while base < len(lines):
+            while sent < len(lines) and sent - base < window:
+                self.write(lines[sent])
+                sent += 1
+            try:
+                reply = self.readline(ACK_TIMEOUT)
+            except TimeoutError:
+                retries += 1
+                if retries > TRANSFER_RETRIES:
+                    raise
+                # Lost acknowledgement: resend everything still in flight
+                sent = base
+                continue
+            seq = int(reply[1:])
+            if reply[:1] == b'A':
+                base = max(base, seq + 1)
+                retries = 0
+            elif reply[:1] == b'N':
+                base = sent = seq
+                retries += 1
+                if retries > TRANSFER_RETRIES:
+                    raise BadgeError(f"Chunk {seq} of {what} failed its CRC check repeatedly")
+
+    @badge_trace.traced('write archive')
+    def fs_write_archive(self, files, dirs=(), remove=()):
+        """Create directories, write files and delete paths in one program run
+
+        `files` is a list of (remote path, data, compress). Everything goes to
+        a small unpacker on the badge as one windowed stream of records: 'D'
+        makes a directory, 'X' removes a path if present, 'F' opens a file, 'd'
+        lines carry CRC-checked data and 'C' closes the file. Files marked
+        compress that shrink are deflated on the host and inflated by the badge.
+
+        Returns the badge's manifest {path: (size, sha256)} of the files it
+        wrote. Needs a direct connection (the broker cannot stream stdin).
+        """
+        can_inflate = any(compress for _, _, compress in files) and self.deflate_support()[0]
+        code = f"""
+import os, sys, ubinascii, hashlib
+crc = getattr(ubinascii, 'crc32', None)
+a2b = ubinascii.a2b_base64
+expect = 0
+nak = False
+done = []
+def inflate(path, h):
+    import deflate
+    n = 0
+    with open(path + '.z~', 'rb') as s, open(path, 'wb') as d:
+        z = deflate.DeflateIO(s, deflate.ZLIB)
+        while True:
+            b = z.read({READ_CHUNK_SIZE})
+            if not b:
+                break
+            d.write(b)
+            h.update(b)
+            n += len(b)
+    os.remove(path + '.z~')
+    return n
+print('R', 1 if crc else 0)
+while True:
+    r = sys.stdin.readline().rstrip('\\r\\n').split(' ', 2)
+    if not r[0]:
+        continue
+    if r[0] == 'E':
+        break
+    seq = int(r[0])
+    if seq != expect:
+        if seq > expect and not nak:
+            print('N%d' % expect)
+            nak = True
+        elif seq < expect:
+            print('A%d' % (expect - 1))
+        continue
+    if r[1] == 'd':
+        c, b = r[2].split(' ')
+        b = a2b(b)
+        if crc and crc(b) != int(c, 16):
+            if not nak:
+                print('N%d' % seq)
+                nak = True
+            continue
+        f.write(b)
+        if not packed:
+            h.update(b)
+            n += len(b)
+    elif r[1] == 'F':
+        packed, path = r[2].split(' ', 1)
+        packed = packed == '1'
+        f = open(path + '.z~' if packed else path, 'wb')
+        h = hashlib.sha256()
+        n = 0
+    elif r[1] == 'C':
+        f.close()
+        if packed:
+            n = inflate(path, h)
+        done.append((path, n, ubinascii.hexlify(h.digest()).decode()))
+    elif r[1] == 'D':
+        try:
+            os.mkdir(r[2])
+        except OSError as e:
+            if e.args[0] != 17:
+                raise
+    elif r[1] == 'X':
+        try:
+            os.remove(r[2])
+        except OSError:
+            pass
+    print('A%d' % seq)
+    expect += 1
+    nak = False
+for path, n, digest in done:
+    print('M\\t%s\\t%d\\t%s' % (path, n, digest))
+"""
+        records = [b'D ' + path.encode('utf-8') for path in dirs]
+        records += [b'X ' + path.encode('utf-8') for path in remove]
+        for path, data, compress in files:
+            packed = zlib.compress(data, 9, DEFLATE_WBITS) if compress and can_inflate else data
+            packed = packed if len(packed) < len(data) else data
+            records.append(b'F %d %s' % (packed is not data, path.encode('utf-8')))
+            records += [b'd %08x %s' % (zlib.crc32(chunk), binascii.b2a_base64(chunk, newline=False))
+                        for chunk in (packed[i:i + self.chunk_size]
+                                      for i in range(0, len(packed), self.chunk_size))]
+            records.append(b'C')
+        lines = [b'%d %s\n' % (seq, record) for seq, record in enumerate(records)]
+        self.exec_start(code)
+        self.readline(HANDSHAKE_TIMEOUT)
+        self._send_windowed(lines, self.window, 'the archive')
+        self.write(b'E\n')
+        stdout, stderr = self.exec_finish()
+        if stderr:
+            raise BadgeError(stderr.decode('utf-8', errors='replace'))
+        manifest = {}
+        for line in stdout.decode('utf-8').splitlines():
+            fields = line.strip('\r').split('\t')
+            if fields[0] == 'M':
+                manifest[fields[1]] = (int(fields[2]), fields[3])
+        return manifest
+
+    @badge_trace.traced('windowed get')
+    def fs_get_windowed(self, path, chunk_size=None, window=None, offset=0, on_chunk=None):
+        """Download a file with pipelined, CRC-checked chunks
+
+        Starts `offset` bytes into the file (returning only the rest), and
+        hands each verified chunk to on_chunk as it arrives, if given.
+        """
+        chunk_size = chunk_size or self.chunk_size
+        window = window or self.window
+        code = f"""
+import sys, ubinascii
+crc = getattr(ubinascii, 'crc32', lambda b: 0)
+f = open({path!r}, 'rb')
+size = f.seek(0, 2) - {offset}
+n = (size + {chunk_size} - 1) // {chunk_size}
+print('S %d %d %d' % (size, n, 1 if hasattr(ubinascii, 'crc32') else 0))
+seq = acked = 0
+while acked < n:
+    while seq < n and seq - acked < {window}:
+        f.seek({offset} + seq * {chunk_size})
+        b = f.read({chunk_size})
+        sys.stdout.write('%d %08x ' % (seq, crc(b)))
+        sys.stdout.write(ubinascii.b2a_base64(b))
+        seq += 1
+    r = sys.stdin.readline()
+    if r[0] == 'A':
+        acked = max(acked, int(r[1:]) + 1)
+    elif r[0] == 'N':
+        seq = acked = int(r[1:])
+f.close()
+"""
+        self.exec_start(code)
+        header = self.readline(HANDSHAKE_TIMEOUT).split()
+        size, count, checked = int(header[1]), int(header[2]), header[3] == b'1'
+        chunks = []
+        nak = False
+        retries = 0
+        while len(chunks) < count:
+            fields = self.readline(ACK_TIMEOUT).split()
+            seq = int(fields[0])
+            if seq != len(chunks):
+                # Still in flight from before a go-back; the resend follows
+                continue
+            chunk = binascii.a2b_base64(fields[2])
+            if checked and zlib.crc32(chunk) != int(fields[1], 16):
+                retries += 1
+                if retries > TRANSFER_RETRIES:
+                    raise BadgeError(f"Chunk {seq} of {path} failed its CRC check repeatedly")
+                if not nak:
+                    self.write(b'N%d\n' % seq)
+                    nak = True
+                continue
+            chunks.append(chunk)
+            if on_chunk is not None:
+                on_chunk(chunk)
+            self.write(b'A%d\n' % seq)
+            nak = False
+            retries = 0
+        _, stderr = self.exec_finish()
+        if stderr:
+            raise BadgeError(stderr.decode('utf-8', errors='replace'))
+        data = b''.join(chunks)
+        if len(data) != size:
+            raise BadgeError(f"Received {len(data)} bytes of {path}, expected {size}")
+        return data
+
+    def fs_read_archive(self, paths, compress=False):
+        """Stream files and whole directories from the badge in one program run
+
+        The badge walks `paths` itself and sends each file as a framed record:
+        an 'F<TAB>size<TAB>path' header, base64 payload lines and a
+        'C<TAB>crc32' trailer. This generator yields the records as they
+        arrive, in stream order:
+
+            ('dir', path)              a directory (before its contents)
+            ('file', path, size)       start of a file
+            ('data', bytes)            the next piece of the current file
+            ('end', path, crc_ok)      end of the file (crc_ok is None if unchecked)
+            ('error', path, message)   a path the badge could not read
+
+        With compress, each file is deflated on the badge (if supported).
+        Through the broker the output is buffered until the walk finishes.
+        """
+        compress = compress and self.deflate_support()[1]
+        writer = f"deflate.DeflateIO(Out(), deflate.ZLIB, {DEFLATE_WBITS})" if compress else "Out()"
+        code = f"""
+import os, sys, io, ubinascii
+{'import deflate' if compress else ''}
+crc = getattr(ubinascii, 'crc32', None)
+class Out(io.IOBase):
+    def write(self, b):
+        sys.stdout.write(ubinascii.b2a_base64(b))
+        return len(b)
+    def close(self):
+        pass
+def send(p):
+    try:
+        s = os.stat(p)
+        if s[0] & 0x4000:
+            print('D\\t' + p)
+            for e in os.ilistdir(p):
+                send(p.rstrip('/') + '/' + e[0])
+            return
+        f = open(p, 'rb')
+    except OSError as e:
+        print('!\\t%s\\t%s' % (p, e))
+        return
+    print('F\\t%d\\t%s' % (s[6], p))
+    out = {writer}
+    c = 0
+    while True:
+        b = f.read({READ_CHUNK_SIZE})
+        if not b:
+            break
+        if crc:
+            c = crc(b, c)
+        out.write(b)
+    out.close()
+    f.close()
+    print('C\\t' + ('%08x' % (c & 0xffffffff) if crc else '-'))
+for p in {list(paths)!r}:
+    send(p)
+print('Z')
+"""
+        with badge_trace.span('read archive'):
+            tx, rx = self.tx_bytes, self.rx_bytes
+            if self.broker is not None:
+                lines = iter(self.exec(code, timeout=None).split(b'\n'))
+                next_line = lambda: next(lines, b'Z').rstrip(b'\r')
+            else:
+                self.exec_start(code)
+                next_line = lambda: self.readline(ACK_TIMEOUT)
+            path = inflater = None
+            crc = 0
+            while True:
+                line = next_line()
+                if b'\t' not in line:
+                    if line == b'Z':
+                        break
+                    if path is not None and line:
+                        data = binascii.a2b_base64(line)
+                        if inflater is not None:
+                            data = inflater.decompress(data)
+                        crc = zlib.crc32(data, crc)
+                        yield ('data', data)
+                    continue
+                kind, _, rest = line.decode('utf-8', errors='replace').partition('\t')
+                if kind == 'D':
+                    yield ('dir', rest)
+                elif kind == 'F':
+                    size, _, path = rest.partition('\t')
+                    crc = 0
+                    inflater = zlib.decompressobj() if compress else None
+                    yield ('file', path, int(size))
+                elif kind == 'C':
+                    if inflater is not None:
+                        tail = inflater.flush()
+                        if tail:
+                            crc = zlib.crc32(tail, crc)
+                            yield ('data', tail)
+                    yield ('end', path, None if rest == '-' else crc == int(rest, 16))
+                    path = None
+                elif kind == '!':
+                    error_path, _, message = rest.partition('\t')
+                    yield ('error', error_path, message)
+            if self.broker is None:
+                _, stderr = self.exec_finish()
+                if stderr:
+                    raise BadgeError(stderr.decode('utf-8', errors='replace'))
+            badge_trace.count(tx=self.tx_bytes - tx, rx=self.rx_bytes - rx)
+
+    @badge_trace.traced('hash')
+    def fs_hash(self, path, length=None):
+        """Return (size, sha256 hex) of a file, hashing only its first `length`
+        bytes if given; None if it does not exist"""
+        code = f"""
+import hashlib, ubinascii
+try:
+    f = open({path!r}, 'rb')
+except OSError:
+    print('None')
+else:
+    size = f.seek(0, 2)
+    f.seek(0)
+    left = size if {length!r} is None else min({length!r}, size)
+    h = hashlib.sha256()
+    while left > 0:
+        b = f.read(min({READ_CHUNK_SIZE}, left))
+        if not b:
+            break
+        h.update(b)
+        left -= len(b)
+    f.close()
+    print(repr((size, ubinascii.hexlify(h.digest()).decode())))
+"""
+        return ast.literal_eval(self.exec(code, NO_TIMEOUT).decode('utf-8').strip())
+
+    @badge_trace.traced('rename')
+    def fs_rename(self, source, destination):
+        """Move a file on the badge, replacing the destination"""
+        self.exec(f"""
+import os
+try:
+    os.remove({destination!r})
+except OSError:
+    pass
+os.rename({source!r}, {destination!r})
+""")
+
+    @badge_trace.traced('mkdir')
+    def fs_mkdir(self, path, exist_ok=True):
+        """Create a directory on the badge"""
+        code = f"""
+import os
+try:
+    os.mkdir({path!r})
+except OSError as e:
+    if not {exist_ok!r} or e.args[0] != 17:
+        raise
+"""
+        self.exec(code)
+
+    @badge_trace.traced('remove')
+    def fs_remove(self, path, missing_ok=False):
+        """Delete a file on the badge"""
+        if missing_ok:
+            self.exec(f"import os\ntry:\n    os.remove({path!r})\nexcept OSError:\n    pass")
+        else:
+            self.exec(f"import os\nos.remove({path!r})")
+
+    @badge_trace.traced('rmdir')
+    def fs_rmdir(self, path):
+        """Delete an empty directory on the badge"""
+        self.exec(f"import os\nos.rmdir({path!r})")
+
+    @badge_trace.traced('hash tree')
+    def fs_hash_tree(self, path):
+        """Walk a remote tree in one pass; return ({relpath: (size, sha256)}, dirs)
+
+        Hashing happens on the badge, so only the manifest crosses the link.
+        A missing directory yields an empty manifest.
+        """
+        code = f"""
+import os, hashlib, ubinascii
+def walk(d, rel):
+    for e in os.ilistdir(d):
+        p = d.rstrip('/') + '/' + e[0]
+        r = rel + e[0]
+        if e[1] & 0x4000:
+            print('D\\t' + r)
+            walk(p, r + '/')
+        else:
+            h = hashlib.sha256()
+            n = 0
+            with open(p, 'rb') as f:
+                while True:
+                    b = f.read({READ_CHUNK_SIZE})
+                    if not b:
+                        break
+                    h.update(b)
+                    n += len(b)
+            print('F\\t%s\\t%d\\t%s' % (r, n, ubinascii.hexlify(h.digest()).decode()))
+try:
+    walk({path!r}, '')
+except OSError as e:
+    if e.args[0] != 2:
+        raise
+"""
+        files = {}
+        dirs = set()
+        for line in self.exec(code, NO_TIMEOUT).decode('utf-8').splitlines():
+            fields = line.strip('\r').split('\t')
+            if fields[0] == 'D':
+                dirs.add(fields[1])
+            elif fields[0] == 'F':
+                files[fields[1]] = (int(fields[2]), fields[3])
+        return files, dirs
@@ -0,0 +1,695 @@
+#!/usr/bin/env python3
+"""
+Simulated Badge for Supercon 2025 Badge tools
+Runs a fake MicroPython device on a pseudo-terminal so the tools can be
+exercised without an ESP32-S3 attached
+"""
+import binascii
+import builtins
+import ctypes
+import errno
+import functools
+import hashlib
+import io
+import json
+import os
+import pty
+import queue
+import select
+import shutil
+import struct
+import sys
+import tempfile
+import threading
+import time
+import traceback
+import tty
+import types
+import zlib
+
+BANNER = "MicroPython v1.25.0 on 2025-10-01; Supercon 2025 Badge with ESP32S3"
+RAW_REPL_BANNER = b'raw REPL; CTRL-B to exit\r\n>'
+RAW_PASTE_WINDOW = 128
+
+
+def _mp_errors(func):
+    """Raise host OS errors the way MicroPython reports them (OSError: [Errno 2] ENOENT)"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except OSError as e:
+            if e.errno is None:
+                raise
+            raise OSError(e.errno, errno.errorcode.get(e.errno, 'EIO')) from None
+    return wrapper
+
+
+class _FakeOS(types.ModuleType):
+    """`os` module whose paths are rooted in a host directory"""
+
+    def __init__(self, root):
+        super().__init__('os')
+        self._root = root
+        self._cwd = '/'
+        self.sep = '/'
+
+    def _host(self, path):
+        if not path.startswith('/'):
+            path = self._cwd.rstrip('/') + '/' + path
+        parts = []
+        for part in path.split('/'):
+            if part in ('', '.'):
+                continue
+            if part == '..':
+                if parts:
+                    parts.pop()
+                continue
+            parts.append(part)
+        return os.path.join(self._root, *parts)
+
+    @_mp_errors
+    def listdir(self, path=None):
+        return sorted(os.listdir(self._host(path or self._cwd)))
+
+    @_mp_errors
+    def ilistdir(self, path=None):
+        host = self._host(path or self._cwd)
+        entries = []
+        for name in sorted(os.listdir(host)):
+            full = os.path.join(host, name)
+            if os.path.isdir(full):
+                entries.append((name, 0x4000, 0, 0))
+            else:
+                entries.append((name, 0x8000, 0, os.path.getsize(full)))
+        return iter(entries)
+
+    @_mp_errors
+    def stat(self, path):
+        st = os.stat(self._host(path))
+        mode = 0x4000 if os.path.isdir(self._host(path)) else 0x8000
+        size = 0 if mode == 0x4000 else st.st_size
+        mtime = int(st.st_mtime)
+        return (mode, 0, 0, 0, 0, 0, size, mtime, mtime, mtime)
+
+    @_mp_errors
+    def mkdir(self, path):
+        os.mkdir(self._host(path))
+
+    @_mp_errors
+    def remove(self, path):
+        host = self._host(path)
+        if os.path.isdir(host):
+            raise OSError(21, 'EISDIR')
+        os.remove(host)
+
+    @_mp_errors
+    def rmdir(self, path):
+        os.rmdir(self._host(path))
+
+    @_mp_errors
+    def rename(self, old, new):
+        os.rename(self._host(old), self._host(new))
+
+    def getcwd(self):
+        return self._cwd
+
+    @_mp_errors
+    def chdir(self, path):
+        if not os.path.isdir(self._host(path)):
+            raise OSError(2, 'ENOENT')
+        self._cwd = '/' + os.path.relpath(self._host(path), self._root).replace('.', '')
+
+    def statvfs(self, path):
+        usage = shutil.disk_usage(self._root)
+        return (4096, 4096, usage.total // 4096, usage.free // 4096,
+                usage.free // 4096, 0, 0, 0, 0, 255)
+
+    def uname(self):
+        return ('esp32', 'esp32', '1.25.0', 'v1.25.0 on 2025-10-01',
+                'Supercon 2025 Badge with ESP32S3')
+
+
+class _DeflateIO:
+    """deflate.DeflateIO over a stream, backed by zlib"""
+
+    def __init__(self, stream, format=0, wbits=0, close=False):
+        self.stream = stream
+        wbits = wbits or 15
+        self.wbits = {1: -wbits, 2: wbits, 3: wbits + 16}.get(format, wbits + 32)
+        self.inflater = None
+        self.deflater = None
+
+    def read(self, size=-1):
+        if self.inflater is None:
+            self.inflater = zlib.decompressobj(self.wbits)
+        out = b''
+        while (size < 0 or len(out) < size) and not self.inflater.eof:
+            if self.inflater.unconsumed_tail:
+                data = self.inflater.unconsumed_tail
+            else:
+                data = self.stream.read(256)
+                if not data:
+                    break
+            out += self.inflater.decompress(data, max(0, size - len(out)) if size > 0 else 0)
+        return out
+
+    def write(self, data):
+        if self.deflater is None:
+            self.deflater = zlib.compressobj(9, zlib.DEFLATED, self.wbits)
+        self.stream.write(self.deflater.compress(bytes(data)))
+        return len(data)
+
+    def close(self):
+        if self.deflater is not None:
+            self.stream.write(self.deflater.flush())
+            self.deflater = None
+
+
+class _Stdin:
+    """sys.stdin of the running program, fed with bytes arriving on the pty"""
+
+    def __init__(self):
+        self.data = bytearray()
+        self.ready = threading.Condition()
+
+    def feed(self, data):
+        with self.ready:
+            self.data += data
+            self.ready.notify_all()
+
+    def _take(self, size, until=None):
+        with self.ready:
+            while True:
+                if until is not None and until in self.data:
+                    size = self.data.index(until) + 1
+                if len(self.data) >= size:
+                    break
+                self.ready.wait(0.05)
+            out = bytes(self.data[:size])
+            del self.data[:size]
+            return out
+
+    def read(self, size=1):
+        return self._take(size).decode('latin-1')
+
+    def readline(self):
+        return self._take(1 << 30, b'\n').decode('latin-1')
+
+    @property
+    def buffer(self):
+        stdin = self
+
+        class _Buffer:
+            def read(self, size=1):
+                return stdin._take(size)
+
+            def readline(self):
+                return stdin._take(1 << 30, b'\n')
+
+        return _Buffer()
+
+
+def _module(name, **attrs):
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    return module
+
+
+class _Timer:
+    """machine.Timer: callbacks run on a thread of their own, like soft timer callbacks"""
+    ONE_SHOT = 0
+    PERIODIC = 1
+    running = set()
+
+    def __init__(self, id=-1, **kwargs):
+        self.stop = threading.Event()
+        if kwargs:
+            self.init(**kwargs)
+
+    def init(self, mode=PERIODIC, period=1000, callback=None, freq=None):
+        self.deinit()
+        self.stop = threading.Event()
+        interval = 1 / freq if freq else period / 1000
+
+        def run(stop):
+            due = time.monotonic()
+            while True:
+                due += interval
+                if stop.wait(max(0.0, due - time.monotonic())):
+                    return
+                callback(self)
+                if mode == self.ONE_SHOT:
+                    return
+
+        threading.Thread(target=run, args=(self.stop,), daemon=True).start()
+        _Timer.running.add(self)
+
+    def deinit(self):
+        self.stop.set()
+        _Timer.running.discard(self)
+
+
+class _Link:
+    """One direction of a serial link with limited bandwidth and fixed latency"""
+
+    def __init__(self, bandwidth, latency):
+        self.bandwidth = bandwidth
+        self.latency = latency
+        self.free_at = 0.0
+        self.queue = queue.Queue()
+
+    def send(self, data):
+        """Queue bytes with the time their last byte reaches the other end"""
+        start = max(time.monotonic(), self.free_at)
+        self.free_at = start + (len(data) / self.bandwidth if self.bandwidth else 0.0)
+        self.queue.put((self.free_at + self.latency, data))
+
+    def receive(self, timeout=None):
+        """Return the next bytes once they have arrived (queue.Empty on timeout)"""
+        arrival, data = self.queue.get(timeout=timeout)
+        delay = arrival - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        return data
+
+
+class FakeBadge:
+    """MicroPython REPL state machine served on the master side of a pty
+
+    `bandwidth` (bytes/s, 0 for unlimited) and `latency` (seconds each way)
+    model a slower link than the pty, for benchmarking the tools.
+    """
+
+    def __init__(self, root, chatter=0.0, unique_id=b'\xf4\x12\xfa\x5c\x01\x02',
+                 bandwidth=0, latency=0.0):
+        self.root = root
+        self.chatter = chatter
+        self.unique_id = unique_id
+        if bandwidth or latency:
+            self.uplink = _Link(bandwidth, latency)
+            self.downlink = _Link(bandwidth, latency)
+        else:
+            self.uplink = self.downlink = None
+        self._unread = b''
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        self.mode = 'friendly'
+        self.buffer = b''
+        self.line = b''
+        self.running = False
+        self.in_user_code = False
+        self.kbd_intr = True
+        self.worker = None
+        self._write_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._reset_namespace()
+
+    # -- MicroPython environment -------------------------------------------
+
+    def _reset_namespace(self):
+        fake_os = _FakeOS(self.root)
+        self.stdin = _Stdin()
+        self.os = fake_os
+        self.stdout = io.StringIO()
+        badge = self
+
+        class _Stdout:
+            def write(self, s):
+                data = bytes(s) if isinstance(s, (bytes, bytearray)) else s.encode('utf-8')
+                badge._emit(data.replace(b'\n', b'\r\n'))
+                return len(s)
+
+            buffer = property(lambda self: self)
+
+            def flush(self):
+                pass
+
+        stdout = _Stdout()
+        start = time.monotonic()
+        ticks_ms = lambda: int((time.monotonic() - start) * 1000) & 0x3FFFFFFF
+        modules = {
+            'os': fake_os,
+            'gc': _module('gc', mem_free=lambda: 8_123_456, mem_alloc=lambda: 201_344,
+                          collect=lambda: None, threshold=lambda *a: -1),
+            'machine': _module('machine', freq=lambda *a: 240_000_000,
+                               unique_id=lambda: self.unique_id, Timer=_Timer,
+                               reset=lambda: None, soft_reset=lambda: None),
+            'esp': _module('esp', flash_size=lambda: 16 * 1024 * 1024),
+            'network': _module('network', STA_IF=0, AP_IF=1,
+                               WLAN=lambda i: _module('WLAN', active=lambda *a: False,
+                                                      isconnected=lambda: False,
+                                                      ifconfig=lambda: ('0.0.0.0',) * 4)),
+            'binascii': binascii,
+            'hashlib': hashlib,
+            'struct': struct,
+            'zlib': zlib,
+            'io': io,
+            'json': json,
+            'errno': errno,
+            'deflate': _module('deflate', AUTO=0, RAW=1, ZLIB=2, GZIP=3, DeflateIO=_DeflateIO),
+            'time': _module('time', sleep=time.sleep, time=time.time, gmtime=time.gmtime,
+                            sleep_ms=lambda ms: time.sleep(ms / 1000),
+                            ticks_ms=ticks_ms, ticks_diff=lambda a, b: a - b,
+                            ticks_add=lambda a, b: a + b,
+                            ticks_us=lambda: int((time.monotonic() - start) * 1e6)),
+            'micropython': _module('micropython', const=lambda x: x,
+                                   mem_info=lambda *a: None,
+                                   kbd_intr=lambda c: setattr(self, 'kbd_intr', c == 3)),
+        }
+        modules['sys'] = _module(
+            'sys', stdout=stdout, stdin=self.stdin, platform='esp32',
+            version='3.4.0; MicroPython v1.25.0 on 2025-10-01',
+            implementation=types.SimpleNamespace(name='micropython', version=(1, 25, 0, ''),
+                                                 _machine='Supercon 2025 Badge with ESP32S3',
+                                                 _mpy=0x2b06),
+            modules={}, path=['', '/lib'], maxsize=2**31 - 1,
+            print_exception=lambda e, f=None: traceback.print_exception(e, file=stdout),
+            exit=sys.exit)
+        modules['builtins'] = _module('builtins')
+        for alias in ('os', 'binascii', 'hashlib', 'struct', 'time', 'io', 'json', 'errno'):
+            modules['u' + alias] = modules[alias]
+
+        def load(name):
+            if name in modules:
+                return modules[name]
+            loaded = modules['sys'].modules
+            if name in loaded:
+                return loaded[name]
+            parent = load(name.rpartition('.')[0]) if '.' in name else None
+            rel = name.replace('.', '/')
+            for base in ('', '/lib'):
+                for path in (f'{base}/{rel}.py', f'{base}/{rel}/__init__.py'):
+                    host = fake_os._host(path)
+                    if not os.path.exists(host):
+                        # A directory without __init__.py still imports as a package
+                        if not path.endswith('/__init__.py') or not os.path.isdir(os.path.dirname(host)):
+                            continue
+                    module = types.ModuleType(name)
+                    # Like MicroPython: relative to the sys.path entry it was found under
+                    module.__dict__.update(__builtins__=self.builtins, __file__=path if base else path[1:])
+                    if path.endswith('/__init__.py'):
+                        module.__path__ = path.rpartition('/')[0]
+                    loaded[name] = module
+                    try:
+                        if os.path.exists(host):
+                            with open(host) as f:
+                                exec(compile(f.read(), path, 'exec'), module.__dict__)
+                    except BaseException:
+                        del loaded[name]
+                        raise
+                    if parent is not None:
+                        setattr(parent, name.rpartition('.')[2], module)
+                    return module
+            raise ImportError(f"no module named '{name}'")
+
+        def fake_import(name, globals=None, locals=None, fromlist=(), level=0):
+            if level:
+                package = (globals or {}).get('__name__', '')
+                if '__path__' not in (globals or {}):
+                    package = package.rpartition('.')[0]
+                for _ in range(level - 1):
+                    package = package.rpartition('.')[0]
+                name = f'{package}.{name}' if name else package
+            module = load(name)
+            if not fromlist:
+                return module if level else load(name.partition('.')[0])
+            for item in fromlist:
+                if not hasattr(module, item) and hasattr(module, '__path__'):
+                    try:
+                        load(f'{name}.{item}')
+                    except ImportError:
+                        pass
+            return module
+
+        @_mp_errors
+        def fake_open(path, mode='r', *args, **kwargs):
+            return builtins.open(fake_os._host(path), mode, *args, **kwargs)
+
+        def fake_print(*args, sep=' ', end='\n', file=None):
+            (file or stdout).write(sep.join(str(a) for a in args) + end)
+
+        self.builtins = dict(vars(builtins))
+        self.builtins.update(__import__=fake_import, open=fake_open, print=fake_print)
+        modules['builtins'].__dict__.update(self.builtins)
+        self.modules = modules
+        self.namespace = {'__builtins__': self.builtins, '__name__': '__main__'}
+
+    # -- I/O ---------------------------------------------------------------
+
+    def _emit(self, data):
+        with self._write_lock:
+            if self.downlink is not None:
+                self.downlink.send(data)
+            else:
+                os.write(self.master, data)
+
+    def flood(self, count, width=64):
+        """Print `count` lines of `width` characters as fast as the link allows"""
+        for i in range(count):
+            self._emit(f'{i:08d} '.encode().ljust(width - 2, b'.') + b'\r\n')
+
+    def _run_code(self, code, echo_result):
+        """Execute code; return formatted traceback text or ''"""
+        try:
+            try:
+                compiled = compile(code, '<stdin>', 'eval' if echo_result else 'exec')
+                is_expr = echo_result
+            except SyntaxError:
+                compiled = compile(code, '<stdin>', 'exec')
+                is_expr = False
+            self.in_user_code = True
+            try:
+                result = eval(compiled, self.namespace)
+            finally:
+                self.in_user_code = False
+            if is_expr and result is not None:
+                self.modules['sys'].stdout.write(repr(result) + '\n')
+            return ''
+        except SystemExit:
+            return ''
+        except BaseException as e:
+            frames = traceback.extract_tb(e.__traceback__)[1:]
+            lines = ['Traceback (most recent call last):']
+            for frame in frames:
+                lines.append(f'  File "{frame.filename}", line {frame.lineno}, in {frame.name}')
+            message = str(e)
+            name = 'OSError' if isinstance(e, OSError) else type(e).__name__
+            lines.append(f'{name}: {message}' if message else name)
+            return '\r\n'.join(lines) + '\r\n'
+
+    def _execute_async(self, code, raw):
+        def work():
+            err = self._run_code(code.decode('utf-8', errors='replace'), echo_result=not raw)
+            self.running = False
+            if raw:
+                self._emit(b'\x04' + err.encode() + b'\x04>')
+            else:
+                if err:
+                    self._emit(err.encode())
+                self._emit(b'>>> ')
+
+        self.stdin.data.clear()
+        self.running = True
+        self.worker = threading.Thread(target=work, daemon=True)
+        self.worker.start()
+
+    def _interrupt(self):
+        worker = self.worker
+        if self.in_user_code and worker is not None:
+            ctypes.pythonapi.PyThreadState_SetAsyncExc(
+                ctypes.c_ulong(worker.ident), ctypes.py_object(KeyboardInterrupt))
+
+    def _soft_reset(self):
+        for timer in list(_Timer.running):
+            timer.deinit()
+        self._reset_namespace()
+        self._emit(b'MPY: soft reboot\r\n')
+
+    def _read(self, n=4096, timeout=None):
+        if self.uplink is None:
+            return os.read(self.master, n)
+        if not self._unread:
+            self._unread = self.uplink.receive(timeout)
+        data, self._unread = self._unread[:n], self._unread[n:]
+        return data
+
+    def _pump(self, source, sink):
+        """Move bytes between the pty and a simulated link"""
+        while not self._stop.is_set():
+            try:
+                data = source()
+            except (OSError, queue.Empty):
+                continue
+            sink(data)
+
+    def _raw_paste(self, pending):
+        """Receive a raw-paste upload; return bytes left over after it"""
+        self._emit(b'R\x01' + struct.pack('<H', RAW_PASTE_WINDOW))
+        code = bytearray()
+        received = 0
+        while True:
+            if not pending:
+                pending = self._read()
+            end = pending.find(b'\x04')
+            chunk = pending if end < 0 else pending[:end]
+            grants = (received + len(chunk)) // RAW_PASTE_WINDOW - received // RAW_PASTE_WINDOW
+            if grants:
+                self._emit(b'\x01' * grants)
+            received += len(chunk)
+            code += chunk
+            if end >= 0:
+                pending = pending[end + 1:]
+                break
+            pending = b''
+        self._emit(b'\x04')
+        self._execute_async(bytes(code), raw=True)
+        return pending
+
+    def _feed(self, data):
+        i = 0
+        while i < len(data):
+            byte = data[i:i + 1]
+            i += 1
+            if self.running:
+                # Everything up to an interrupt character is input for the program
+                rest = data[i - 1:]
+                stop = rest.find(b'\x03') if self.kbd_intr else -1
+                if stop < 0:
+                    self.stdin.feed(rest)
+                    break
+                self.stdin.feed(rest[:stop])
+                self._interrupt()
+                i += stop
+                continue
+            if self.mode == 'raw':
+                if byte == b'\x05' and self.buffer == b'':
+                    rest = data[i:i + 2]
+                    while len(rest) < 2:
+                        rest += self._read(2 - len(rest))
+                    if rest == b'A\x01':
+                        data = self._raw_paste(data[i + 2:])
+                        i = 0
+                    continue
+                if byte == b'\x04':
+                    if not self.buffer:
+                        self._soft_reset()
+                        self._emit(RAW_REPL_BANNER)
+                        continue
+                    code, self.buffer = self.buffer, b''
+                    self._emit(b'OK')
+                    self._execute_async(code, raw=True)
+                elif byte == b'\x02':
+                    self.mode = 'friendly'
+                    self.buffer = b''
+                    self._emit(f'\r\n{BANNER}\r\nType "help()" for more information.\r\n>>> '.encode())
+                elif byte == b'\x03':
+                    self.buffer = b''
+                elif byte == b'\x01':
+                    self.buffer = b''
+                    self._emit(b'\r\n' + RAW_REPL_BANNER)
+                else:
+                    self.buffer += byte
+            else:
+                if byte == b'\x01':
+                    self.mode = 'raw'
+                    self.buffer = b''
+                    self._emit(b'\r\n' + RAW_REPL_BANNER)
+                elif byte == b'\x03':
+                    self.line = b''
+                    self._emit(b'\r\nKeyboardInterrupt\r\n>>> ' if self.chatter else b'\r\n>>> ')
+                    self.chatter = 0.0
+                elif byte == b'\x04':
+                    self.line = b''
+                    self._soft_reset()
+                    self._emit(f'{BANNER}\r\n>>> '.encode())
+                elif byte == b'\r':
+                    line, self.line = self.line, b''
+                    self._emit(b'\r\n')
+                    if line.strip():
+                        self._execute_async(line, raw=False)
+                    else:
+                        self._emit(b'>>> ')
+                elif byte == b'\n':
+                    continue
+                elif byte in (b'\x7f', b'\x08'):
+                    if self.line:
+                        self.line = self.line[:-1]
+                        self._emit(b'\x08 \x08')
+                else:
+                    self.line += byte
+                    self._emit(byte)
+
+    def _chatter_loop(self):
+        count = 0
+        while not self._stop.is_set():
+            if self.chatter and self.mode == 'friendly' and not self.running:
+                count += 1
+                self._emit(f'app: tick {count}\r\n'.encode())
+                self._stop.wait(self.chatter)
+            else:
+                self._stop.wait(0.05)
+
+    def serve(self):
+        threading.Thread(target=self._chatter_loop, daemon=True).start()
+        if self.uplink is not None:
+            threading.Thread(target=self._pump, daemon=True,
+                             args=(lambda: os.read(self.master, 4096), self.uplink.send)).start()
+            threading.Thread(target=self._pump, daemon=True,
+                             args=(lambda: self.downlink.receive(0.1),
+                                   lambda data: os.write(self.master, data))).start()
+            while not self._stop.is_set():
+                try:
+                    self._feed(self._read(timeout=0.1))
+                except queue.Empty:
+                    pass
+            return
+        while not self._stop.is_set():
+            ready, _, _ = select.select([self.master], [], [], 0.1)
+            if ready:
+                try:
+                    data = self._read()
+                except OSError:
+                    break
+                self._feed(data)
+
+    def start(self):
+        thread = threading.Thread(target=self.serve, daemon=True)
+        thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+
+def pop_option(args, name, default=None):
+    """Remove '--name VALUE' from args and return VALUE (or default)"""
+    if name in args:
+        i = args.index(name)
+        if i + 1 < len(args):
+            value = args[i + 1]
+            del args[i:i + 2]
+            return value
+    return default
+
+def main():
+    args = sys.argv[1:]
+    bandwidth = int(pop_option(args, '--bandwidth', 0))
+    latency = float(pop_option(args, '--latency', 0)) / 1000
+    root = args[0] if args else tempfile.mkdtemp(prefix='badge_sim_')
+    os.makedirs(os.path.join(root, 'apps'), exist_ok=True)
+    badge = FakeBadge(root, chatter=1.0, bandwidth=bandwidth, latency=latency)
+    print(f"Simulated badge on {badge.port} (filesystem: {root})")
+    if bandwidth or latency:
+        print(f"Link: {bandwidth or 'unlimited'} bytes/s, {latency * 1000:.1f} ms latency")
+    print("Press Ctrl+C to exit")
+    try:
+        badge.serve()
+    except KeyboardInterrupt:
+        print("\nSimulator stopped.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Telemetry Sampler for Supercon 2025 Badge
+Samples free/allocated memory, ticks_ms, timer lateness (how long the badge
+went without servicing callbacks) and user counters on the badge at up to
+100 Hz, optionally while an app runs, and keeps the samples in a ring buffer
+on the host for a live summary and CSV/JSON export
+
+On the badge a machine.Timer callback packs each sample into a small
+length-prefixed binary frame; frames are sent in batches as base64 lines so
+they pass through the raw REPL like any other output
+"""
+import array
+import base64
+import binascii
+import csv
+import json
+import os
+import serial
+import statistics
+import struct
+import sys
+import time
+from badge_session import BadgeSession
+
+SERIAL_PORT = os.environ.get('BADGE_PORT', "/dev/cu.usbmodem2101")
+
+DEFAULT_RATE = 50
+MAX_RATE = 100
+# Samples kept on the host (an hour at 100 Hz); older ones are overwritten
+DEFAULT_KEEP = 360000
+# Frames sent per line, so the badge writes ~10 lines/s whatever the rate
+BATCHES_PER_SECOND = 10
+# Marks frame lines among the app's own output
+FRAME_PREFIX = b'~'
+# ticks_ms() wraps at 2**30 on MicroPython
+TICKS_PERIOD = 1 << 30
+
+FIELDS = ('t_ms', 'mem_free', 'mem_alloc', 'late_us')
+
+# Runs on the badge after PERIOD_MS, BATCH, DURATION_MS, RUN and COUNTERS are set.
+# Frame: body length (1 byte), ticks_ms, mem_free, mem_alloc, late_us, counters...
+SAMPLER_SCRIPT = """
+import sys, gc, time, struct, machine, ubinascii
+FORMAT = '<BIIIi' + 'i' * len(COUNTERS)
+SIZE = struct.calcsize(FORMAT)
+PERIOD_US = PERIOD_MS * 1000
+buf = bytearray(SIZE * BATCH)
+state = [time.ticks_add(time.ticks_us(), PERIOD_US), 0]
+def count(f):
+    try:
+        return int(f())
+    except Exception:
+        return -1
+def send(n):
+    if n:
+        sys.stdout.write('~' + ubinascii.b2a_base64(buf[:n * SIZE]).decode())
+def sample(t):
+    now = time.ticks_us()
+    late = time.ticks_diff(now, state[0])
+    state[0] = time.ticks_add(now if late > PERIOD_US else state[0], PERIOD_US)
+    struct.pack_into(FORMAT, buf, state[1] * SIZE, SIZE - 1, time.ticks_ms(), gc.mem_free(),
+                     gc.mem_alloc(), late, *[count(f) for f in COUNTERS])
+    state[1] += 1
+    if state[1] == BATCH:
+        state[1] = 0
+        send(BATCH)
+timer = machine.Timer(0)
+timer.init(period=PERIOD_MS, mode=machine.Timer.PERIODIC, callback=sample)
+try:
+    if RUN:
+        exec(RUN)
+    start = time.ticks_ms()
+    while DURATION_MS is None or time.ticks_diff(time.ticks_ms(), start) < DURATION_MS:
+        time.sleep_ms(20)
+finally:
+    timer.deinit()
+    send(state[1])
+"""
+
+
+class RingBuffer:
+    """The last `capacity` samples, one preallocated array per field"""
+
+    def __init__(self, fields, capacity):
+        self.fields = tuple(fields)
+        self.capacity = capacity
+        self.columns = [array.array('q', bytes(8 * capacity)) for _ in self.fields]
+        self.next = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, values):
+        for column, value in zip(self.columns, values):
+            column[self.next] = value
+        self.next = (self.next + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def column(self, name):
+        """Values of one field, oldest first"""
+        data = self.columns[self.fields.index(name)]
+        if self.count < self.capacity:
+            return data[:self.count]
+        return data[self.next:] + data[:self.next]
+
+    def last(self, n):
+        """The newest n samples of every field, as {field: list}"""
+        indexes = [(self.next - i) % self.capacity for i in range(min(n, self.count), 0, -1)]
+        return {name: [column[i] for i in indexes] for name, column in zip(self.fields, self.columns)}
+
+    def rows(self):
+        return zip(*(self.column(name) for name in self.fields))
+
+
+class FrameDecoder:
+    """Turn the sampler's output into samples, passing other lines to on_line"""
+
+    def __init__(self, counters, on_sample, on_line):
+        self.format = struct.Struct('<IIIi' + 'i' * len(counters))
+        self.on_sample = on_sample
+        self.on_line = on_line
+        self.partial = b''
+        self.ticks = None
+        self.t_ms = 0
+        self.bad_frames = 0
+
+    def feed(self, data):
+        *lines, self.partial = (self.partial + data).split(b'\n')
+        for line in lines:
+            line = line.rstrip(b'\r')
+            if line.startswith(FRAME_PREFIX):
+                self.decode(line[len(FRAME_PREFIX):])
+            elif line:
+                self.on_line(line)
+
+    def finish(self):
+        if self.partial.strip():
+            self.feed(b'\n')
+
+    def decode(self, line):
+        try:
+            frames = base64.b64decode(line)
+        except binascii.Error:
+            self.bad_frames += 1
+            return
+        pos = 0
+        while pos < len(frames):
+            length = frames[pos]
+            body = frames[pos + 1:pos + 1 + length]
+            pos += 1 + length
+            if length != self.format.size or len(body) != length:
+                self.bad_frames += 1
+                continue
+            ticks, *values = self.format.unpack(body)
+            # Time since the first sample, across ticks_ms() wrapping
+            if self.ticks is not None:
+                self.t_ms += (ticks - self.ticks) % TICKS_PERIOD
+            self.ticks = ticks
+            self.on_sample((self.t_ms, *values))
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0
+
+def live_trend(ring):
+    """Bytes per minute the live heap grows, from the per-second minimum of mem_alloc"""
+    floors = {}
+    for t_ms, alloc in zip(ring.column('t_ms'), ring.column('mem_alloc')):
+        second = t_ms // 1000
+        floors[second] = min(alloc, floors.get(second, alloc))
+    if len(floors) < 3:
+        return None
+    seconds = list(floors)
+    return statistics.linear_regression(seconds, list(floors.values())).slope * 60
+
+def status_line(ring, rate, counters):
+    """One line on the last second of samples"""
+    recent = ring.last(rate)
+    t_ms = recent['t_ms']
+    if len(t_ms) < 2:
+        return "[telemetry] waiting for samples..."
+    # Measured over the samples' own times, so dropped or late samples lower it
+    per_second = (len(t_ms) - 1) * 1000 / max(1, t_ms[-1] - t_ms[0])
+    late = recent['late_us']
+    line = (f"[telemetry] {per_second:.1f} samples/s, free {recent['mem_free'][-1] / 1024:.1f} KB, "
+            f"alloc {recent['mem_alloc'][-1] / 1024:.1f} KB, late p99 {percentile(late, 0.99) / 1000:.1f} ms "
+            f"max {max(late) / 1000:.1f} ms")
+    for name in counters:
+        line += f", {name}={recent[name][-1]}"
+    return line
+
+def report(ring, period_ms, bad_frames):
+    """Print a summary of the samples in the ring buffer"""
+    if not ring:
+        print("✗ No samples received")
+        return
+    t_ms = ring.column('t_ms')
+    late = ring.column('late_us')
+    free = ring.column('mem_free')
+    span = (t_ms[-1] - t_ms[0]) / 1000
+    print(f"\n✓ {len(ring)} samples over {span:.1f}s ({len(ring) / max(span, 1e-9):.1f}/s)")
+    print(f"  Free memory:   min {min(free) / 1024:.1f} KB, last {free[-1] / 1024:.1f} KB")
+    trend = live_trend(ring)
+    if trend is not None:
+        print(f"  Live heap:     {trend / 1024:+.2f} KB/min (per-second minimum of mem_alloc)")
+    spikes = sum(1 for value in late if value > period_ms * 1000)
+    print(f"  Lateness:      p50 {percentile(late, 0.5) / 1000:.2f} ms, p99 {percentile(late, 0.99) / 1000:.2f} ms, "
+          f"max {max(late) / 1000:.2f} ms, {spikes} over one period ({period_ms} ms)")
+    for name in ring.fields[len(FIELDS):]:
+        values = ring.column(name)
+        print(f"  {name + ':':<14} first {values[0]}, last {values[-1]}, min {min(values)}, max {max(values)}")
+    gaps = sum(1 for a, b in zip(t_ms, t_ms[1:]) if b - a > 2 * period_ms)
+    if gaps or bad_frames:
+        print(f"  Gaps:          {gaps} between samples, {bad_frames} undecodable frames")
+
+def export_csv(ring, path):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(ring.fields)
+        writer.writerows(ring.rows())
+
+def export_json(ring, path, rate, counters):
+    with open(path, 'w') as f:
+        json.dump({'rate_hz': rate, 'counters': counters,
+                   'columns': {name: ring.column(name).tolist() for name in ring.fields}}, f)
+
+def sampler_code(period_ms, duration, run, counters):
+    """The sampler script with its settings"""
+    settings = [f"PERIOD_MS = {period_ms}",
+                f"BATCH = {max(1, 1000 // period_ms // BATCHES_PER_SECOND)}",
+                f"DURATION_MS = {None if duration is None else int(duration * 1000)}",
+                f"RUN = {run!r}",
+                f"COUNTERS = ({''.join(f'lambda: {expression}, ' for expression in counters.values())})"]
+    return '\n'.join(settings) + SAMPLER_SCRIPT
+
+def pop_option(args, name, default=None):
+    """Remove '--name VALUE' from args and return VALUE (or default)"""
+    if name in args:
+        i = args.index(name)
+        if i + 1 < len(args):
+            value = args[i + 1]
+            del args[i:i + 2]
+            return value
+    return default
+
+def main():
+    args = sys.argv[1:]
+    rate = int(pop_option(args, '--rate', DEFAULT_RATE))
+    duration = pop_option(args, '--duration')
+    run = pop_option(args, '--run')
+    csv_path = pop_option(args, '--csv')
+    json_path = pop_option(args, '--json')
+    keep = int(pop_option(args, '--keep', DEFAULT_KEEP))
+    quiet = '--quiet' in args
+    reset = '--reset' in args
+    args = [a for a in args if a not in ('--quiet', '--reset')]
+    counters = {}
+    while '--counter' in args:
+        name, _, expression = (pop_option(args, '--counter') or '').partition('=')
+        if not expression:
+            args = ['--help']
+            break
+        counters[name] = expression
+
+    if args or not 1 <= rate <= MAX_RATE:
+        print("Badge Telemetry Sampler")
+        print("\nUsage:")
+        print(f"  {sys.argv[0]} [options]")
+        print("\nOptions:")
+        print(f"  --rate HZ             Samples per second, 1-{MAX_RATE} (default {DEFAULT_RATE})")
+        print(f"  --duration S          Stop after S seconds (default: until Ctrl+C)")
+        print(f"  --run CODE            Run an app on the badge while sampling, e.g. 'import my_app'")
+        print(f"  --counter NAME=EXPR   Also sample an integer expression (repeatable)")
+        print(f"  --csv FILE            Save the samples as CSV")
+        print(f"  --json FILE           Save the samples as JSON (one list per field)")
+        print(f"  --keep N              Samples kept in memory (default {DEFAULT_KEEP})")
+        print(f"  --quiet               No status line every second")
+        print(f"  --reset               Soft-reset the badge afterwards (restarts its app)")
+        print("\nExamples:")
+        print(f"  {sys.argv[0]} --rate 100 --duration 60 --csv mem.csv")
+        print(f"  {sys.argv[0]} --run 'import apps.my_app' --counter sprites='len(apps.my_app.sprites)'")
+        return 1
+
+    period_ms = max(1, round(1000 / rate))
+    duration = float(duration) if duration else None
+    ring = RingBuffer(FIELDS + tuple(counters), keep)
+    shown = [time.monotonic()]
+
+    def on_sample(values):
+        ring.append(values)
+        now = time.monotonic()
+        if not quiet and now - shown[0] >= 1:
+            shown[0] = now
+            print(status_line(ring, rate, counters), file=sys.stderr)
+
+    def on_line(line):
+        print(line.decode('utf-8', errors='replace'))
+
+    decoder = FrameDecoder(counters, on_sample, on_line)
+    session = BadgeSession(SERIAL_PORT, timeout=None)
+    status = 0
+    try:
+        session.open()
+        if session.broker is not None and (duration is None or run):
+            # The broker returns output only when the program ends
+            print("✗ Through the broker, telemetry needs --duration and no --run "
+                  "(stop the broker for live sampling)", file=sys.stderr)
+            return 1
+        quiet = quiet or session.broker is not None
+        print(f"Sampling at {1000 / period_ms:.0f} Hz"
+              f"{f' for {duration:g}s' if duration else ' (Ctrl+C to stop)'}...", file=sys.stderr)
+        code = sampler_code(period_ms, duration, run, counters)
+        try:
+            # With --run the app may never return, so the duration is enforced from here
+            error = session.exec_stream(code, decoder.feed, duration if run else None)
+        except (TimeoutError, KeyboardInterrupt):
+            error = b''
+        decoder.finish()
+        if error:
+            print(error.decode('utf-8', errors='replace').replace('\r\n', '\n').rstrip('\n'), file=sys.stderr)
+            status = 1
+
+    except (serial.SerialException, TimeoutError, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        session.close(soft_reset=reset)
+
+    report(ring, period_ms, decoder.bad_frames)
+    if csv_path:
+        export_csv(ring, csv_path)
+        print(f"✓ Samples saved to: {csv_path}")
+    if json_path:
+        export_json(ring, json_path, rate, counters)
+        print(f"✓ Samples saved to: {json_path}")
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
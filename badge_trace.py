@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Operation Tracing for Supercon 2025 Badge tools
+Records nested timing spans (port open, raw REPL entry, exec, transfers...)
+with byte counts, and writes them as Chrome trace-event JSON (open it in
+chrome://tracing or https://ui.perfetto.dev) plus a text summary
+Tracing is off unless start() is called, and then costs one check per span
+"""
+import collections
+import contextlib
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+_events = None
+_path = None
+_local = threading.local()
+
+def start(path):
+    """Begin recording spans, to be written to `path` by finish()"""
+    global _events, _path
+    _events = []
+    _path = path
+
+def enabled():
+    return _events is not None
+
+@contextlib.contextmanager
+def span(name, **args):
+    """Time a block as a span named `name`; nested spans show inside it"""
+    if _events is None:
+        yield
+        return
+    stack = _local.__dict__.setdefault('stack', [])
+    event = {'name': name, 'cat': 'badge', 'ph': 'X', 'pid': os.getpid(),
+             'tid': threading.get_ident(), 'args': dict(args)}
+    stack.append(event)
+    event['ts'] = time.perf_counter_ns() // 1000
+    try:
+        yield
+    finally:
+        event['dur'] = time.perf_counter_ns() // 1000 - event['ts']
+        stack.pop()
+        if _events is not None:
+            _events.append(event)
+
+def traced(name):
+    """Decorator form of span()
+
+    On BadgeSession methods the span also records the bytes sent (tx) and
+    received (rx) over the link while it ran.
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _events is None:
+                return func(*args, **kwargs)
+            session = args[0] if args and hasattr(args[0], 'tx_bytes') else None
+            with span(name):
+                if session is None:
+                    return func(*args, **kwargs)
+                tx, rx = session.tx_bytes, session.rx_bytes
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    count(tx=session.tx_bytes - tx, rx=session.rx_bytes - rx)
+        return wrapper
+    return decorate
+
+def count(**values):
+    """Add byte counts (or other numbers) to the innermost open span"""
+    if _events is None:
+        return
+    stack = getattr(_local, 'stack', None)
+    if stack:
+        event_args = stack[-1]['args']
+        for key, value in values.items():
+            event_args[key] = event_args.get(key, 0) + value
+
+def summary(events):
+    """Return text lines totalling time and byte counts per span name"""
+    totals = collections.OrderedDict()
+    for event in sorted(events, key=lambda e: e['ts']):
+        entry = totals.setdefault(event['name'], {'count': 0, 'us': 0, 'bytes': 0})
+        entry['count'] += 1
+        entry['us'] += event['dur']
+        entry['bytes'] += sum(value for key, value in event['args'].items()
+                              if key in ('tx', 'rx', 'bytes') and isinstance(value, int))
+    lines = [f"{'span':<24} {'count':>6} {'total ms':>10} {'avg ms':>9} {'bytes':>10}"]
+    for name, entry in sorted(totals.items(), key=lambda item: -item[1]['us']):
+        lines.append(f"{name:<24} {entry['count']:>6} {entry['us'] / 1000:>10.1f} "
+                     f"{entry['us'] / 1000 / entry['count']:>9.2f} {entry['bytes'] or '':>10}")
+    return lines
+
+def finish():
+    """Write the recorded spans and print the summary to stderr"""
+    global _events
+    if _events is None:
+        return
+    events, _events = _events, None
+    with open(_path, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+    print(f"\nTrace ({len(events)} spans) saved to: {_path}", file=sys.stderr)
+    for line in summary(events):
+        print(f"  {line}", file=sys.stderr)
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Watch Mode for Supercon 2025 Badge
+Watches a local app directory and, a moment after each burst of saves,
+pushes just the changed files over one open session, evicts the app's
+modules from sys.modules on the badge and imports its entry point again.
+Nothing is reset, so the display keeps running between reloads
+
+Changes are picked up with inotify on Linux, and by polling file times
+elsewhere (or with --poll). The app's output is shown as it runs
+"""
+import codecs
+import ctypes
+import os
+import select
+import serial
+import struct
+import sys
+import time
+import badge_file_manager
+from badge_session import BadgeError
+
+SERIAL_PORT = os.environ.get('BADGE_PORT', "/dev/cu.usbmodem2101")
+
+# Quiet time after the last change before pushing, and the longest a burst is held
+DEBOUNCE = 0.1
+MAX_DEBOUNCE = 1.0
+# Seconds between scans when polling
+POLL_INTERVAL = 0.25
+# Editor swap/backup files and caches that are never pushed
+IGNORED_SUFFIXES = ('~', '.swp', '.swx', '.tmp', '.pyc')
+IGNORED_NAMES = {'__pycache__', '4913'}
+
+# inotify events (see inotify(7))
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_ISDIR = 0x40000000
+INOTIFY_EVENT = struct.Struct('iIII')
+
+# Runs on the badge before the entry point: forgets every module loaded from ROOT
+EVICT_SCRIPT = """
+def _evict(root):
+    import sys
+    for name in list(sys.modules):
+        path = getattr(sys.modules[name], '__file__', None)
+        if path and ('/' + path.lstrip('/')).startswith(root + '/'):
+            del sys.modules[name]
+_evict(ROOT)
+del _evict, ROOT
+"""
+
+def ignored(rel):
+    """True for paths inside hidden or cache directories, or editor temp files"""
+    return any(part.startswith('.') or part in IGNORED_NAMES or part.endswith(IGNORED_SUFFIXES)
+               for part in rel.split('/'))
+
+
+class InotifyWatcher:
+    """Reports changed paths with inotify, watching every directory of the tree"""
+
+    MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    interval = None
+
+    def __init__(self, root):
+        self.libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.root = root
+        self.dirs = {}
+        for path, dirnames, _ in os.walk(root):
+            dirnames[:] = [name for name in dirnames if not ignored(name)]
+            self.add(path)
+
+    def add(self, path):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), self.MASK)
+        if wd >= 0:
+            rel = os.path.relpath(path, self.root).replace(os.sep, '/')
+            self.dirs[wd] = '' if rel == '.' else rel + '/'
+
+    def fileno(self):
+        return self.fd
+
+    def wait_time(self):
+        return None
+
+    def changes(self):
+        """Return the relative paths changed since the last call"""
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return changed
+            pos = 0
+            while pos < len(data):
+                wd, mask, _, size = INOTIFY_EVENT.unpack_from(data, pos)
+                name = data[pos + INOTIFY_EVENT.size:pos + INOTIFY_EVENT.size + size].rstrip(b'\0')
+                pos += INOTIFY_EVENT.size + size
+                if wd not in self.dirs or not name:
+                    continue
+                rel = self.dirs[wd] + os.fsdecode(name)
+                if ignored(rel):
+                    continue
+                if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                    # Watch the new directory and push whatever is already in it
+                    for path, dirnames, filenames in os.walk(os.path.join(self.root, rel)):
+                        self.add(path)
+                        base = os.path.relpath(path, self.root).replace(os.sep, '/')
+                        changed.update(f'{base}/{name}' for name in filenames)
+                elif not mask & IN_CREATE:
+                    # New files are pushed once written (IN_CLOSE_WRITE)
+                    changed.add(rel)
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Reports changed paths by comparing file times and sizes every POLL_INTERVAL"""
+
+    interval = POLL_INTERVAL
+
+    def __init__(self, root):
+        self.root = root
+        self.snapshot = self.scan()
+        self.scanned = time.monotonic()
+
+    def scan(self):
+        files = {}
+        for path, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [name for name in dirnames if not ignored(name)]
+            rel = os.path.relpath(path, self.root).replace(os.sep, '/')
+            if rel != '.':
+                # Directories too, so a removed one is removed on the badge
+                files[rel] = 'dir'
+            for name in filenames:
+                key = name if rel == '.' else f'{rel}/{name}'
+                if not ignored(key):
+                    try:
+                        st = os.stat(os.path.join(path, name))
+                    except OSError:
+                        continue
+                    files[key] = (st.st_mtime_ns, st.st_size)
+        return files
+
+    def fileno(self):
+        return None
+
+    def wait_time(self):
+        """Seconds until the next scan is due"""
+        return max(0.0, self.scanned + self.interval - time.monotonic())
+
+    def changes(self):
+        """Return the relative paths changed since the last scan (at most one scan per interval)"""
+        if time.monotonic() - self.scanned < self.interval:
+            # Woken early by app output: too soon to walk the tree again
+            return set()
+        current = self.scan()
+        self.scanned = time.monotonic()
+        changed = {rel for rel in current.keys() | self.snapshot.keys()
+                   if current.get(rel) != self.snapshot.get(rel)}
+        self.snapshot = current
+        return changed
+
+    def close(self):
+        pass
+
+
+def make_watcher(root, poll=False):
+    """inotify where available, otherwise polling"""
+    if not poll and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(root)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(root)
+
+def default_entry(local_dir, remote_dir):
+    """Import statement for the app: its package, or its main module; None if neither"""
+    package = remote_dir.strip('/')
+    # /lib is on sys.path, so modules there are imported without the prefix
+    package = package[len('lib'):].lstrip('/') if package.split('/')[0] == 'lib' else package
+    package = package.replace('/', '.')
+    if package and os.path.exists(os.path.join(local_dir, '__init__.py')):
+        return f"import {package}"
+    if os.path.exists(os.path.join(local_dir, 'main.py')):
+        return f"import {package + '.' if package else ''}main"
+    return None
+
+
+class AppRunner:
+    """Runs the app's entry point in the raw REPL and relays its output"""
+
+    def __init__(self, session, remote_dir, entry):
+        self.session = session
+        self.remote_dir = remote_dir
+        self.entry = entry
+        self.running = False
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+    def show(self, data, error=b''):
+        text = self.decoder.decode(data).replace('\r\n', '\n')
+        if text:
+            sys.stdout.write(text)
+            sys.stdout.flush()
+        error = error.decode('utf-8', errors='replace').replace('\r\n', '\n').rstrip('\n')
+        if error and not error.endswith('KeyboardInterrupt'):
+            print(error)
+
+    def start(self):
+        """Forget the app's modules and import its entry point again"""
+        code = f"ROOT = {self.remote_dir.rstrip('/')!r}\n" + EVICT_SCRIPT + self.entry + "\n"
+        self.session.exec_start(code)
+        self.running = True
+
+    def poll(self):
+        """Relay output that has arrived; note when the app returns"""
+        data, error = self.session.read_running()
+        self.show(data)
+        if error is not None:
+            self.show(b'', error)
+            self.running = False
+            print(f"[watch] {'✗ app raised' if error else 'app returned'}; waiting for changes")
+
+    def stop(self):
+        """Interrupt the app (Ctrl-C) so files can be replaced"""
+        if not self.running:
+            return
+        self.running = False
+        self.show(*self.session.interrupt())
+
+
+def wait_for_changes(watcher, app):
+    """Relay app output until a burst of changes settles; return the changed paths"""
+    port = app.session.serial.fileno()
+    changed = set()
+    first = last = None
+    while True:
+        now = time.monotonic()
+        if changed:
+            timeout = max(0.0, min(last + DEBOUNCE, first + MAX_DEBOUNCE) - now)
+            if timeout == 0:
+                return changed, first
+        else:
+            timeout = watcher.wait_time()
+        if watcher.wait_time() is not None and timeout is not None:
+            timeout = min(timeout, watcher.wait_time())
+        if app.running and app.session._pending:
+            # Output (or the end markers) already read off the port, e.g. along
+            # with the start handshake: select() would not report it
+            app.poll()
+            timeout = 0
+        fds = ([port] if app.running else []) + ([watcher.fileno()] if watcher.fileno() is not None else [])
+        readable, _, _ = select.select(fds, [], [], timeout)
+        if port in readable and app.running:
+            app.poll()
+        if watcher.fileno() is None or watcher.fileno() in readable:
+            found = watcher.changes()
+            if found:
+                last = time.monotonic()
+                first = first or last
+                changed |= found
+
+def push(local_dir, remote_dir, changed):
+    """Upload changed files and remove deleted ones; return (uploaded, removed)"""
+    session = badge_file_manager.get_session()
+    uploads, removed, dirs = [], [], set()
+    for rel in sorted(changed):
+        local_path = os.path.join(local_dir, *rel.split('/'))
+        remote_path = badge_file_manager.remote_join(remote_dir, rel)
+        if os.path.isfile(local_path):
+            uploads.append((local_path, remote_path))
+            dirs.add(remote_path.rsplit('/', 1)[0])
+        elif not os.path.exists(local_path):
+            removed.append(remote_path)
+    # Parents first, so each directory exists before its files and subdirectories
+    dirs = sorted({'/'.join(path.split('/')[:depth]) for path in dirs
+                   for depth in range(remote_dir.count('/') + 1, path.count('/') + 2)})
+    if uploads:
+        badge_file_manager.put_files(uploads, dirs)
+    if removed:
+        # Deepest first, so directories are empty by the time they are removed
+        session.exec(f"import os\nfor p in {sorted(removed, reverse=True)!r}:\n"
+                     "    try:\n        os.remove(p)\n    except OSError:\n"
+                     "        try:\n            os.rmdir(p)\n        except OSError:\n            pass")
+        for remote_path in removed:
+            badge_file_manager.index_remove(remote_path)
+    return uploads, removed
+
+def pop_option(args, name, default=None):
+    """Remove '--name VALUE' from args and return VALUE (or default)"""
+    if name in args:
+        i = args.index(name)
+        if i + 1 < len(args):
+            value = args[i + 1]
+            del args[i:i + 2]
+            return value
+    return default
+
+def main():
+    args = sys.argv[1:]
+    entry = pop_option(args, '--entry')
+    poll = '--poll' in args
+    no_sync = '--no-sync' in args
+    args = [a for a in args if a not in ('--poll', '--no-sync')]
+
+    if len(args) != 2:
+        print("Badge Watch Mode")
+        print("\nUsage:")
+        print(f"  {sys.argv[0]} [options] <local_dir> <remote_dir>")
+        print("\nOptions:")
+        print(f"  --entry CODE      Code that starts the app (default: import its package or main.py)")
+        print(f"  --poll            Poll for changes instead of using inotify")
+        print(f"  --no-sync         Skip the initial sync of the whole directory")
+        print("\nExamples:")
+        print(f"  {sys.argv[0]} ./my_app /apps/my_app")
+        print(f"  {sys.argv[0]} --entry 'import apps.my_app as a; a.run()' ./my_app /apps/my_app")
+        return 1
+
+    local_dir = args[0]
+    remote_dir = badge_file_manager.normalize_remote(args[1])
+    if not os.path.isdir(local_dir):
+        print(f"Error: Local directory '{local_dir}' not found")
+        return 1
+    entry = entry or default_entry(local_dir, remote_dir)
+    if entry is None:
+        print(f"Error: {local_dir} has no __init__.py or main.py; say how to start it with --entry")
+        return 1
+
+    badge_file_manager.SERIAL_PORT = SERIAL_PORT
+    watcher = None
+    try:
+        session = badge_file_manager.get_session()
+        if session.broker is not None:
+            print("✗ Watch mode runs the app on the session it pushes over; stop the broker first")
+            return 1
+        if not no_sync and not badge_file_manager.sync_tree(local_dir, remote_dir):
+            return 1
+        watcher = make_watcher(local_dir, poll)
+        app = AppRunner(session, remote_dir, entry)
+        print(f"[watch] {local_dir} -> {remote_dir} ({'inotify' if watcher.interval is None else 'polling'}); "
+              f"running: {entry}")
+        print("Press Ctrl+C to stop")
+        app.start()
+        while True:
+            changed, first = wait_for_changes(watcher, app)
+            # Skip bursts that only touched directories
+            changed = {rel for rel in changed if not os.path.isdir(os.path.join(local_dir, *rel.split('/')))}
+            if not changed:
+                continue
+            app.stop()
+            uploads, removed = push(local_dir, remote_dir, changed)
+            app.start()
+            names = sorted(changed)
+            print(f"[watch] ✓ {len(uploads)} pushed, {len(removed)} removed "
+                  f"({', '.join(names[:5])}{', ...' if len(names) > 5 else ''}); "
+                  f"reloaded {time.monotonic() - first:.2f}s after the change")
+
+    except KeyboardInterrupt:
+        print("\nStopped watching.")
+    except (serial.SerialException, BadgeError, TimeoutError, OSError) as e:
+        print(f"✗ Error: {e}")
+        return 1
+    finally:
+        if watcher is not None:
+            watcher.close()
+        # Pushes changed the badge: don't leave a cached index that predates them
+        badge_file_manager.save_index_cache()
+        badge_file_manager.close_session()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())